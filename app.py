@@ -1,10 +1,247 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from database import get_db_connection, create_tables, seed_initial_data, hash_password
+from markupsafe import Markup, escape
+from flask import Flask, Blueprint, Response, g, render_template, request, redirect, url_for, session, flash, stream_template, stream_with_context
+from database import get_db_connection, get_read_connection, create_tables, seed_initial_data, hash_password, check_password, release_thread_connections, write_transaction, batched_write, writer_stats, rebuild_stats, check_stats, read_table_versions, read_blacklist_versions, load_blacklists, has_treatment_search, pool_stats, replica_stats, set_query_observer
+from cache import LRUCache
+from timeline import PatientTimeline, TIMELINE_FIELDS
+from fragments import FragmentCacheExtension
+from blacklist import BlacklistRegistry
+from workers import BoundedExecutor, QueueFull
+from pubsub import EventHub
+from metrics import Metrics
 import sqlite3
-from datetime import datetime, date, timedelta
+import json
+import base64
+import csv
+import gzip
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from jinja2 import FileSystemBytecodeCache
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, date, timedelta, timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'hms_super_secret_key_845jfg' 
+app.config['REPORT_PAGE_SIZE'] = 50
+app.config['REPORT_MAX_PAGE_SIZE'] = 500
+app.config['REPORT_FETCH_BATCH'] = 500
+app.config['EXPORT_FETCH_BATCH'] = 5000
+app.config['MAX_SCHEDULE_SLOTS'] = 20000
+app.config['MAX_SCHEDULE_DAYS'] = 366
+app.config['DOCTOR_DASHBOARD_DAYS'] = 7
+app.config['DOCTOR_DASHBOARD_MAX_DAYS'] = 90
+app.config['AVAILABILITY_CACHE_SIZE'] = 1024
+app.config['AVAILABILITY_CACHE_TTL'] = 30
+app.config['IDENTITY_CACHE_SIZE'] = 10000
+app.config['IDENTITY_CACHE_TTL'] = 300
+app.config['BLACKLIST_CHECK_INTERVAL'] = 2
+app.config['SEARCH_PAGE_SIZE'] = 20
+app.config['PATIENT_UPCOMING_LIMIT'] = 100
+app.config['PATIENT_HISTORY_PAGE_SIZE'] = 20
+app.config['TIMELINE_CACHE_SIZE'] = 2000
+app.config['TIMELINE_CACHE_BYTES'] = 32 * 1024 * 1024
+app.config['TIMELINE_CACHE_TTL'] = 600
+app.config['CONSULTATION_SUMMARY_SIZE'] = 5
+app.config['FRAGMENT_CACHE_SIZE'] = 4096
+app.config['FRAGMENT_CACHE_BYTES'] = 16 * 1024 * 1024
+app.config['FRAGMENT_CACHE_TTL'] = 300
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.config['TEMPLATE_BYTECODE_DIR'] = os.path.join(app.root_path, '.jinja_cache')
+app.config['PRECOMPILE_TEMPLATES'] = True
+app.config['API_BATCH_LIMIT'] = 50
+app.config['COMPRESS_MIN_BYTES'] = 4096
+app.config['COMPRESS_LEVEL'] = 6
+app.config['SQL_METRICS'] = True
+app.config['QUERY_BUDGET'] = 10
+
+app.config['AUTH_WORKERS'] = os.cpu_count() or 2
+app.config['AUTH_MAX_PENDING'] = 64
+app.config['AUTH_TIMEOUT'] = 10
+
+# asgi.py: database work from async views and the threaded fallback for
+# every other route each get their own bounded pool.
+app.config['ASYNC_DB_WORKERS'] = 8
+app.config['ASYNC_DB_MAX_PENDING'] = 4096
+app.config['ASYNC_WSGI_WORKERS'] = 16
+app.config['ASYNC_WSGI_MAX_PENDING'] = 1024
+
+# Live slot feed (SSE) on the available appointments page. Each subscriber
+# may fall SLOT_FEED_MAX_PENDING events behind before it is resynchronised
+# from a snapshot; feeds end after SLOT_FEED_MAX_AGE seconds and reconnect.
+# The threaded server would hold a request thread per open page, so the feed
+# is off unless asgi.py (which serves it as a coroutine) turns it on.
+app.config['SLOT_FEED_ENABLED'] = False
+app.config['SLOT_FEED_MAX_SUBSCRIBERS'] = 10000
+app.config['SLOT_FEED_MAX_PENDING'] = 32
+app.config['SLOT_FEED_HEARTBEAT'] = 15
+app.config['SLOT_FEED_MAX_AGE'] = 600
+app.config['SLOT_FEED_RETRY_MS'] = 3000
+
+# Compiled templates persist across restarts; {% cache %} blocks are stored in fragment_cache.
+os.makedirs(app.config['TEMPLATE_BYTECODE_DIR'], exist_ok=True)
+app.jinja_options = {
+    **app.jinja_options,
+    'extensions': [*app.jinja_options.get('extensions', ()), FragmentCacheExtension],
+    'bytecode_cache': FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_DIR']),
+}
+
+# Password hashing is deliberately slow, so it runs off the request thread
+# and sheds load with a 503 once AUTH_MAX_PENDING logins are in flight.
+auth_executor = BoundedExecutor(app.config['AUTH_WORKERS'], app.config['AUTH_MAX_PENDING'], 'auth')
+
+# (specialization_id, date) -> pre-grouped free slots for find_doctors
+availability_cache = LRUCache(app.config['AVAILABILITY_CACHE_SIZE'], app.config['AVAILABILITY_CACHE_TTL'])
+
+# Specializations rarely change; cached per Specialization TableVersion, so a
+# change committed by any process is picked up on the next lookup.
+reference_cache = LRUCache(max_entries=8)
+
+# user_id -> resolved identity (role, doctor/patient id, blacklist status)
+identity_cache = LRUCache(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+
+# patient_id -> PatientTimeline for consultation_form and view_patient_history,
+# bounded by entry count and by the approximate bytes of the cached text.
+# Unknown patient ids are not cached: the id may be registered a moment later.
+timeline_cache = LRUCache(app.config['TIMELINE_CACHE_SIZE'], app.config['TIMELINE_CACHE_TTL'],
+                          max_bytes=app.config['TIMELINE_CACHE_BYTES'],
+                          sizeof=lambda timeline: timeline.nbytes, cache_none=False)
+
+TIMELINE_QUERY = """
+    SELECT 
+        a.patient_id,
+        t.treatment_date, t.diagnosis, t.prescription, t.doctor_notes, 
+        d.name AS doctor_name, 
+        s.name AS specialization
+    FROM Treatment t
+    JOIN Appointment a ON t.appointment_id = a.id
+    JOIN Doctor d ON a.doctor_id = d.id
+    JOIN Specialization s ON d.specialization_id = s.id
+    WHERE {where}
+    ORDER BY t.treatment_date DESC
+"""
+# Tables whose changes can alter a timeline. The Appointment row behind a
+# treatment never changes once the treatment is recorded, so bookings and
+# cancellations do not count.
+TIMELINE_TABLES = ('Treatment', 'Patient', 'Doctor', 'Specialization')
+
+# Those counters are global, so a timeline older than them is checked against
+# what its own records depend on before being reloaded: the patient's name,
+# and per treating doctor that doctor's name and specialization along with
+# the count and newest id of the patient's treatments. Treatments are never
+# edited, so this changes whenever the patient's timeline would.
+TIMELINE_VALIDATOR_QUERY = """
+    SELECT
+        p.id AS patient_id, p.name AS patient_name,
+        d.id AS doctor_id, d.name AS doctor_name, s.name AS specialization,
+        COUNT(t.id) AS treatments, MAX(t.id) AS last_treatment_id
+    FROM Patient p
+    LEFT JOIN Appointment a ON a.patient_id = p.id
+    LEFT JOIN Treatment t ON t.appointment_id = a.id
+    LEFT JOIN Doctor d ON a.doctor_id = d.id
+    LEFT JOIN Specialization s ON d.specialization_id = s.id
+    WHERE p.id IN ({placeholders})
+    GROUP BY p.id, d.id
+"""
+
+# (fragment name, key...) -> rendered markup of a {% cache %} template block
+fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'],
+                          max_bytes=app.config['FRAGMENT_CACHE_BYTES'], sizeof=len)
+app.jinja_env.fragment_cache = fragment_cache
+
+# (specialization_id, date) -> open slot_feed streams for that search
+slot_events = EventHub(app.config['SLOT_FEED_MAX_SUBSCRIBERS'], app.config['SLOT_FEED_MAX_PENDING'])
+
+IDENTITY_QUERY = """
+    SELECT 
+        u.id AS user_id, u.username, u.role, u.password_hash,
+        d.id AS doctor_id, p.id AS patient_id,
+        COALESCE(d.is_blacklisted, p.is_blacklisted, 0) AS is_blacklisted
+    FROM User u
+    LEFT JOIN Doctor d ON d.user_id = u.id
+    LEFT JOIN Patient p ON p.user_id = u.id
+    WHERE {where}
+"""
+IDENTITY_FIELDS = ('user_id', 'username', 'role', 'doctor_id', 'patient_id', 'is_blacklisted')
+
+# Flags set by another worker process take up to BLACKLIST_CHECK_INTERVAL seconds to apply here.
+blacklist = BlacklistRegistry(load_blacklists, read_blacklist_versions, app.config['BLACKLIST_CHECK_INTERVAL'])
+
+
+class BookingRejected(Exception):
+    pass
+
+
+class BatchRejected(Exception):
+    pass
+
+
+metrics = Metrics(app.config['QUERY_BUDGET'])
+metrics.add_gauges('hms_db_pool', pool_stats)
+metrics.add_gauges('hms_db_replica', replica_stats)
+metrics.add_gauges('hms_db_writer', writer_stats)
+metrics.add_gauges('hms_availability_cache', availability_cache.snapshot)
+metrics.add_gauges('hms_identity_cache', identity_cache.snapshot)
+metrics.add_gauges('hms_timeline_cache', timeline_cache.snapshot)
+metrics.add_gauges('hms_fragment_cache', fragment_cache.snapshot)
+metrics.add_gauges('hms_slot_events', slot_events.snapshot)
+metrics.add_gauges('hms_auth_executor', auth_executor.snapshot)
+if app.config['SQL_METRICS']:
+    set_query_observer(metrics)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.request_started()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        metrics.request_finished(request.endpoint, time.perf_counter() - started)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    # Large HTML pages (report tables, histories) go out gzip- or, when the
+    # brotli package is installed, br-encoded. Streamed bodies are left alone.
+    if (response.status_code != 200 or response.mimetype != 'text/html' or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+    if encoding is None:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=min(app.config['COMPRESS_LEVEL'], 11)))
+    else:
+        response.set_data(gzip.compress(body, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # Each encoding is a different representation and needs its own validator.
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+
+@app.teardown_appcontext
+def return_db_connections(exc):
+    # Hand back any pooled connection a route left open (e.g. on an exception).
+    release_thread_connections()
 
 
 def is_logged_in(f):
@@ -16,18 +253,270 @@ def is_logged_in(f):
     wrapper.__name__ = f.__name__
     return wrapper
 
+PROFILE_KEYS = {'Doctor': 'doctor_id', 'Patient': 'patient_id'}
+
+def session_role_error(*roles):
+    """None if the session may act in one of `roles`, else 'login', 'role', 'profile' or 'suspended'.
+
+    Resolves the doctor/patient id into the session on first use and
+    clears the session of a suspended account.
+    """
+    if 'logged_in' not in session:
+        return 'login'
+    role = session.get('role')
+    if role not in roles:
+        return 'role'
+    profile_key = PROFILE_KEYS.get(role)
+    if profile_key and profile_key not in session:
+        identity = get_identity(session['user_id'])
+        if not identity or not identity[profile_key]:
+            return 'profile'
+        session[profile_key] = identity[profile_key]
+    if profile_key and is_blacklisted(role, session[profile_key]):
+        session.clear()
+        return 'suspended'
+    return None
+
 def has_role(required_role):
     def decorator(f):
         @is_logged_in
         def wrapper(*args, **kwargs):
-            if session.get('role') != required_role:
+            error = session_role_error(required_role)
+            if error == 'role':
                 flash(f'Access denied. Only {required_role} can access this.', 'danger')
                 return redirect(url_for('dashboard')) 
+            if error == 'profile':
+                return redirect(url_for('dashboard'))
+            if error == 'suspended':
+                flash('Your account has been suspended. Please contact the Admin.', 'danger')
+                return redirect(url_for('login'))
             return f(*args, **kwargs)
         wrapper.__name__ = f.__name__
         return wrapper
     return decorator
 
+def conditional_get(*tables, replica=False, resource=None):
+    """Answers GETs with 304 Not Modified while none of `tables` has changed.
+
+    The ETag covers the URL, the user, the templates and the tables'
+    TableVersion counters, so a revalidation costs one counter read and the
+    view itself only runs when the page could have changed. Routes that
+    read the replica pass replica=True so the validator never runs ahead of
+    the data it describes. Pages carrying a flash message are not validated.
+
+    A view rendered from a cached object passes resource(versions, **view_args),
+    which returns that object no older than `versions` (or None). The ETag
+    then covers the object's digest instead of the counters, so it always
+    describes the body that is sent, and the view reads the object from
+    g.resource.
+    """
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or '_flashes' in session:
+                if resource is not None:
+                    g.resource = resource(None, *args, **kwargs)
+                return f(*args, **kwargs)
+            conn = get_read_connection() if replica else get_db_connection()
+            versions, changed_at = read_table_versions(conn, tables)
+            conn.close()
+            state = versions
+            if resource is not None:
+                g.resource = resource(versions, *args, **kwargs)
+                if g.resource is None:
+                    return f(*args, **kwargs)
+                state = g.resource.digest
+            etag = hashlib.sha1(json.dumps(
+                [request.full_path, session.get('user_id'), template_digest(), state]).encode()).hexdigest()
+            last_modified = datetime.fromtimestamp(changed_at, timezone.utc)
+
+            matched = matching_etag(etag)
+            if matched or (matched is None and request.if_modified_since
+                           and last_modified <= request.if_modified_since):
+                response = app.response_class(status=304)
+                response.set_etag(matched or etag)
+                response.vary.add('Accept-Encoding')
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+def matching_etag(etag):
+    """The client's tag for any encoding of `etag`; False on a mismatch, None without If-None-Match."""
+    if not request.if_none_match:
+        return None
+    for tag in (etag, f'{etag}-gzip', f'{etag}-br'):
+        if request.if_none_match.contains(tag):
+            return tag
+    return False
+
+@lru_cache(maxsize=1)
+def template_digest():
+    # Part of every ETag, so a deploy that changes markup invalidates cached pages.
+    digest = hashlib.sha1()
+    for name in sorted(app.jinja_env.list_templates(extensions=['html'])):
+        digest.update(app.jinja_env.loader.get_source(app.jinja_env, name)[0].encode())
+    return digest.hexdigest()
+
+def is_blacklisted(role, profile_id):
+    if role == 'Doctor':
+        return blacklist.is_doctor_blacklisted(profile_id)
+    if role == 'Patient':
+        return blacklist.is_patient_blacklisted(profile_id)
+    return False
+
+def load_identity(user_id):
+    conn = get_db_connection()
+    row = conn.execute(IDENTITY_QUERY.format(where='u.id = ?'), (user_id,)).fetchone()
+    conn.close()
+    return {field: row[field] for field in IDENTITY_FIELDS} if row else None
+
+def get_identity(user_id):
+    """Resolved identity for a user, served from identity_cache after the first lookup."""
+    return identity_cache.get_or_load(user_id, lambda: load_identity(user_id))
+
+def invalidate_identity(user_id):
+    identity_cache.invalidate(user_id)
+
+def get_page_size():
+    default = app.config['REPORT_PAGE_SIZE']
+    try:
+        size = int(request.args.get('per_page', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, app.config['REPORT_MAX_PAGE_SIZE']))
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('ascii')
+
+def decode_cursor(token, length):
+    """Returns the keyset values from a page token, or None for the first page."""
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    # Anything else in a tampered token would fail to bind as a query parameter.
+    if not all(isinstance(value, (str, int, float)) for value in values):
+        return None
+    return values
+
+def iter_batches(query, params=(), batch_size=None):
+    """Yields lists of rows from a read replica connection held only while iterating."""
+    batch_size = batch_size or app.config['REPORT_FETCH_BATCH']
+    conn = get_read_connection()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def iter_query(query, params=()):
+    for rows in iter_batches(query, params):
+        yield from rows
+
+def fetch_page(query, params, page_size, cursor_columns):
+    """Runs a keyset query (which must end in LIMIT ?) on the read replica and returns (rows, next_cursor)."""
+    conn = get_read_connection()
+    rows = conn.execute(query, (*params, page_size + 1)).fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1][col] for col in cursor_columns)
+    return rows, next_cursor
+
+def render_report(template, rows_name, rows_query, params, cursor_columns, descending=False, **context):
+    """Renders an admin report either one keyset page at a time or, with ?stream=1, as a stream of every row."""
+    if request.args.get('stream') == '1':
+        rows = iter_query(rows_query.format(where='', limit=''), params)
+        context.update({rows_name: rows, 'next_cursor': None, 'streaming': True})
+        return app.response_class(stream_with_context(stream_template(template, **context)))
+
+    page_size = get_page_size()
+    after = decode_cursor(request.args.get('after'), len(cursor_columns))
+    where = ''
+    if after:
+        where = 'WHERE ({}) {} ({})'.format(', '.join(cursor_columns.values()),
+                                            '<' if descending else '>',
+                                            ', '.join('?' * len(cursor_columns)))
+    query = rows_query.format(where=where, limit='LIMIT ?')
+    rows, next_cursor = fetch_page(query, (*params, *(after or ())), page_size, cursor_columns)
+    context.update({rows_name: rows, 'next_cursor': next_cursor, 'page_size': page_size,
+                    'is_first_page': after is None, 'streaming': False})
+    return render_template(template, **context)
+
+def invalidate_availability(specialization_id, dates=None):
+    """Drops cached slot searches for a specialization, optionally only for some dates."""
+    specialization_id = int(specialization_id)
+    if dates is None:
+        availability_cache.invalidate_where(lambda key: key[0] == specialization_id)
+    else:
+        dates = set(dates)
+        availability_cache.invalidate_where(lambda key: key[0] == specialization_id and key[1] in dates)
+
+def invalidate_doctor_slots(doctor_id):
+    """Drops a doctor's cached availability grid fragments after their slots change."""
+    fragment_cache.invalidate_where(lambda key: key[:2] == ('doctor_availability', doctor_id))
+
+def sse_event(kind, payload):
+    return f'event: {kind}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'.encode()
+
+def publish_slot_booked(slot):
+    slot_events.publish((int(slot['specialization_id']), slot['date']),
+                        sse_event('booked', {'availability_id': slot['availability_id']}))
+
+def publish_slot_opened(slot):
+    """Announces a new or freed slot to its search's live feeds, unless its doctor is blacklisted."""
+    if slot['availability_id'] is None or blacklist.is_doctor_blacklisted(slot['doctor_id']):
+        return
+    slot_events.publish((int(slot['specialization_id']), slot['date']), sse_event('opened', {
+        'availability_id': slot['availability_id'], 'doctor_id': slot['doctor_id'],
+        'doctor_name': slot['doctor_name'], 'time': slot['time']}))
+
+def reset_slot_feeds(specialization_id, dates=None):
+    """Sends open feeds for a specialization (optionally only some dates) a fresh snapshot."""
+    specialization_id = int(specialization_id)
+    dates = None if dates is None else set(dates)
+    slot_events.reset_where(lambda topic: topic[0] == specialization_id and (dates is None or topic[1] in dates))
+
+def get_specializations(version=None):
+    """Every specialization as of `version`, the Specialization TableVersion (read here if not given)."""
+    if version is None:
+        conn = get_db_connection()
+        (version,), _ = read_table_versions(conn, ('Specialization',))
+        conn.close()
+
+    def load():
+        conn = get_db_connection()
+        rows = conn.execute("SELECT id, name FROM Specialization ORDER BY name").fetchall()
+        conn.close()
+        return tuple({'id': row['id'], 'name': row['name']} for row in rows)
+    return reference_cache.get_or_load(('specializations', version), load)
+
+def doctor_specialization(conn, doctor_id):
+    row = conn.execute("SELECT specialization_id FROM Doctor WHERE id = ?", (doctor_id,)).fetchone()
+    return row['specialization_id'] if row else None
+
+@lru_cache(maxsize=1)
+def dummy_password_hash():
+    return hash_password(os.urandom(16).hex())
+
 #Routes
 @app.route('/')
 def index():
@@ -35,28 +524,70 @@ def index():
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+def authenticate(username, password):
+    """Checks a username/password; returns (identity, None) or (None, 'busy' | 'suspended' | 'invalid')."""
+    conn = get_db_connection()
+    user = conn.execute(IDENTITY_QUERY.format(where='u.username = ?'), (username,)).fetchone()
+    conn.close()
+
+    # Unknown usernames still pay for a verification so timing does not reveal them.
+    stored_hash = user['password_hash'] if user else dummy_password_hash()
+    try:
+        ok, upgraded_hash = auth_executor.submit(check_password, password, stored_hash).result(
+            timeout=app.config['AUTH_TIMEOUT'])
+    except (QueueFull, FutureTimeout):
+        return None, 'busy'
+
+    if user and ok and upgraded_hash:
+        conn = get_db_connection()
+        conn.execute("UPDATE User SET password_hash = ? WHERE id = ?", (upgraded_hash, user['user_id']))
+        conn.commit()
+        conn.close()
+
+    if not (user and ok):
+        return None, 'invalid'
+    identity = {field: user[field] for field in IDENTITY_FIELDS}
+    if is_blacklisted(identity['role'], identity['doctor_id'] or identity['patient_id']):
+        return None, 'suspended'
+    identity_cache.set(identity['user_id'], identity)
+    return identity, None
+
+def hash_new_password(password):
+    """hash_password() on the auth pool, like logins; returns None when the pool is saturated."""
+    try:
+        return auth_executor.submit(hash_password, password).result(timeout=app.config['AUTH_TIMEOUT'])
+    except (QueueFull, FutureTimeout):
+        return None
+
+def start_session(identity):
+    session['logged_in'] = True
+    session['user_id'] = identity['user_id']
+    session['username'] = identity['username']
+    session['role'] = identity['role']
+    if identity['doctor_id']:
+        session['doctor_id'] = identity['doctor_id']
+    if identity['patient_id']:
+        session['patient_id'] = identity['patient_id']
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
-        password = request.form['password']
-        password_hash = hash_password(password)
-        
-        conn = get_db_connection()
-        user = conn.execute("SELECT id, username, role FROM User WHERE username = ? AND password_hash = ?", 
-                            (username, password_hash)).fetchone()
-        conn.close()
-
-        if user:
-            session['logged_in'] = True
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['role'] = user['role']
-            flash('Logged in successfully!', 'success')
-            return redirect(url_for('dashboard'))
-        
-        flash('Invalid username or password.', 'danger')
-        return render_template('login.html', username=username)
+        identity, error = authenticate(username, request.form['password'])
+
+        if error == 'busy':
+            flash('The server is busy. Please try logging in again shortly.', 'danger')
+            return render_template('login.html', username=username), 503, {'Retry-After': '1'}
+        if error == 'suspended':
+            flash('Your account has been suspended. Please contact the Admin.', 'danger')
+            return render_template('login.html', username=username), 403
+        if error:
+            flash('Invalid username or password.', 'danger')
+            return render_template('login.html', username=username)
+
+        start_session(identity)
+        flash('Logged in successfully!', 'success')
+        return redirect(url_for('dashboard'))
     
     return render_template('login.html')
 
@@ -71,35 +602,28 @@ def logout():
 @is_logged_in
 def dashboard():
     role = session['role']
-    user_id = session['user_id']
-    
-    conn = get_db_connection()
     
     if role == 'Admin':
-        conn.close()
         return redirect(url_for('admin_dashboard'))
+
+    identity = get_identity(session['user_id'])
         
-    elif role == 'Doctor':
-        doctor = conn.execute("SELECT id FROM Doctor WHERE user_id = ?", (user_id,)).fetchone()
-        conn.close()
-        if doctor:
-            session['doctor_id'] = doctor['id']
+    if role == 'Doctor':
+        if identity and identity['doctor_id']:
+            session['doctor_id'] = identity['doctor_id']
             return redirect(url_for('doctor_dashboard'))
         flash('Doctor profile not found. Contact Admin.', 'danger')
         session.clear()
         return redirect(url_for('login'))
 
     elif role == 'Patient':
-        patient = conn.execute("SELECT id FROM Patient WHERE user_id = ?", (user_id,)).fetchone()
-        conn.close()
-        if patient:
-            session['patient_id'] = patient['id']
+        if identity and identity['patient_id']:
+            session['patient_id'] = identity['patient_id']
             return redirect(url_for('patient_dashboard'))
         flash('Patient profile not found. Please register.', 'danger')
         session.clear()
         return redirect(url_for('login'))
             
-    conn.close()
     return redirect(url_for('login')) 
 
 
@@ -109,15 +633,22 @@ def dashboard():
 @has_role('Admin')
 def admin_dashboard():
     conn = get_db_connection()
-    total_doctors = conn.execute("SELECT COUNT(*) FROM Doctor").fetchone()[0]
-    total_patients = conn.execute("SELECT COUNT(*) FROM Patient").fetchone()[0]
-    total_appointments = conn.execute("SELECT COUNT(*) FROM Appointment").fetchone()[0]
+    # Counters are maintained by triggers (see database.STAT_TRIGGERS), so this is one small read.
+    counters = conn.execute("""
+        SELECT c.name, c.value, s.name AS specialization
+        FROM StatCounter c
+        LEFT JOIN Specialization s ON c.name = 'specialization_doctors:' || s.id
+    """).fetchall()
     conn.close()
-    
+
+    stats = {row['name']: row['value'] for row in counters}
     context = {
-        'total_doctors': total_doctors,
-        'total_patients': total_patients,
-        'total_appointments': total_appointments,
+        'total_doctors': stats.get('doctors', 0),
+        'total_patients': stats.get('patients', 0),
+        'total_appointments': stats.get('appointments', 0),
+        'appointments_by_status': {status: stats.get(f'appointments:{status}', 0) for status in APPOINTMENT_STATUSES},
+        'doctors_by_specialization': sorted((row['specialization'], row['value']) for row in counters
+                                            if row['specialization'] and row['value']),
         'section_title': 'Admin Dashboard'
     }
     return render_template('admin/dashboard.html', **context)
@@ -138,8 +669,8 @@ def manage_doctors():
             ORDER BY d.name
         """).fetchall()
         
-        specializations = conn.execute("SELECT id, name FROM Specialization ORDER BY name").fetchall()
         conn.close()
+        specializations = get_specializations()
         
         context = {
             'doctors': doctors,
@@ -160,7 +691,11 @@ def manage_doctors():
             conn.close()
             return redirect(url_for('manage_doctors'))
 
-        password_hash = hash_password(password)
+        password_hash = hash_new_password(password)
+        if password_hash is None:
+            flash('The server is busy. Please try adding the doctor again shortly.', 'danger')
+            conn.close()
+            return redirect(url_for('manage_doctors'))
         cursor = conn.cursor()
         
         try:
@@ -191,7 +726,7 @@ def manage_doctors():
 def toggle_doctor_blacklist(doctor_id):
     conn = get_db_connection()
     
-    doctor = conn.execute("SELECT name, is_blacklisted FROM Doctor WHERE id = ?", (doctor_id,)).fetchone()
+    doctor = conn.execute("SELECT name, is_blacklisted, specialization_id, user_id FROM Doctor WHERE id = ?", (doctor_id,)).fetchone()
     if not doctor:
         conn.close()
         flash('Doctor not found.', 'danger')
@@ -204,6 +739,10 @@ def toggle_doctor_blacklist(doctor_id):
     conn.execute("UPDATE Doctor SET is_blacklisted = ? WHERE id = ?", (new_status, doctor_id))
     conn.commit()
     conn.close()
+    blacklist.set_doctor(doctor_id, new_status)
+    invalidate_availability(doctor['specialization_id'])
+    reset_slot_feeds(doctor['specialization_id'])
+    invalidate_identity(doctor['user_id'])
     
     flash(f'Doctor {doctor["name"]} has been successfully {action}.', 'info')
     return redirect(url_for('manage_doctors'))
@@ -223,11 +762,21 @@ def edit_doctor(doctor_id):
             flash('Name, specialization, and contact info are required.', 'danger')
         else:
             try:
+                previous = conn.execute("SELECT user_id, specialization_id FROM Doctor WHERE id = ?",
+                                        (doctor_id,)).fetchone()
                 conn.execute("""
                     UPDATE Doctor SET name = ?, specialization_id = ?, contact_info = ?
                     WHERE id = ?
                 """, (name, specialization_id, contact_info, doctor_id))
                 conn.commit()
+                if previous:
+                    invalidate_availability(previous['specialization_id'])
+                    reset_slot_feeds(previous['specialization_id'])
+                    invalidate_identity(previous['user_id'])
+                invalidate_availability(specialization_id)
+                reset_slot_feeds(specialization_id)
+                # Timeline records carry the doctor's name and specialization.
+                timeline_cache.clear()
                 flash(f'Doctor details updated successfully!', 'success')
             except sqlite3.IntegrityError:
                 flash('An error occurred during update.', 'danger')
@@ -242,8 +791,8 @@ def edit_doctor(doctor_id):
         WHERE d.id = ?
     """, (doctor_id,)).fetchone()
     
-    specializations = conn.execute("SELECT id, name FROM Specialization ORDER BY name").fetchall()
     conn.close()
+    specializations = get_specializations()
 
     if not doctor_data:
         flash('Doctor not found.', 'danger')
@@ -259,10 +808,9 @@ def edit_doctor(doctor_id):
 
 @app.route('/admin/appointments')
 @has_role('Admin')
+@conditional_get('Appointment', 'Patient', 'Doctor', 'Specialization', replica=True)
 def view_all_appointments():
-    conn = get_db_connection()
-    
-    appointments = conn.execute("""
+    appointments_query = """
         SELECT 
             a.id, a.date, a.time, a.status,
             p.name AS patient_name,
@@ -272,59 +820,177 @@ def view_all_appointments():
         JOIN Patient p ON a.patient_id = p.id
         JOIN Doctor d ON a.doctor_id = d.id
         JOIN Specialization s ON d.specialization_id = s.id
-        ORDER BY a.date DESC, a.time DESC
-    """).fetchall()
-    
-    conn.close()
-    
-    context = {
-        'appointments': appointments,
-        'section_title': 'All Appointments Report'
-    }
-    return render_template('admin/all_appointments.html', **context)
+        {where}
+        ORDER BY a.date DESC, a.time DESC, a.id DESC
+        {limit}
+    """
+    return render_report('admin/all_appointments.html', 'appointments', appointments_query, (),
+                         {'date': 'a.date', 'time': 'a.time', 'id': 'a.id'}, descending=True,
+                         section_title='All Appointments Report')
 
 
 @app.route('/admin/patients')
 @has_role('Admin')
+@conditional_get('Patient', replica=True)
 def view_all_patients():
-    conn = get_db_connection()
-    
-    patients = conn.execute("""
+    patients_query = """
         SELECT id, name, contact_info FROM Patient
-        ORDER BY name
-    """).fetchall()
-    
-    conn.close()
-    
-    context = {
-        'patients': patients,
-        'section_title': 'All Registered Patients'
-    }
-    return render_template('admin/all_patients.html', **context)
+        {where}
+        ORDER BY name, id
+        {limit}
+    """
+    return render_report('admin/all_patients.html', 'patients', patients_query, (),
+                         {'name': 'name', 'id': 'id'},
+                         section_title='All Registered Patients')
+
+
+EXPORT_QUERIES = {
+    'appointments': ("""
+        SELECT 
+            a.id, a.date, a.time, a.status,
+            p.id AS patient_id, p.name AS patient_name,
+            d.id AS doctor_id, d.name AS doctor_name,
+            s.name AS specialization
+        FROM Appointment a
+        JOIN Patient p ON a.patient_id = p.id
+        JOIN Doctor d ON a.doctor_id = d.id
+        JOIN Specialization s ON d.specialization_id = s.id
+        WHERE {filters}
+        ORDER BY a.id
+    """, ('id', 'date', 'time', 'status', 'patient_id', 'patient_name',
+          'doctor_id', 'doctor_name', 'specialization')),
+    'treatments': ("""
+        SELECT 
+            t.id, t.appointment_id, a.date, a.time, a.status,
+            a.patient_id, a.doctor_id,
+            t.diagnosis, t.prescription, t.doctor_notes, t.treatment_date
+        FROM Treatment t
+        JOIN Appointment a ON t.appointment_id = a.id
+        WHERE {filters}
+        ORDER BY t.id
+    """, ('id', 'appointment_id', 'date', 'time', 'status', 'patient_id', 'doctor_id',
+          'diagnosis', 'prescription', 'doctor_notes', 'treatment_date')),
+}
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+APPOINTMENT_STATUSES = ('Booked', 'Completed', 'Cancelled')
+
+def export_filters():
+    """Builds the WHERE clause for ?start_date, ?end_date and ?status, or raises ValueError."""
+    clauses, params = ['1 = 1'], []
+    for arg, op in (('start_date', '>='), ('end_date', '<=')):
+        value = request.args.get(arg)
+        if value:
+            # Bound normalised: fromisoformat also accepts forms like 20240105,
+            # which would compare as text against the stored YYYY-MM-DD dates.
+            clauses.append(f'a.date {op} ?')
+            params.append(date.fromisoformat(value).isoformat())
+    status = request.args.get('status')
+    if status:
+        if status not in APPOINTMENT_STATUSES:
+            raise ValueError(f'Unknown status {status!r}')
+        clauses.append('a.status = ?')
+        params.append(status)
+    return ' AND '.join(clauses), params
+
+def stream_csv(batches, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_jsonl(batches, columns):
+    dumps = json.dumps
+    for rows in batches:
+        yield ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+@app.route('/admin/metrics')
+@has_role('Admin')
+def admin_metrics():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/admin/export/<dataset>.<fmt>')
+@has_role('Admin')
+def export_dataset(dataset, fmt):
+    if dataset not in EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        flash('Unknown export requested.', 'danger')
+        return redirect(url_for('admin_dashboard'))
+
+    try:
+        filters, params = export_filters()
+    except ValueError as e:
+        return f'Invalid export filter: {e}', 400
+
+    query, columns = EXPORT_QUERIES[dataset]
+    batches = iter_batches(query.format(filters=filters), params, app.config['EXPORT_FETCH_BATCH'])
+    body = stream_csv(batches, columns) if fmt == 'csv' else stream_jsonl(batches, columns)
+    return Response(body, mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={dataset}.{fmt}',
+    })
 
 
 #Doctor routes
 
+def expand_schedule(start_date, end_date, weekdays, start_time, end_time, slot_length, excluded_dates=()):
+    """Expands a recurring weekly schedule into (date, start_time) string pairs.
+
+    `weekdays` uses date.weekday() numbering (Monday is 0). A slot is only
+    produced if it fits entirely before `end_time`.
+    """
+    day_times = []
+    slot_start = start_time
+    while slot_start + slot_length <= end_time:
+        day_times.append(slot_start.strftime('%H:%M'))
+        slot_start += slot_length
+
+    slots = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays and day not in excluded_dates:
+            day_str = day.strftime('%Y-%m-%d')
+            slots.extend((day_str, t) for t in day_times)
+        day += timedelta(days=1)
+    return slots
+
+def count_schedule_slots(start_date, end_date, weekdays, start_time, end_time, slot_length, excluded_dates=()):
+    """How many slots expand_schedule() would produce, worked out without expanding them."""
+    per_day = (end_time - start_time) // slot_length
+    weeks, extra_days = divmod((end_date - start_date).days + 1, 7)
+    first = start_date.weekday()
+    days = weeks * len(weekdays & set(range(7))) + sum(1 for i in range(extra_days) if (first + i) % 7 in weekdays)
+    days -= sum(1 for day in excluded_dates if start_date <= day <= end_date and day.weekday() in weekdays)
+    return max(0, days) * max(0, per_day)
+
+def insert_availability_slots(conn, doctor_id, slots):
+    """Inserts (date, start_time) slots in one statement, returning (created, skipped). The caller commits."""
+    before = conn.total_changes
+    conn.executemany("INSERT OR IGNORE INTO DoctorAvailability (doctor_id, date, start_time) VALUES (?, ?, ?)",
+                     [(doctor_id, slot_date, slot_time) for slot_date, slot_time in slots])
+    created = conn.total_changes - before
+    return created, len(slots) - created
+
+
 @app.route('/doctor/dashboard')
 @has_role('Doctor')
 def doctor_dashboard():
     doctor_id = session.get('doctor_id')
-    conn = get_db_connection()
-    
-    
+    try:
+        window = int(request.args.get('days', app.config['DOCTOR_DASHBOARD_DAYS']))
+    except ValueError:
+        window = app.config['DOCTOR_DASHBOARD_DAYS']
+    window = max(1, min(window, app.config['DOCTOR_DASHBOARD_MAX_DAYS']))
+
     today = date.today()
-    next_seven_days = [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
-    
-    availability = conn.execute("""
-        SELECT id, date, start_time, is_booked FROM DoctorAvailability 
-        WHERE doctor_id = ? AND date BETWEEN ? AND ?
-        ORDER BY date, start_time
-    """, (doctor_id, next_seven_days[0], next_seven_days[-1])).fetchall()
-    
-    grouped_availability = {}
-    for day in next_seven_days:
-        grouped_availability[day] = [slot for slot in availability if slot['date'] == day]
+    window_dates = [(today + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(window)]
 
+    conn = get_db_connection()
     
     upcoming_appointments = conn.execute("""
         SELECT 
@@ -361,8 +1027,11 @@ def doctor_dashboard():
     
     context = {
         'doctor_id': doctor_id,
-        'next_seven_days': next_seven_days,
-        'grouped_availability': grouped_availability,
+        'window_dates': window_dates,
+        'window_days': window,
+        'today_str': today.strftime('%Y-%m-%d'),
+        # Only queried when the cached availability grid fragment is missing.
+        'load_availability': lambda: load_doctor_availability(doctor_id, window_dates),
         'upcoming_appointments': upcoming_appointments,
         'recent_completed': recent_completed,
         'section_title': 'Doctor Dashboard'
@@ -370,6 +1039,33 @@ def doctor_dashboard():
     return render_template('doctor/dashboard.html', **context)
 
 
+def load_doctor_availability(doctor_id, days):
+    """A doctor's slots over consecutive days, grouped by day."""
+    conn = get_db_connection()
+    availability = conn.execute("""
+        SELECT id, date, start_time, is_booked FROM DoctorAvailability 
+        WHERE doctor_id = ? AND date BETWEEN ? AND ?
+        ORDER BY date, start_time
+    """, (doctor_id, days[0], days[-1])).fetchall()
+    conn.close()
+    
+    # Rows arrive ordered by date, so one pass appends each slot to its day.
+    grouped_availability = {day: [] for day in days}
+    for slot in availability:
+        grouped_availability[slot['date']].append(slot)
+    return grouped_availability
+
+
+# A slot as the live slot feed announces it
+SLOT_EVENT_QUERY = """
+    SELECT 
+        da.id AS availability_id, da.doctor_id, da.date, da.start_time AS time,
+        d.name AS doctor_name, d.specialization_id
+    FROM DoctorAvailability da
+    JOIN Doctor d ON da.doctor_id = d.id
+    WHERE da.doctor_id = ? AND da.date = ? AND da.start_time = ?
+"""
+
 @app.route('/doctor/set_availability', methods=['POST'])
 @has_role('Doctor')
 def set_availability():
@@ -391,29 +1087,85 @@ def set_availability():
         flash('Invalid date format.', 'danger')
         return redirect(url_for('doctor_dashboard'))
 
-    conn = get_db_connection()
-    
+    def add_slot(conn):
+        created, _ = insert_availability_slots(conn, doctor_id, [(date_str, time_str)])
+        return created, conn.execute(SLOT_EVENT_QUERY, (doctor_id, date_str, time_str)).fetchone()
+
     try:
-        existing_slot = conn.execute("""
-            SELECT * FROM DoctorAvailability 
-            WHERE doctor_id = ? AND date = ? AND start_time = ?
-        """, (doctor_id, date_str, time_str)).fetchone()
-        
-        if existing_slot:
-            flash(f'Slot on {date_str} at {time_str} already exists!', 'info')
-        else:
-            conn.execute("INSERT INTO DoctorAvailability (doctor_id, date, start_time) VALUES (?, ?, ?)",
-                         (doctor_id, date_str, time_str))
-            conn.commit()
-            flash(f'Availability added for {date_str} at {time_str}.', 'success')
-            
+        created, slot = batched_write(add_slot)
     except sqlite3.IntegrityError as e:
         flash(f'Database error: Slot conflicts with an existing entry: {e}', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+    except sqlite3.Error as e:
+        flash(f'An unexpected error occurred: {e}', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+
+    if not created:
+        flash(f'Slot on {date_str} at {time_str} already exists!', 'info')
+    else:
+        invalidate_availability(slot['specialization_id'], [date_str])
+        invalidate_doctor_slots(doctor_id)
+        publish_slot_opened(slot)
+        flash(f'Availability added for {date_str} at {time_str}.', 'success')
+    return redirect(url_for('doctor_dashboard'))
+
+
+@app.route('/doctor/set_schedule', methods=['POST'])
+@has_role('Doctor')
+def set_schedule():
+    doctor_id = session.get('doctor_id')
+    weekdays = request.form.getlist('weekdays')
+    exclusions = request.form.get('exclusions', '')
+
+    try:
+        start_date = date.fromisoformat(request.form.get('start_date', ''))
+        end_date = date.fromisoformat(request.form.get('end_date', ''))
+        start_time = datetime.strptime(request.form.get('start_time', ''), '%H:%M')
+        end_time = datetime.strptime(request.form.get('end_time', ''), '%H:%M')
+        slot_minutes = int(request.form.get('slot_minutes', ''))
+        excluded_dates = {date.fromisoformat(d.strip()) for d in exclusions.split(',') if d.strip()}
+        weekdays = {int(d) for d in weekdays}
+    except ValueError:
+        flash('Please provide valid dates, times, slot length and weekdays.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+
+    if not weekdays or slot_minutes <= 0 or end_date < start_date or end_time <= start_time:
+        flash('Choose at least one weekday, a positive slot length and ranges that end after they start.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+    if start_date < date.today():
+        flash('Cannot add availability for a past date.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+    if (end_date - start_date).days >= app.config['MAX_SCHEDULE_DAYS']:
+        flash(f'A schedule can span at most {app.config["MAX_SCHEDULE_DAYS"]} days per submission.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+
+    # Checked before expanding, so an oversized form never builds its slot list.
+    slot_length = timedelta(minutes=slot_minutes)
+    count = count_schedule_slots(start_date, end_date, weekdays, start_time, end_time, slot_length, excluded_dates)
+    if count > app.config['MAX_SCHEDULE_SLOTS']:
+        flash(f'That schedule would create {count} slots; the limit is '
+              f'{app.config["MAX_SCHEDULE_SLOTS"]} per submission.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
+
+    slots = expand_schedule(start_date, end_date, weekdays, start_time, end_time, slot_length, excluded_dates)
+
+    conn = get_db_connection()
+    try:
+        created, skipped = insert_availability_slots(conn, doctor_id, slots)
+        specialization_id = doctor_specialization(conn, doctor_id)
+        conn.commit()
+        if created:
+            invalidate_availability(specialization_id, {slot_date for slot_date, _ in slots})
+            invalidate_doctor_slots(doctor_id)
+            reset_slot_feeds(specialization_id, {slot_date for slot_date, _ in slots})
+        flash(f'Schedule published: {created} slots created, {skipped} already existed.', 'success')
+    except sqlite3.Error as e:
         conn.rollback()
-        
+        flash(f'Database error while publishing schedule: {e}', 'danger')
     finally:
         conn.close()
-        return redirect(url_for('doctor_dashboard'))
+
+    return redirect(url_for('doctor_dashboard'))
 
 
 @app.route('/doctor/consult/<int:appointment_id>', methods=['GET'])
@@ -427,27 +1179,20 @@ def consultation_form(appointment_id):
         JOIN Patient p ON a.patient_id = p.id
         WHERE a.id = ? AND a.doctor_id = ? AND a.status = 'Booked'
     """, (appointment_id, session.get('doctor_id'))).fetchone()
+    conn.close()
     
     if not appointment:
         flash('Appointment not found or not ready for consultation.', 'danger')
-        conn.close()
         return redirect(url_for('doctor_dashboard'))
 
-    
-    history = conn.execute("""
-        SELECT 
-            t.treatment_date, t.diagnosis 
-        FROM Treatment t
-        JOIN Appointment a ON t.appointment_id = a.id
-        WHERE a.patient_id = ?
-        ORDER BY t.treatment_date DESC
-    """, (appointment['patient_id'],)).fetchall()
+    timeline = get_timeline(appointment['patient_id'])
+    if not timeline:
+        flash('Patient not found.', 'danger')
+        return redirect(url_for('doctor_dashboard'))
 
-    conn.close()
-    
     context = {
         'appointment': appointment,
-        'history': history,
+        'summary': timeline.summary(app.config['CONSULTATION_SUMMARY_SIZE']),
         'section_title': f"Consultation: {appointment['patient_name']}"
     }
     return render_template('doctor/consultation_form.html', **context)
@@ -464,120 +1209,288 @@ def submit_treatment(appointment_id):
         flash('Diagnosis is required to submit treatment.', 'danger')
         return redirect(url_for('consultation_form', appointment_id=appointment_id))
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    doctor_id = session.get('doctor_id')
     try:
-        
-        appointment = cursor.execute("""
-            SELECT id, doctor_id, patient_id 
-            FROM Appointment 
-            WHERE id = ? AND doctor_id = ? AND status = 'Booked'
-        """, (appointment_id, session.get('doctor_id'))).fetchone()
-
-        if not appointment:
-            flash('Invalid appointment or status.', 'danger')
-            conn.close()
-            return redirect(url_for('doctor_dashboard'))
-
-        
-        cursor.execute("UPDATE Appointment SET status = 'Completed' WHERE id = ?", (appointment_id,))
-        
-        
-        cursor.execute("""
-            INSERT INTO Treatment (appointment_id, diagnosis, prescription, doctor_notes)
-            VALUES (?, ?, ?, ?)
-        """, (appointment_id, diagnosis, prescription, doctor_notes))
-        
-        conn.commit()
-        flash('Treatment record saved and appointment marked as completed!', 'success')
-
+        appointment, record, versions = batched_write(lambda conn: complete_appointment(
+            conn, appointment_id, doctor_id, diagnosis, prescription, doctor_notes))
     except sqlite3.IntegrityError as e:
-        conn.rollback()
         flash(f'Error saving treatment (Treatment record may already exist): {e}', 'danger')
+        return redirect(url_for('doctor_dashboard'))
     except Exception as e:
-        conn.rollback()
         flash(f'An unexpected error occurred: {e}', 'danger')
-    finally:
-        conn.close()
+        return redirect(url_for('doctor_dashboard'))
 
+    if not appointment:
+        flash('Invalid appointment or status.', 'danger')
+    else:
+        fold_treatment(appointment['patient_id'], record, versions)
+        flash('Treatment record saved and appointment marked as completed!', 'success')
     return redirect(url_for('doctor_dashboard'))
 
+def complete_appointment(conn, appointment_id, doctor_id, diagnosis, prescription, doctor_notes):
+    """Records a treatment for one of the doctor's Booked appointments and marks it Completed.
+
+    Returns (appointment, timeline record, (the patient's timeline validator
+    before the write, and the TIMELINE_TABLES versions and validator after
+    it)), or (None, None, None) if the appointment is not the doctor's or
+    not Booked. Runs inside the caller's write transaction.
+    """
+    appointment = conn.execute("""
+        SELECT id, doctor_id, patient_id 
+        FROM Appointment 
+        WHERE id = ? AND doctor_id = ? AND status = 'Booked'
+    """, (appointment_id, doctor_id)).fetchone()
+    if not appointment:
+        return None, None, None
+
+    patient_ids = [appointment['patient_id']]
+    before = read_timeline_validators(conn, patient_ids).get(appointment['patient_id'])
+    conn.execute("UPDATE Appointment SET status = 'Completed' WHERE id = ?", (appointment_id,))
+    treatment_id = conn.execute("""
+        INSERT INTO Treatment (appointment_id, diagnosis, prescription, doctor_notes)
+        VALUES (?, ?, ?, ?)
+    """, (appointment_id, diagnosis, prescription, doctor_notes)).lastrowid
+    record = conn.execute(TIMELINE_QUERY.format(where='t.id = ?'), (treatment_id,)).fetchone()
+    after = read_timeline_validators(conn, patient_ids).get(appointment['patient_id'])
+    return appointment, record, (before, read_table_versions(conn, TIMELINE_TABLES)[0], after)
+
+def fold_treatment(patient_id, record, versions):
+    """Adds a just-committed treatment to the patient's cached timeline.
+
+    `versions` are complete_appointment's (validator before, versions and
+    validator after). The record is only folded into a timeline whose
+    validator matches the one the write started from; one that had already
+    fallen behind, e.g. to a write committed by another process, is dropped
+    and reloaded on next use.
+    """
+    before, after, validator = versions
+    timeline_cache.update(patient_id, lambda timeline: (
+        timeline.with_record(record, after, validator) if timeline.validator == before else None))
+
 
 @app.route('/doctor/cancel_appointment/<int:appointment_id>', methods=['POST'])
 @has_role('Doctor')
 def cancel_appointment(appointment_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    doctor_id = session.get('doctor_id')
     try:
-        
-        appointment = cursor.execute("""
-            SELECT id, date, time 
-            FROM Appointment 
-            WHERE id = ? AND doctor_id = ? AND status = 'Booked'
-        """, (appointment_id, session.get('doctor_id'))).fetchone()
-        
-        if not appointment:
-            flash('Appointment not found or cannot be cancelled.', 'danger')
-            conn.close()
-            return redirect(url_for('doctor_dashboard'))
-
-        
-        cursor.execute("""
-            UPDATE DoctorAvailability SET is_booked = 0 
-            WHERE doctor_id = ? AND date = ? AND start_time = ?
-        """, (session.get('doctor_id'), appointment['date'], appointment['time']))
+        appointment = batched_write(
+            lambda conn: cancel_booked_appointment(conn, appointment_id, 'doctor_id', doctor_id))
+    except sqlite3.Error as e:
+        flash(f'An error occurred during cancellation: {e}', 'danger')
+        return redirect(url_for('doctor_dashboard'))
 
-        
-        cursor.execute("UPDATE Appointment SET status = 'Cancelled' WHERE id = ?", (appointment_id,))
-        
-        conn.commit()
+    if not appointment:
+        flash('Appointment not found or cannot be cancelled.', 'danger')
+    else:
+        invalidate_availability(appointment['specialization_id'], [appointment['date']])
+        invalidate_doctor_slots(appointment['doctor_id'])
+        publish_slot_opened(appointment)
         flash('Appointment successfully cancelled and time slot freed up.', 'info')
-
-    except Exception as e:
-        conn.rollback()
-        flash(f'An error occurred during cancellation: {e}', 'danger')
-    finally:
-        conn.close()
     
     return redirect(url_for('doctor_dashboard'))
 
 
 @app.route('/doctor/history/<int:patient_id>', methods=['GET'])
 @has_role('Doctor')
+@conditional_get(*TIMELINE_TABLES, resource=lambda versions, patient_id: get_timeline(patient_id, versions))
 def view_patient_history(patient_id):
-    conn = get_db_connection()
-    
-    patient = conn.execute("SELECT name FROM Patient WHERE id = ?", (patient_id,)).fetchone()
-    if not patient:
+    timeline = g.resource
+    if not timeline:
         flash('Patient not found.', 'danger')
-        conn.close()
         return redirect(url_for('doctor_dashboard'))
 
-    history = conn.execute("""
-        SELECT 
-            t.treatment_date, t.diagnosis, t.prescription, t.doctor_notes, 
-            d.name AS doctor_name, 
-            s.name AS specialization
-        FROM Treatment t
-        JOIN Appointment a ON t.appointment_id = a.id
-        JOIN Doctor d ON a.doctor_id = d.id
-        JOIN Specialization s ON d.specialization_id = s.id
-        WHERE a.patient_id = ?
-        ORDER BY t.treatment_date DESC
-    """, (patient_id,)).fetchall()
-    
-    conn.close()
-    
     context = {
-        'patient_name': patient['name'],
-        'history': history,
-        'section_title': f"Treatment History for {patient['name']}"
+        'patient_name': timeline.patient_name,
+        'history': timeline.records,
+        'section_title': f"Treatment History for {timeline.patient_name}"
     }
     return render_template('doctor/patient_history.html', **context)
 
 
+def load_timeline(patient_id):
+    return load_timelines([patient_id]).get(patient_id)
+
+def get_timeline(patient_id, versions=None):
+    """A patient's treatment timeline from timeline_cache, reloaded if it is older than `versions`.
+
+    `versions` are the current TIMELINE_TABLES counters; they are read here
+    when the caller has not already done so.
+    """
+    return get_timelines([patient_id], versions)[patient_id]
+
+def load_timelines(patient_ids):
+    """{patient_id: PatientTimeline} for every existing patient in `patient_ids`, read in one transaction.
+
+    Reads the primary: a timeline cached from a stale replica would miss
+    treatments that submit_treatment has already folded in.
+    """
+    placeholders = ', '.join('?' * len(patient_ids))
+    conn = get_db_connection()
+    conn.execute('BEGIN')
+    versions, _ = read_table_versions(conn, TIMELINE_TABLES)
+    validators = read_timeline_validators(conn, patient_ids)
+    names = dict(conn.execute(f"SELECT id, name FROM Patient WHERE id IN ({placeholders})", patient_ids).fetchall())
+    rows = {patient_id: [] for patient_id in names}
+    for row in conn.execute(TIMELINE_QUERY.format(where=f'a.patient_id IN ({placeholders})'), patient_ids):
+        rows[row['patient_id']].append(row)
+    conn.rollback()
+    conn.close()
+    return {patient_id: PatientTimeline.from_rows(names[patient_id], rows[patient_id], versions,
+                                                  validators[patient_id])
+            for patient_id in names}
+
+def read_timeline_validators(conn, patient_ids):
+    """{patient_id: validator} for every existing patient in `patient_ids`; see TIMELINE_VALIDATOR_QUERY."""
+    validators = {}
+    for row in conn.execute(TIMELINE_VALIDATOR_QUERY.format(placeholders=', '.join('?' * len(patient_ids))),
+                            patient_ids):
+        doctors = validators.setdefault(row['patient_id'], (row['patient_name'], []))[1]
+        if row['treatments']:
+            doctors.append((row['doctor_id'], row['doctor_name'], row['specialization'],
+                            row['treatments'], row['last_treatment_id']))
+    return {patient_id: (name, tuple(sorted(doctors))) for patient_id, (name, doctors) in validators.items()}
+
+def get_timelines(patient_ids, versions=None):
+    """get_timeline() for several patients; cache misses and outdated entries are loaded together.
+
+    An entry older than `versions` whose validator still matches is kept and
+    restamped, so writes for other patients cost one validator read rather
+    than a reload.
+    """
+    if versions is None:
+        conn = get_db_connection()
+        versions, _ = read_table_versions(conn, TIMELINE_TABLES)
+        conn.close()
+    timelines = timeline_cache.get_many_or_load(patient_ids, load_timelines)
+    outdated = [patient_id for patient_id, timeline in timelines.items()
+                if timeline and timeline.is_older_than(versions)]
+    if outdated:
+        conn = get_db_connection()
+        validators = read_timeline_validators(conn, outdated)
+        conn.close()
+        unchanged = [patient_id for patient_id in outdated
+                     if validators.get(patient_id) == timelines[patient_id].validator]
+        for patient_id in unchanged:
+            # The validator was read after `versions`, so the records are at least that current.
+            timeline = timelines[patient_id]
+            timelines[patient_id] = timeline.as_of(versions)
+            timeline_cache.update(patient_id, lambda cached: timelines[patient_id] if cached is timeline else cached)
+        outdated = [patient_id for patient_id in outdated if patient_id not in unchanged]
+    if outdated:
+        reloaded = load_timelines(outdated)
+        for patient_id in outdated:
+            timelines[patient_id] = reloaded.get(patient_id)
+            if timelines[patient_id]:
+                timeline_cache.set(patient_id, timelines[patient_id])
+            else:
+                timeline_cache.invalidate(patient_id)
+    return timelines
+
+
+
+def cancel_booked_appointment(conn, appointment_id, owner_column, owner_id):
+    """Cancels a Booked appointment owned by a doctor or patient and frees its slot.
+
+    Returns the cancelled appointment row, or None if there was nothing to cancel.
+    Runs inside the caller's write transaction.
+    """
+    appointment = conn.execute(f"""
+        SELECT a.id, a.doctor_id, a.date, a.time, d.specialization_id,
+               d.name AS doctor_name, da.id AS availability_id
+        FROM Appointment a
+        JOIN Doctor d ON a.doctor_id = d.id
+        LEFT JOIN DoctorAvailability da 
+            ON da.doctor_id = a.doctor_id AND da.date = a.date AND da.start_time = a.time
+        WHERE a.id = ? AND a.{owner_column} = ? AND a.status = 'Booked'
+    """, (appointment_id, owner_id)).fetchone()
+    if not appointment:
+        return None
+
+    conn.execute("UPDATE Appointment SET status = 'Cancelled' WHERE id = ?", (appointment_id,))
+    conn.execute("""
+        UPDATE DoctorAvailability SET is_booked = 0 
+        WHERE doctor_id = ? AND date = ? AND start_time = ?
+    """, (appointment['doctor_id'], appointment['date'], appointment['time']))
+    return appointment
+
+
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+
+TREATMENT_SEARCH_QUERY = f"""
+    SELECT 
+        t.id, t.treatment_date, t.appointment_id,
+        p.id AS patient_id, p.name AS patient_name,
+        d.name AS doctor_name,
+        snippet(TreatmentSearch, -1, '{SNIPPET_START}', '{SNIPPET_END}', '…', 16) AS snippet
+    FROM TreatmentSearch
+    JOIN Treatment t ON t.id = TreatmentSearch.rowid
+    JOIN Appointment a ON t.appointment_id = a.id
+    JOIN Patient p ON a.patient_id = p.id
+    JOIN Doctor d ON a.doctor_id = d.id
+    WHERE TreatmentSearch MATCH ?
+    ORDER BY bm25(TreatmentSearch)
+    LIMIT ? OFFSET ?
+"""
+
+# Used only when SQLite was built without FTS5.
+TREATMENT_LIKE_QUERY = """
+    SELECT 
+        t.id, t.treatment_date, t.appointment_id,
+        p.id AS patient_id, p.name AS patient_name,
+        d.name AS doctor_name,
+        t.diagnosis AS snippet
+    FROM Treatment t
+    JOIN Appointment a ON t.appointment_id = a.id
+    JOIN Patient p ON a.patient_id = p.id
+    JOIN Doctor d ON a.doctor_id = d.id
+    WHERE {conditions}
+    ORDER BY t.treatment_date DESC
+    LIMIT ? OFFSET ?
+"""
+
+def highlight_snippet(text):
+    """Escapes a stored snippet, then turns the FTS match markers into <mark> tags."""
+    escaped = str(escape(text or ''))
+    return Markup(escaped.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+def search_treatment_records(terms, page, page_size):
+    conn = get_read_connection()
+    if has_treatment_search(conn):
+        # Quote every term so user input can never be parsed as FTS5 syntax.
+        match = ' '.join('"{}"'.format(term) for term in terms)
+        rows = conn.execute(TREATMENT_SEARCH_QUERY, (match, page_size + 1, (page - 1) * page_size)).fetchall()
+    else:
+        condition = "(t.diagnosis LIKE ? OR t.prescription LIKE ? OR t.doctor_notes LIKE ?)"
+        params = [f'%{term}%' for term in terms for _ in range(3)]
+        rows = conn.execute(TREATMENT_LIKE_QUERY.format(conditions=' AND '.join([condition] * len(terms))),
+                            (*params, page_size + 1, (page - 1) * page_size)).fetchall()
+    conn.close()
+    return rows[:page_size], len(rows) > page_size
+
+
+@app.route('/doctor/search', methods=['GET'])
+@has_role('Doctor')
+def search_treatments():
+    query_text = request.args.get('q', '').strip()
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    terms = re.findall(r'\w+', query_text)
+    results, has_next = [], False
+    if terms:
+        results, has_next = search_treatment_records(terms, page, app.config['SEARCH_PAGE_SIZE'])
+
+    context = {
+        'query': query_text,
+        'results': [dict(row, snippet=highlight_snippet(row['snippet'])) for row in results],
+        'page': page,
+        'has_next': has_next,
+        'section_title': 'Search Treatment Records'
+    }
+    return render_template('doctor/search.html', **context)
+
 
 #Patient routes
 
@@ -594,7 +1507,10 @@ def patient_register():
             flash('All fields are required!', 'danger')
             return render_template('patient/register.html', section_title='Patient Registration')
 
-        password_hash = hash_password(password)
+        password_hash = hash_new_password(password)
+        if password_hash is None:
+            flash('The server is busy. Please try registering again shortly.', 'danger')
+            return render_template('patient/register.html', section_title='Patient Registration'), 503, {'Retry-After': '1'}
         conn = get_db_connection()
         cursor = conn.cursor()
 
@@ -634,76 +1550,71 @@ def patient_register():
 @app.route('/patient/dashboard')
 @has_role('Patient')
 def patient_dashboard():
-    conn = get_db_connection()
     patient_id = session.get('patient_id')
+    current_date_str = date.today().strftime('%Y-%m-%d')
+    page_size = app.config['PATIENT_HISTORY_PAGE_SIZE']
+    after = decode_cursor(request.args.get('history_after'), 3)
+
+    conn = get_db_connection()
     
-    specializations = conn.execute("SELECT id, name FROM Specialization").fetchall()
-    
-    
-    all_appointments = conn.execute("""
+    upcoming_appointments = conn.execute("""
+        SELECT 
+            a.id, a.date, a.time, a.status, 
+            d.name AS doctor_name, 
+            s.name AS specialization_name
+        FROM Appointment a
+        JOIN Doctor d ON a.doctor_id = d.id
+        JOIN Specialization s ON d.specialization_id = s.id
+        WHERE a.patient_id = ? AND a.status = 'Booked' AND a.date >= ?
+        ORDER BY a.date, a.time
+        LIMIT ?
+    """, (patient_id, current_date_str, app.config['PATIENT_UPCOMING_LIMIT'])).fetchall()
+
+    # Everything that is not an upcoming booking, newest first, one keyset page at a time.
+    history_appointments = conn.execute("""
         SELECT 
             a.id, a.date, a.time, a.status, 
             d.name AS doctor_name, 
             s.name AS specialization_name,
-            -- Check for a linked treatment record
-            EXISTS(SELECT 1 FROM Treatment t WHERE t.appointment_id = a.id) AS has_treatment
+            t.id IS NOT NULL AS has_treatment
         FROM Appointment a
         JOIN Doctor d ON a.doctor_id = d.id
         JOIN Specialization s ON d.specialization_id = s.id
+        LEFT JOIN Treatment t ON t.appointment_id = a.id
         WHERE a.patient_id = ? 
-        ORDER BY a.date DESC, a.time DESC
-    """, (patient_id,)).fetchall()
+            AND (a.status != 'Booked' OR a.date < ?)
+            {}
+        ORDER BY a.date DESC, a.time DESC, a.id DESC
+        LIMIT ?
+    """.format('AND (a.date, a.time, a.id) < (?, ?, ?)' if after else ''),
+        (patient_id, current_date_str, *(after or ()), page_size + 1)).fetchall()
+    (specializations_version,), _ = read_table_versions(conn, ('Specialization',))
 
     conn.close()
-    
-    
-    current_date_str = date.today().strftime('%Y-%m-%d')
 
-    upcoming_appointments = [
-        appt for appt in all_appointments 
-        if appt['status'] == 'Booked' and appt['date'] >= current_date_str
-    ]
-    history_appointments = [
-        appt for appt in all_appointments 
-        if appt['status'] != 'Booked' or (appt['status'] == 'Booked' and appt['date'] < current_date_str)
-    ]
+    history_next = None
+    if len(history_appointments) > page_size:
+        history_appointments = history_appointments[:page_size]
+        last = history_appointments[-1]
+        history_next = encode_cursor((last['date'], last['time'], last['id']))
 
     context = {
         'patient_id': patient_id,
-        'specializations': specializations,
+        'specializations': get_specializations(specializations_version),
+        'specializations_version': specializations_version,
         'upcoming_appointments': upcoming_appointments,
         'history_appointments': history_appointments,
+        'history_next': history_next,
+        'history_is_first_page': after is None,
         'today': current_date_str, 
         'section_title': 'Patient Dashboard'
     }
     return render_template('patient/dashboard.html', **context)
 
 
-@app.route('/patient/find_doctors', methods=['POST'])
-@has_role('Patient')
-def find_doctors():
-    specialization_id = request.form.get('specialization_id')
-    appointment_date_str = request.form.get('appointment_date')
-    
-    if not specialization_id or not appointment_date_str:
-        flash('Please select a specialization and a date to search.', 'danger')
-        return redirect(url_for('patient_dashboard'))
-
+def load_available_doctors(specialization_id, appointment_date_str):
+    """Free slots for one specialization and date, grouped by doctor; None if there are none."""
     conn = get_db_connection()
-    
-    
-    try:
-        appointment_date = date.fromisoformat(appointment_date_str)
-        if appointment_date < date.today():
-            flash('Cannot book appointments for a past date.', 'danger')
-            conn.close()
-            return redirect(url_for('patient_dashboard'))
-    except ValueError:
-        flash('Invalid date format.', 'danger')
-        conn.close()
-        return redirect(url_for('patient_dashboard'))
-
-    
     available_slots = conn.execute("""
         SELECT 
             da.id AS availability_id, 
@@ -718,20 +1629,15 @@ def find_doctors():
             da.date = ? 
             AND s.id = ? 
             AND da.is_booked = 0 
-            AND d.is_blacklisted = 0  -- Filter out blacklisted doctors
         ORDER BY d.name, da.start_time
     """, (appointment_date_str, specialization_id)).fetchall()
-    
     conn.close()
 
-    if not available_slots:
-        flash(f'No available appointments found for {appointment_date_str} in this specialization.', 'info')
-        return redirect(url_for('patient_dashboard'))
-
-    
     doctors_with_slots = {}
     for slot in available_slots:
         doctor_id = slot['doctor_id']
+        if blacklist.is_doctor_blacklisted(doctor_id):
+            continue
         if doctor_id not in doctors_with_slots:
             doctors_with_slots[doctor_id] = {
                 'name': slot['doctor_name'],
@@ -742,66 +1648,198 @@ def find_doctors():
             'availability_id': slot['availability_id'],
             'time': slot['start_time']
         })
-    
-    context = {
+
+    if not doctors_with_slots:
+        return None
+
+    return {
         'doctors_with_slots': doctors_with_slots,
-        'appointment_date': appointment_date_str,
         'specialization_name': available_slots[0]['specialization_name'],
+    }
+
+
+def validate_slot_search(specialization_id, appointment_date_str):
+    """Returns ((specialization_id, 'YYYY-MM-DD'), None) or (None, error message)."""
+    if not specialization_id or not appointment_date_str:
+        return None, 'Please select a specialization and a date to search.'
+
+    try:
+        specialization_id = int(specialization_id)
+        appointment_date = date.fromisoformat(appointment_date_str)
+    except (TypeError, ValueError):
+        return None, 'Invalid date format.'
+    if appointment_date < date.today():
+        return None, 'Cannot book appointments for a past date.'
+
+    return (specialization_id, appointment_date.strftime('%Y-%m-%d')), None
+
+def parse_slot_search():
+    """Returns (specialization_id, 'YYYY-MM-DD') from the find_doctors form, or flashes and returns None."""
+    parsed, error = validate_slot_search(request.form.get('specialization_id'), request.form.get('appointment_date'))
+    if error:
+        flash(error, 'danger')
+    return parsed
+
+def render_slot_search(search, parsed):
+    specialization_id, appointment_date_str = parsed
+    if not search:
+        flash(f'No available appointments found for {appointment_date_str} in this specialization.', 'info')
+        return redirect(url_for('patient_dashboard'))
+
+    context = {
+        'doctors_with_slots': search['doctors_with_slots'],
+        'specialization_id': specialization_id,
+        'appointment_date': appointment_date_str,
+        'specialization_name': search['specialization_name'],
         'section_title': 'Available Appointments'
     }
     return render_template('patient/available_appointments.html', **context)
 
-
-@app.route('/patient/book_appointment/<int:availability_id>', methods=['POST'])
+@app.route('/patient/find_doctors', methods=['POST'])
 @has_role('Patient')
-def book_appointment(availability_id):
-    patient_id = session.get('patient_id')
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def find_doctors():
+    parsed = parse_slot_search()
+    if not parsed:
+        return redirect(url_for('patient_dashboard'))
 
-    
-    slot = cursor.execute("""
-        SELECT doctor_id, date, start_time, is_booked 
-        FROM DoctorAvailability 
-        WHERE id = ?
-    """, (availability_id,)).fetchone()
+    specialization_id, appointment_date_str = parsed
+    search = availability_cache.get_or_load(
+        parsed, lambda: load_available_doctors(specialization_id, appointment_date_str))
+    return render_slot_search(search, parsed)
+
+def slot_search_payload(parsed, search):
+    """A find_doctors result as JSON for the API and the live slot feed."""
+    doctors = search['doctors_with_slots'] if search else {}
+    return {
+        'specialization_id': parsed[0],
+        'specialization': search['specialization_name'] if search else None,
+        'date': parsed[1],
+        'slot_columns': ('availability_id', 'time'),
+        'doctors': [{'id': doctor_id, 'name': doctor['name'],
+                     'slots': [[slot['availability_id'], slot['time']] for slot in doctor['slots']]}
+                    for doctor_id, doctor in doctors.items()],
+    }
 
-    if not slot or slot['is_booked']:
-        conn.close()
-        flash('Appointment slot is no longer available or does not exist.', 'danger')
-        return redirect(url_for('patient_dashboard'))
-        
-    doctor_id = slot['doctor_id']
-    appointment_date = slot['date']
-    appointment_time = slot['start_time']
 
+SSE_KEEPALIVE = b': keepalive\n\n'
+
+def slot_feed_prelude(topic, search):
+    return f"retry: {app.config['SLOT_FEED_RETRY_MS']}\n\n".encode() + sse_event(
+        'snapshot', slot_search_payload(topic, search))
+
+def slot_feed_response(body, subscription):
+    response = Response(body, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # A stream that is never iterated never reaches its finally block.
+    response.call_on_close(lambda: slot_events.unsubscribe(subscription))
+    return response
+
+SLOT_FEED_DISABLED = ('Live updates are not enabled on this server.', 404)
+
+@app.route('/patient/slot_feed', methods=['GET'])
+@has_role('Patient')
+def slot_feed():
+    """Server-sent events for one (specialization, date) search: a snapshot, then booked/opened slots.
+
+    This threaded version holds a request thread per subscriber; asgi.py
+    serves the same stream as a coroutine for large numbers of idle pages.
+    """
+    if not app.config['SLOT_FEED_ENABLED']:
+        return SLOT_FEED_DISABLED
+    topic, error = validate_slot_search(request.args.get('specialization_id'), request.args.get('date'))
+    if error:
+        return error, 400
+    wake = threading.Event()
     try:
-        
-        cursor.execute("UPDATE DoctorAvailability SET is_booked = 1 WHERE id = ?", (availability_id,))
+        subscription = slot_events.subscribe(topic, wake.set)
+    except QueueFull:
+        return 'Too many live updates open. Please refresh shortly.', 503, {'Retry-After': '5'}
+    return slot_feed_response(stream_slot_feed(subscription, wake), subscription)
 
-        
-        cursor.execute("""
-            INSERT INTO Appointment (patient_id, doctor_id, date, time, status)
-            VALUES (?, ?, ?, ?, 'Booked')
-        """, (patient_id, doctor_id, appointment_date, appointment_time))
-        
-        conn.commit()
-        flash(f'Appointment successfully booked on {appointment_date} at {appointment_time}!', 'success')
+def stream_slot_feed(subscription, wake):
+    topic = subscription.topic
 
-    except sqlite3.IntegrityError as e:
-        conn.rollback()
-        flash(f'Booking failed due to a database conflict: {e}', 'danger')
-    except Exception as e:
-        conn.rollback()
-        flash(f'An unexpected error occurred during booking: {e}', 'danger')
+    def load():
+        return availability_cache.get_or_load(topic, lambda: load_available_doctors(*topic))
+
+    try:
+        yield slot_feed_prelude(topic, load())
+        deadline = time.monotonic() + app.config['SLOT_FEED_MAX_AGE']
+        while time.monotonic() < deadline:
+            if not wake.wait(min(app.config['SLOT_FEED_HEARTBEAT'], max(0, deadline - time.monotonic()))):
+                yield SSE_KEEPALIVE
+                continue
+            wake.clear()
+            stale, events = slot_events.drain(subscription)
+            if stale:
+                yield sse_event('snapshot', slot_search_payload(topic, load()))
+            if events:
+                yield b''.join(events)
     finally:
-        conn.close()
+        slot_events.unsubscribe(subscription)
+
+
+def claim_slot(conn, availability_id, patient_id):
+    # The conditional UPDATE is the claim: only one writer can flip is_booked.
+    claimed = conn.execute("""
+        UPDATE DoctorAvailability SET is_booked = 1 
+        WHERE id = ? AND is_booked = 0
+    """, (availability_id,)).rowcount
+    if not claimed:
+        return None
+
+    slot = conn.execute("""
+        SELECT da.doctor_id, da.date, da.start_time, d.specialization_id 
+        FROM DoctorAvailability da
+        JOIN Doctor d ON da.doctor_id = d.id
+        WHERE da.id = ?
+    """, (availability_id,)).fetchone()
+    if blacklist.is_doctor_blacklisted(slot['doctor_id']):
+        raise BookingRejected('This doctor is not currently accepting appointments.')
+
+    appointment_id = conn.execute("""
+        INSERT INTO Appointment (patient_id, doctor_id, date, time, status)
+        VALUES (?, ?, ?, ?, 'Booked')
+    """, (patient_id, slot['doctor_id'], slot['date'], slot['start_time'])).lastrowid
+    return {**slot, 'availability_id': availability_id, 'appointment_id': appointment_id}
 
+def book_slot(availability_id, patient_id):
+    """Books a slot through the batch writer; returns (slot, None) or (None, error message).
+
+    Touches no request state, so it can run on any thread.
+    """
+    try:
+        slot = batched_write(lambda conn: claim_slot(conn, availability_id, patient_id))
+    except BookingRejected as e:
+        return None, str(e)
+    except sqlite3.IntegrityError as e:
+        return None, f'Booking failed due to a database conflict: {e}'
+    except sqlite3.Error as e:
+        return None, f'An unexpected error occurred during booking: {e}'
+
+    if not slot:
+        return None, 'Appointment slot is no longer available or does not exist.'
+    invalidate_availability(slot['specialization_id'], [slot['date']])
+    invalidate_doctor_slots(slot['doctor_id'])
+    publish_slot_booked(slot)
+    return slot, None
+
+def booking_redirect(slot, error):
+    if error:
+        flash(error, 'danger')
+    else:
+        flash(f'Appointment successfully booked on {slot["date"]} at {slot["start_time"]}!', 'success')
     return redirect(url_for('patient_dashboard'))
 
+@app.route('/patient/book_appointment/<int:availability_id>', methods=['POST'])
+@has_role('Patient')
+def book_appointment(availability_id):
+    return booking_redirect(*book_slot(availability_id, session.get('patient_id')))
+
 
 @app.route('/patient/view_treatment/<int:appointment_id>', methods=['GET'])
 @has_role('Patient')
+@conditional_get('Treatment', 'Appointment', 'Doctor', 'Specialization')
 def view_patient_treatment(appointment_id):
     conn = get_db_connection()
     patient_id = session.get('patient_id')
@@ -843,45 +1881,289 @@ def view_patient_treatment(appointment_id):
 @app.route('/patient/cancel_booking/<int:appointment_id>', methods=['POST'])
 @has_role('Patient')
 def patient_cancel_booking(appointment_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
     patient_id = session.get('patient_id')
+    try:
+        appointment = batched_write(
+            lambda conn: cancel_booked_appointment(conn, appointment_id, 'patient_id', patient_id))
+    except sqlite3.Error as e:
+        flash(f'An error occurred during cancellation: {e}', 'danger')
+        return redirect(url_for('patient_dashboard'))
+
+    if not appointment:
+        flash('Appointment not found or cannot be cancelled.', 'danger')
+    else:
+        invalidate_availability(appointment['specialization_id'], [appointment['date']])
+        invalidate_doctor_slots(appointment['doctor_id'])
+        publish_slot_opened(appointment)
+        flash('Appointment successfully cancelled and time slot freed up.', 'info')
     
+    return redirect(url_for('patient_dashboard'))
+
+
+# JSON API (v1) for kiosk and mobile clients. It authenticates with the same
+# session cookie as the HTML routes and reuses their write paths; errors come
+# back as {"error": message} with a matching status instead of flash and
+# redirect. Rows are serialized as arrays described by a "columns" list.
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+API_ROLE_ERRORS = {
+    'login': ('Authentication required.', 401),
+    'role': ('Access denied for this role.', 403),
+    'profile': ('No doctor or patient profile for this account.', 403),
+    'suspended': ('Your account has been suspended. Please contact the Admin.', 403),
+}
+API_LOGIN_ERRORS = {
+    'busy': ('The server is busy. Please try logging in again shortly.', 503),
+    'invalid': ('Invalid username or password.', 401),
+    'suspended': API_ROLE_ERRORS['suspended'],
+}
+APPOINTMENT_COLUMNS = ('id', 'doctor_id', 'date', 'time')
+
+def api_error(message, status):
+    return {'error': message}, status
+
+def api_role(*roles):
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            error = session_role_error(*roles)
+            if error:
+                return api_error(*API_ROLE_ERRORS[error])
+            return f(*args, **kwargs)
+        wrapper.__name__ = f.__name__
+        return wrapper
+    return decorator
+
+def parse_ids(values):
+    """Returns (distinct integer ids, None) or (None, error response) for a batch request."""
+    limit = app.config['API_BATCH_LIMIT']
+    if not isinstance(values, list):
+        return None, api_error('Expected a list of integer ids.', 400)
     try:
-        
-        appointment = cursor.execute("""
-            SELECT id, doctor_id, date, time 
-            FROM Appointment 
-            WHERE id = ? AND patient_id = ? AND status = 'Booked'
-        """, (appointment_id, patient_id)).fetchone()
-        
+        ids = list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        return None, api_error('Expected a list of integer ids.', 400)
+    if not ids:
+        return None, api_error('Expected at least one id.', 400)
+    if len(ids) > limit:
+        return None, api_error(f'At most {limit} ids per request.', 400)
+    return ids, None
+
+def json_body():
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+def appointment_row(slot):
+    return [slot['appointment_id'], slot['doctor_id'], slot['date'], slot['start_time']]
+
+def timeline_rows(timeline):
+    return [[record[field] for field in TIMELINE_FIELDS] for record in timeline.records]
+
+def claim_slots(conn, availability_ids, patient_id):
+    """claim_slot() for every id, all or nothing. Runs inside the caller's write transaction."""
+    slots = []
+    for availability_id in availability_ids:
+        slot = claim_slot(conn, availability_id, patient_id)
+        if not slot:
+            raise BatchRejected(f'Slot {availability_id} is no longer available or does not exist.')
+        slots.append(slot)
+    return slots
+
+def cancel_booked_appointments(conn, appointment_ids, owner_column, owner_id):
+    """cancel_booked_appointment() for every id, all or nothing. Runs inside the caller's write transaction."""
+    appointments = []
+    for appointment_id in appointment_ids:
+        appointment = cancel_booked_appointment(conn, appointment_id, owner_column, owner_id)
         if not appointment:
-            flash('Appointment not found or cannot be cancelled.', 'danger')
-            conn.close()
-            return redirect(url_for('patient_dashboard'))
+            raise BatchRejected(f'Appointment {appointment_id} not found or cannot be cancelled.')
+        appointments.append(appointment)
+    return appointments
 
-        
-        cursor.execute("""
-            UPDATE DoctorAvailability SET is_booked = 0 
-            WHERE doctor_id = ? AND date = ? AND start_time = ?
-        """, (appointment['doctor_id'], appointment['date'], appointment['time']))
 
-        
-        cursor.execute("UPDATE Appointment SET status = 'Cancelled' WHERE id = ?", (appointment_id,))
-        
-        conn.commit()
-        flash('Appointment successfully cancelled and time slot freed up.', 'info')
+@api.route('/session', methods=['POST'])
+def api_login():
+    body = json_body()
+    identity, error = authenticate(str(body.get('username', '')), str(body.get('password', '')))
+    if error == 'busy':
+        return {'error': API_LOGIN_ERRORS[error][0]}, 503, {'Retry-After': '1'}
+    if error:
+        return api_error(*API_LOGIN_ERRORS[error])
+    start_session(identity)
+    return {field: identity[field] for field in ('user_id', 'username', 'role', 'doctor_id', 'patient_id')}
 
-    except Exception as e:
-        conn.rollback()
-        flash(f'An error occurred during cancellation: {e}', 'danger')
-    finally:
-        conn.close()
-    
-    return redirect(url_for('patient_dashboard'))
+
+@api.route('/session', methods=['DELETE'])
+def api_logout():
+    session.clear()
+    return '', 204
+
+
+@api.route('/slots', methods=['GET'])
+@api_role('Patient')
+def api_find_slots():
+    parsed, error = validate_slot_search(request.args.get('specialization_id'), request.args.get('date'))
+    if error:
+        return api_error(error, 400)
+
+    search = availability_cache.get_or_load(parsed, lambda: load_available_doctors(*parsed))
+    return slot_search_payload(parsed, search)
+
+
+@api.route('/appointments', methods=['POST'])
+@api_role('Patient')
+def api_book_appointment():
+    ids, error = parse_ids([json_body().get('availability_id')])
+    if error:
+        return error
+
+    slot, message = book_slot(ids[0], session['patient_id'])
+    if message:
+        return api_error(message, 409)
+    return {'columns': APPOINTMENT_COLUMNS, 'appointment': appointment_row(slot)}, 201
+
+
+@api.route('/appointments/batch', methods=['POST'])
+@api_role('Patient')
+def api_book_appointments():
+    ids, error = parse_ids(json_body().get('availability_ids'))
+    if error:
+        return error
+
+    patient_id = session['patient_id']
+    try:
+        slots = batched_write(lambda conn: claim_slots(conn, ids, patient_id))
+    except (BatchRejected, BookingRejected) as e:
+        return api_error(str(e), 409)
+    except sqlite3.Error as e:
+        return api_error(f'Booking failed due to a database conflict: {e}', 409)
+
+    for slot in slots:
+        invalidate_availability(slot['specialization_id'], [slot['date']])
+        invalidate_doctor_slots(slot['doctor_id'])
+        publish_slot_booked(slot)
+    return {'columns': APPOINTMENT_COLUMNS, 'appointments': [appointment_row(slot) for slot in slots]}, 201
+
+
+@api.route('/appointments/<int:appointment_id>', methods=['DELETE'])
+@api_role('Patient', 'Doctor')
+def api_cancel_appointment(appointment_id):
+    return cancel_appointments_response([appointment_id])
+
+
+@api.route('/appointments/cancel', methods=['POST'])
+@api_role('Patient', 'Doctor')
+def api_cancel_appointments():
+    ids, error = parse_ids(json_body().get('appointment_ids'))
+    if error:
+        return error
+    return cancel_appointments_response(ids)
+
+def cancel_appointments_response(appointment_ids):
+    owner_column = PROFILE_KEYS[session['role']]
+    owner_id = session[owner_column]
+    try:
+        appointments = batched_write(
+            lambda conn: cancel_booked_appointments(conn, appointment_ids, owner_column, owner_id))
+    except BatchRejected as e:
+        return api_error(str(e), 404)
+    except sqlite3.Error as e:
+        return api_error(f'An error occurred during cancellation: {e}', 409)
+
+    for appointment in appointments:
+        invalidate_availability(appointment['specialization_id'], [appointment['date']])
+        invalidate_doctor_slots(appointment['doctor_id'])
+        publish_slot_opened(appointment)
+    return {'cancelled': appointment_ids}
+
+
+@api.route('/appointments/<int:appointment_id>/treatment', methods=['POST'])
+@api_role('Doctor')
+def api_submit_treatment(appointment_id):
+    body = json_body()
+    if not body.get('diagnosis'):
+        return api_error('Diagnosis is required to submit treatment.', 400)
+    for field in ('diagnosis', 'prescription', 'doctor_notes'):
+        if body.get(field) is not None and not isinstance(body[field], str):
+            return api_error(f'{field} must be a string.', 400)
+
+    doctor_id = session['doctor_id']
+    try:
+        appointment, record, versions = batched_write(lambda conn: complete_appointment(
+            conn, appointment_id, doctor_id, body['diagnosis'], body.get('prescription'), body.get('doctor_notes')))
+    except sqlite3.IntegrityError as e:
+        return api_error(f'Error saving treatment (Treatment record may already exist): {e}', 409)
+    except sqlite3.Error as e:
+        return api_error(f'An unexpected error occurred while saving treatment: {e}', 409)
+
+    if not appointment:
+        return api_error('Invalid appointment or status.', 404)
+    fold_treatment(appointment['patient_id'], record, versions)
+    return {'columns': TIMELINE_FIELDS, 'record': [record[field] for field in TIMELINE_FIELDS]}, 201
+
+
+@api.route('/patients/<int:patient_id>/history', methods=['GET'])
+@api_role('Doctor')
+@conditional_get(*TIMELINE_TABLES, resource=lambda versions, patient_id: get_timeline(patient_id, versions))
+def api_patient_history(patient_id):
+    timeline = g.resource
+    if not timeline:
+        return api_error('Patient not found.', 404)
+    return {'id': patient_id, 'name': timeline.patient_name,
+            'columns': TIMELINE_FIELDS, 'records': timeline_rows(timeline)}
+
+
+@api.route('/patients/history', methods=['GET'])
+@api_role('Doctor')
+def api_patient_histories():
+    ids, error = parse_ids(request.args.get('ids', '').split(','))
+    if error:
+        return error
+
+    timelines = get_timelines(ids)
+    return {
+        'columns': TIMELINE_FIELDS,
+        'patients': [{'id': patient_id, 'name': timelines[patient_id].patient_name,
+                      'records': timeline_rows(timelines[patient_id])}
+                     for patient_id in ids if timelines[patient_id]],
+        'missing': [patient_id for patient_id in ids if not timelines[patient_id]],
+    }
+
+
+app.register_blueprint(api)
+
+
+def precompile_templates():
+    """Compiles every template up front, writing bytecode for later processes to load."""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+if app.config['PRECOMPILE_TEMPLATES']:
+    precompile_templates()
+
+# However the app is started (python app.py, flask run, uvicorn asgi:application),
+# bring the schema up to date before the first request; a no-op once migrated.
+create_tables(verbose=False)
+
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard counters from the base tables."""
+    write_transaction(rebuild_stats)
+    print('Dashboard counters rebuilt.')
+
+
+@app.cli.command('check-stats')
+def check_stats_command():
+    """Compare the dashboard counters against the base tables."""
+    conn = get_db_connection()
+    mismatches = check_stats(conn)
+    conn.close()
+    for name, (stored, actual) in sorted(mismatches.items()):
+        print(f'{name}: stored {stored}, actual {actual}')
+    if mismatches:
+        raise SystemExit(1)
+    print('Dashboard counters are consistent.')
 
 
 if __name__ == '__main__':
-    create_tables() 
     seed_initial_data() 
     app.run(debug=True)
\ No newline at end of file
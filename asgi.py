@@ -0,0 +1,390 @@
+"""ASGI entry point that serves the booking hot path without a thread per request.
+
+    pip install uvicorn
+    uvicorn asgi:application
+
+find_doctors and book_appointment run as coroutines on the event loop and
+hand their database work to a bounded DB executor, so thousands of open
+requests can wait on it while holding nothing but a coroutine. Every other
+route runs the regular Flask app on a bounded thread pool. Either pool
+answers 503 once its queue is full rather than building an unbounded
+backlog. The live slot feed is served here as a coroutine too, so an idle
+subscriber costs a few small objects instead of a thread.
+"""
+import asyncio
+import contextvars
+import inspect
+import io
+import sys
+import threading
+import weakref
+
+from flask import redirect, request, session, url_for
+
+from app import (app, availability_cache, blacklist, metrics, has_role, parse_slot_search, render_slot_search,
+                 load_available_doctors, book_slot, booking_redirect, validate_slot_search, slot_events,
+                 slot_search_payload, slot_feed_prelude, slot_feed_response, sse_event, SSE_KEEPALIVE,
+                 SLOT_FEED_DISABLED)
+from workers import BoundedExecutor, QueueFull
+
+db_executor = BoundedExecutor(app.config['ASYNC_DB_WORKERS'], app.config['ASYNC_DB_MAX_PENDING'], 'db')
+wsgi_executor = BoundedExecutor(app.config['ASYNC_WSGI_WORKERS'], app.config['ASYNC_WSGI_MAX_PENDING'], 'wsgi')
+metrics.add_gauges('hms_db_executor', db_executor.snapshot)
+metrics.add_gauges('hms_wsgi_executor', wsgi_executor.snapshot)
+
+# Idle feeds are cheap here, so the available appointments page subscribes to them.
+app.config['SLOT_FEED_ENABLED'] = True
+
+# Streamed WSGI output is relayed in chunks of at least WSGI_CHUNK_BYTES, at
+# most WSGI_BUFFER of which may run ahead of a slow client.
+WSGI_CHUNK_BYTES = 16384
+WSGI_BUFFER = 8
+
+BUSY_RESPONSE = ('The server is busy. Please try again shortly.', 503, {'Retry-After': '1'})
+
+
+async def run_db(fn, *args):
+    """Runs fn(*args) on the DB executor; raises QueueFull when it is saturated.
+
+    The work runs in a copy of the caller's context, so its queries count
+    towards the request that issued it.
+    """
+    return await asyncio.wrap_future(db_executor.submit(contextvars.copy_context().run, fn, *args))
+
+
+@has_role('Patient')
+async def find_doctors():
+    parsed = parse_slot_search()
+    if not parsed:
+        return redirect(url_for('patient_dashboard'))
+
+    search = await availability_cache.get_or_load_async(parsed, lambda: run_db(load_available_doctors, *parsed))
+    return render_slot_search(search, parsed)
+
+
+@has_role('Patient')
+async def book_appointment(availability_id):
+    return booking_redirect(*await run_db(book_slot, availability_id, session.get('patient_id')))
+
+
+class LoopWaker:
+    """Wakes asyncio.Events from other threads with one call_soon_threadsafe per burst.
+
+    A slot booked at opening time can notify thousands of feeds on one
+    topic; waking each through its own call_soon_threadsafe would write to
+    the loop's self-pipe once per subscriber.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._ready = []
+        self._lock = threading.Lock()
+
+    def wake(self, event):
+        with self._lock:
+            self._ready.append(event)
+            if len(self._ready) > 1:
+                return
+        self.loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            ready, self._ready = self._ready, []
+        for event in ready:
+            event.set()
+
+
+_wakers = weakref.WeakKeyDictionary()
+
+def loop_waker():
+    loop = asyncio.get_running_loop()
+    waker = _wakers.get(loop)
+    if waker is None:
+        waker = _wakers[loop] = LoopWaker(loop)
+    return waker
+
+
+# topic -> in-flight availability load shared by every feed that needs a snapshot
+_slot_loads = {}
+
+async def load_slot_search(topic):
+    """availability_cache lookup for the feeds; concurrent misses on one topic share a single DB load."""
+    load = _slot_loads.get(topic)
+    if load is None:
+        load = asyncio.ensure_future(
+            availability_cache.get_or_load_async(topic, lambda: run_db(load_available_doctors, *topic)))
+        _slot_loads[topic] = load
+        load.add_done_callback(lambda _: _slot_loads.pop(topic, None))
+    return await asyncio.shield(load)
+
+
+@has_role('Patient')
+async def slot_feed():
+    if not app.config['SLOT_FEED_ENABLED']:
+        return SLOT_FEED_DISABLED
+    topic, error = validate_slot_search(request.args.get('specialization_id'), request.args.get('date'))
+    if error:
+        return error, 400
+    wake = asyncio.Event()
+    waker = loop_waker()
+    subscription = slot_events.subscribe(topic, lambda: waker.wake(wake))
+    response = slot_feed_response((), subscription)
+    response.chunks = stream_slot_feed(subscription, wake)
+    return response
+
+
+async def stream_slot_feed(subscription, wake):
+    topic = subscription.topic
+    loop = asyncio.get_running_loop()
+    try:
+        yield slot_feed_prelude(topic, await load_slot_search(topic))
+        deadline = loop.time() + app.config['SLOT_FEED_MAX_AGE']
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(wake.wait(), min(app.config['SLOT_FEED_HEARTBEAT'],
+                                                        max(0, deadline - loop.time())))
+            except asyncio.TimeoutError:
+                yield SSE_KEEPALIVE
+                continue
+            wake.clear()
+            stale, events = slot_events.drain(subscription)
+            if stale:
+                yield sse_event('snapshot', slot_search_payload(topic, await load_slot_search(topic)))
+            if events:
+                yield b''.join(events)
+    except QueueFull:
+        # The DB executor is saturated; end the stream and let EventSource reconnect.
+        pass
+    finally:
+        slot_events.unsubscribe(subscription)
+
+
+# Flask endpoint -> coroutine view served on the event loop
+ASYNC_VIEWS = {
+    'find_doctors': find_doctors,
+    'book_appointment': book_appointment,
+    'slot_feed': slot_feed,
+}
+
+
+def build_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = server[0], str(server[1] or 80)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    # The body has already been read in full, so its length is known even for chunked uploads.
+    environ['CONTENT_LENGTH'] = str(len(body))
+    environ.pop('HTTP_TRANSFER_ENCODING', None)
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def response_start(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]) if isinstance(status, str) else status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+async def dispatch_async(view, view_args, environ, receive, send):
+    """Runs a coroutine view inside a Flask request context, the way full_dispatch_request would."""
+    ctx = app.request_context(environ)
+    ctx.push()
+    error = None
+    try:
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = view(**view_args)
+                if inspect.isawaitable(rv):
+                    rv = await rv
+        except QueueFull:
+            rv = BUSY_RESPONSE
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+        response = app.finalize_request(rv)
+    except Exception as e:
+        error = e
+        response = app.handle_exception(e)
+    finally:
+        ctx.pop(error)
+
+    await send(response_start(response.status_code, response.headers.to_wsgi_list()))
+    try:
+        chunks = getattr(response, 'chunks', None)
+        if chunks is None:
+            await send({'type': 'http.response.body', 'body': b''.join(response.iter_encoded())})
+        else:
+            await stream_chunks(chunks, receive, send)
+    finally:
+        response.close()
+
+
+async def stream_chunks(chunks, receive, send):
+    """Sends an async iterator of bytes as the response body until it ends or the client disconnects."""
+    async def next_chunk():
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    # The request body has been read, so the next message is http.disconnect.
+    # Racing it against each chunk frees an idle stream as soon as its client
+    # leaves rather than at its next heartbeat.
+    disconnected = asyncio.ensure_future(receive())
+    try:
+        while True:
+            pending = asyncio.ensure_future(next_chunk())
+            await asyncio.wait((pending, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+                return
+            chunk = pending.result()
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await chunks.aclose()
+
+
+async def dispatch_wsgi(environ, send):
+    """Runs the Flask app on the WSGI pool, relaying (possibly streamed) output back to the loop."""
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue(WSGI_BUFFER)
+    abandoned = threading.Event()
+
+    def put(message):
+        if abandoned.is_set():
+            raise ConnectionAbortedError('client went away')
+        asyncio.run_coroutine_threadsafe(messages.put(message), loop).result()
+
+    def run():
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        try:
+            body = app(environ, start_response)
+            try:
+                sent_start = False
+                pending, size = [], 0
+                for chunk in body:
+                    if not sent_start:
+                        put(response_start(*started))
+                        sent_start = True
+                    pending.append(chunk)
+                    size += len(chunk)
+                    if size >= WSGI_CHUNK_BYTES:
+                        put({'type': 'http.response.body', 'body': b''.join(pending), 'more_body': True})
+                        pending, size = [], 0
+                if not sent_start:
+                    put(response_start(*started))
+                put({'type': 'http.response.body', 'body': b''.join(pending)})
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        except ConnectionAbortedError:
+            pass
+        except Exception as e:
+            put(e)
+        finally:
+            if not abandoned.is_set():
+                put(None)
+
+    try:
+        wsgi_executor.submit(run)
+    except QueueFull:
+        text, status, headers = BUSY_RESPONSE
+        await send(response_start(status, [('Content-Type', 'text/plain; charset=utf-8'), *headers.items()]))
+        await send({'type': 'http.response.body', 'body': text.encode()})
+        return
+
+    sent_start = False
+    try:
+        while True:
+            message = await messages.get()
+            if message is None:
+                break
+            if isinstance(message, Exception):
+                if not sent_start:
+                    await send(response_start(500, [('Content-Type', 'text/plain; charset=utf-8')]))
+                    await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+                break
+            await send(message)
+            sent_start = True
+    except BaseException:
+        # Unblock the worker so it can close the response iterator and exit.
+        abandoned.set()
+        while not messages.empty():
+            messages.get_nowait()
+        raise
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Load the blacklist registry off the loop before the first request needs it.
+            await run_db(blacklist.snapshot)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            db_executor.shutdown(wait=False)
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    environ = build_environ(scope, await read_body(receive))
+    adapter = app.url_map.bind_to_environ(environ)
+    try:
+        endpoint, view_args = adapter.match()
+    except Exception:
+        endpoint, view_args = None, None
+
+    view = ASYNC_VIEWS.get(endpoint)
+    if view is None:
+        await dispatch_wsgi(environ, send)
+    else:
+        await dispatch_async(view, view_args, environ, receive, send)
@@ -0,0 +1,152 @@
+"""Counts the requests each client flow needs through the HTML routes and the JSON API.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_api.py --db load.db --flows 200 --batch 3 --output api.json
+
+Three flows are run once per synthetic user through each interface:
+logging in, searching and booking one slot; booking --batch slots from one
+search; and a doctor reading --histories patients' treatment histories.
+The HTML flow follows redirects the way a browser would, and every
+redirect hop counts as a request. Each flow is reported as requests and
+response bytes per flow plus latency percentiles.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+
+import database
+from loadtest import BOOK_LINK, _percentile, load_accounts
+from seed_data import SYNTHETIC_PASSWORD, DOCTOR_USERNAME, PATIENT_USERNAME
+
+
+class Flow:
+    """Wraps a test client and totals the requests, bytes and time of one flow."""
+
+    def __init__(self, client):
+        self.client = client
+        self.requests = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def call(self, method, url, **kwargs):
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, follow_redirects=True, **kwargs)
+        self.seconds += time.perf_counter() - started
+        self.requests += 1 + len(response.history)
+        self.bytes += len(response.data) + sum(len(hop.data) for hop in response.history)
+        return response
+
+
+def html_booking(client, username, search, count):
+    flow = Flow(client)
+    flow.call('POST', '/login', data={'username': username, 'password': SYNTHETIC_PASSWORD})
+    page = flow.call('POST', '/patient/find_doctors', data={
+        'specialization_id': search[0], 'appointment_date': search[1]})
+    slot_ids = [int(slot_id) for slot_id in BOOK_LINK.findall(page.data)][:count]
+    for slot_id in slot_ids:
+        flow.call('POST', f'/patient/book_appointment/{slot_id}')
+    flow.call('GET', '/logout')
+    return flow, len(slot_ids)
+
+
+def api_booking(client, username, search, count):
+    flow = Flow(client)
+    flow.call('POST', '/api/v1/session', json={'username': username, 'password': SYNTHETIC_PASSWORD})
+    result = flow.call('GET', '/api/v1/slots', query_string={
+        'specialization_id': search[0], 'date': search[1]}).get_json()
+    slot_ids = [slot[0] for doctor in result['doctors'] for slot in doctor['slots']][:count]
+    if len(slot_ids) == 1:
+        flow.call('POST', '/api/v1/appointments', json={'availability_id': slot_ids[0]})
+    elif slot_ids:
+        flow.call('POST', '/api/v1/appointments/batch', json={'availability_ids': slot_ids})
+    flow.call('DELETE', '/api/v1/session')
+    return flow, len(slot_ids)
+
+
+def html_histories(client, username, patient_ids):
+    flow = Flow(client)
+    flow.call('POST', '/login', data={'username': username, 'password': SYNTHETIC_PASSWORD})
+    for patient_id in patient_ids:
+        flow.call('GET', f'/doctor/history/{patient_id}')
+    flow.call('GET', '/logout')
+    return flow, len(patient_ids)
+
+
+def api_histories(client, username, patient_ids):
+    flow = Flow(client)
+    flow.call('POST', '/api/v1/session', json={'username': username, 'password': SYNTHETIC_PASSWORD})
+    flow.call('GET', '/api/v1/patients/history', query_string={'ids': ','.join(map(str, patient_ids))})
+    flow.call('DELETE', '/api/v1/session')
+    return flow, len(patient_ids)
+
+
+def summarize(flows, items):
+    seconds = sorted(flow.seconds for flow in flows)
+    return {
+        'flows': len(flows),
+        'items': items,
+        'requests_per_flow': round(sum(flow.requests for flow in flows) / len(flows), 2),
+        'bytes_per_flow': round(sum(flow.bytes for flow in flows) / len(flows)),
+        'mean_ms': round(sum(seconds) / len(seconds) * 1000, 3),
+        'p50_ms': round(_percentile(seconds, 50) * 1000, 3),
+        'p99_ms': round(_percentile(seconds, 99) * 1000, 3),
+    }
+
+
+def run(app, runner, users, argument_for):
+    flows, items = [], 0
+    for username in users:
+        flow, done = runner(app.test_client(), username, argument_for())
+        flows.append(flow)
+        items += done
+    return summarize(flows, items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare request counts of the HTML flows and the JSON API.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--flows', type=int, default=200, help='flows per scenario and interface')
+    parser.add_argument('--batch', type=int, default=3, help='slots booked in the batch scenario')
+    parser.add_argument('--histories', type=int, default=10, help='patients per history flow')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app, timeline_cache
+
+    rng = random.Random(args.seed)
+    accounts = load_accounts()
+
+    def patients():
+        return [PATIENT_USERNAME.format(patient_id) for patient_id in rng.choices(accounts['Patient'], k=args.flows)]
+
+    def search():
+        day = date.today() + timedelta(days=rng.randint(1, 30))
+        return str(rng.choice(accounts['specializations'])), day.isoformat()
+
+    doctors = [DOCTOR_USERNAME.format(doctor_id) for doctor_id in rng.choices(accounts['Doctor'], k=args.flows)]
+    report = {'config': vars(args)}
+    for scenario, count in (('book_one', 1), ('book_batch', args.batch)):
+        report[scenario] = {
+            'html': run(app, lambda client, user, s: html_booking(client, user, s, count), patients(), search),
+            'api': run(app, lambda client, user, s: api_booking(client, user, s, count), patients(), search),
+        }
+    report['histories'] = {}
+    for interface, runner in (('html', html_histories), ('api', api_histories)):
+        timeline_cache.clear()
+        report['histories'][interface] = run(
+            app, runner, doctors, lambda: rng.sample(accounts['Patient'], min(args.histories, len(accounts['Patient']))))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Compares the threaded WSGI app with asgi.py under an opening-time burst.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_asgi.py --db load.db --burst 2000 --threads 16 --output asgi.json
+
+A burst of find_doctors searches (plus a share of book_appointment posts)
+arrives at once. In threaded mode it queues for --threads request threads,
+as it would behind a threaded WSGI server; in asgi mode every request is
+accepted as a coroutine and only the database work queues for the DB
+executor. Both modes run in-process against the same database, so the
+numbers exclude network and server overhead.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.test import EnvironBuilder
+
+import database
+from loadtest import Recorder, load_accounts
+from seed_data import SYNTHETIC_PASSWORD, PATIENT_USERNAME
+
+
+def build_requests(rng, accounts, slot_ids, burst, book_share):
+    requests = []
+    for _ in range(burst):
+        if slot_ids and rng.random() < book_share:
+            requests.append(('book_appointment', f'/patient/book_appointment/{rng.choice(slot_ids)}', None))
+        else:
+            day = date.today() + timedelta(days=rng.randint(0, 30))
+            requests.append(('find_doctors', '/patient/find_doctors', {
+                'specialization_id': str(rng.choice(accounts['specializations'])),
+                'appointment_date': day.isoformat(),
+            }))
+    return requests
+
+
+def login_cookies(app, rng, accounts, count):
+    cookies = []
+    for patient_id in rng.sample(accounts['Patient'], min(count, len(accounts['Patient']))):
+        client = app.test_client()
+        client.post('/login', data={'username': PATIENT_USERNAME.format(patient_id),
+                                    'password': SYNTHETIC_PASSWORD})
+        cookies.append(f"session={client.get_cookie('session').value}")
+    return cookies
+
+
+def run_threaded(app, requests, cookies, threads):
+    recorder = Recorder()
+
+    def call(index, route, path, form):
+        environ = EnvironBuilder(path, method='POST', data=form, headers={'Cookie': cookies[index % len(cookies)]})
+        status = []
+        body = app(environ.get_environ(), lambda s, h, exc_info=None: status.append(int(s.split()[0])))
+        b''.join(body)
+        body.close()
+        recorder.record(route, time.perf_counter() - started, status[0] < 400)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for index, (route, path, form) in enumerate(requests):
+            pool.submit(call, index, route, path, form)
+    return recorder.report(time.perf_counter() - started)
+
+
+def run_asgi(application, requests, cookies):
+    recorder = Recorder()
+
+    async def call(index, route, path, form, started):
+        body = urlencode(form).encode() if form else b''
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+            'path': path, 'query_string': b'', 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+            'headers': [(b'host', b'localhost'), (b'cookie', cookies[index % len(cookies)].encode()),
+                        (b'content-type', b'application/x-www-form-urlencoded')],
+        }
+        messages = [{'type': 'http.request', 'body': body}]
+        statuses = []
+
+        async def receive():
+            return messages.pop() if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        await application(scope, receive, send)
+        recorder.record(route, time.perf_counter() - started, statuses[0] < 400)
+
+    async def burst():
+        started = time.perf_counter()
+        await asyncio.gather(*(call(index, route, path, form, started)
+                               for index, (route, path, form) in enumerate(requests)))
+        return time.perf_counter() - started
+
+    return recorder.report(asyncio.run(burst()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded and ASGI serving under a request burst.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--burst', type=int, default=1000, help='requests arriving at once')
+    parser.add_argument('--threads', type=int, default=16, help='request threads in threaded mode')
+    parser.add_argument('--book-share', type=float, default=0.1)
+    parser.add_argument('--sessions', type=int, default=50, help='distinct logged-in patients')
+    parser.add_argument('--no-cache', action='store_true', help='disable the availability cache')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app, availability_cache
+    from asgi import application
+
+    if args.no_cache:
+        availability_cache.max_entries = 0
+
+    rng = random.Random(args.seed)
+    accounts = load_accounts()
+    conn = database.get_db_connection()
+    slot_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM DoctorAvailability WHERE is_booked = 0 AND date >= ?", (date.today().isoformat(),))]
+    conn.close()
+
+    cookies = login_cookies(app, rng, accounts, args.sessions)
+    # Each mode gets its own half of the free slots so bookings are comparable.
+    rng.shuffle(slot_ids)
+    half = len(slot_ids) // 2
+    report = {
+        'threaded': run_threaded(app, build_requests(rng, accounts, slot_ids[:half], args.burst, args.book_share),
+                                 cookies, args.threads),
+        'asgi': run_asgi(application, build_requests(rng, accounts, slot_ids[half:], args.burst, args.book_share),
+                         cookies),
+        'config': vars(args),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Login throughput at each scrypt cost.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_auth.py --db load.db --costs 12,13,14,15 --threads 16 --logins 400 --output auth.json
+
+For each cost (log2 of scrypt's n), the seeded account patient1 gets a
+hash at that cost and SCRYPT_N is set to match, so logins verify without
+rehashing. --threads clients then log in --logins times through /login,
+whose checks run on the auth pool (AUTH_WORKERS threads). The report gives
+logins/sec overall and per core, latency percentiles, the cost of one hash
+on a single thread and the memory each hash needs. patient1's original
+hash is restored at the end.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import database
+from loadtest import Recorder
+
+USERNAME, PASSWORD = 'patient1', 'password123'
+
+
+def set_password_hash(password_hash):
+    conn = database.get_db_connection()
+    conn.execute("UPDATE User SET password_hash = ? WHERE username = ?", (password_hash, USERNAME))
+    conn.commit()
+    conn.close()
+
+
+def single_hash_seconds(n, repeat=5):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        database.hash_password(PASSWORD, n=n)
+    return (time.perf_counter() - started) / repeat
+
+
+def run(app, threads, logins):
+    recorder = Recorder()
+    chunks = [logins // threads + (index < logins % threads) for index in range(threads)]
+
+    def worker(count):
+        client = app.test_client()
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.post('/login', data={'username': USERNAME, 'password': PASSWORD})
+            recorder.record('login', time.perf_counter() - started, response.status_code == 302)
+            client.get('/logout')
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=worker, args=(count,)) for count in chunks]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return recorder.report(time.monotonic() - started)['routes']['login']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure logins/sec per core at each scrypt cost.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--costs', default='12,13,14,15', help='comma-separated log2(n) values')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=400, help='logins per cost')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app
+
+    workers = min(app.config['AUTH_WORKERS'], os.cpu_count() or 1)
+    conn = database.get_db_connection()
+    original = conn.execute("SELECT password_hash FROM User WHERE username = ?", (USERNAME,)).fetchone()[0]
+    conn.close()
+
+    costs = {}
+    try:
+        for cost in (int(value) for value in args.costs.split(',')):
+            n = 2 ** cost
+            database.SCRYPT_N = n
+            set_password_hash(database.hash_password(PASSWORD, n=n))
+            login = run(app, args.threads, args.logins)
+            costs[f'n=2^{cost}'] = {
+                'memory_kib': 128 * n * database.SCRYPT_R // 1024,
+                'hash_ms': round(single_hash_seconds(n) * 1000, 3),
+                'logins_per_s': login['throughput_rps'],
+                'logins_per_s_per_core': round(login['throughput_rps'] / workers, 2),
+                'errors': login['errors'],
+                'p50_ms': login['p50_ms'],
+                'p99_ms': login['p99_ms'],
+            }
+    finally:
+        set_password_hash(original)
+
+    report = {'costs': costs, 'auth_workers': workers, 'config': vars(args)}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
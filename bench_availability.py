@@ -0,0 +1,96 @@
+"""Micro-benchmark for grouping a doctor's availability by day on the dashboard.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_availability.py --db load.db --slots-per-day 10,100,1000 --days 7,30 --output availability.json
+
+One fresh doctor per --slots-per-day value gets that many slots on each
+day of the largest --days window. For every (slots per day, days) pair,
+load_doctor_availability (one pass over the date-ordered rows) is timed
+against the previous grouping, which filtered every row once per day.
+Both run the same query; the report gives median and p99 milliseconds.
+"""
+import argparse
+import json
+import time
+from datetime import date, timedelta
+
+import database
+import seed_data
+from loadtest import _percentile
+
+AVAILABILITY_QUERY = """
+    SELECT id, date, start_time, is_booked FROM DoctorAvailability
+    WHERE doctor_id = ? AND date BETWEEN ? AND ?
+    ORDER BY date, start_time
+"""
+
+
+def add_doctor(app_module, slots_per_day, days):
+    conn = database.get_db_connection()
+    doctor_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Doctor").fetchone()[0]
+    seed_data.generate(conn, doctors=1, patients=0, slots=0, appointments=0, treatments=0, seed=doctor_id)
+    times = [f'{minute // 60:02d}:{minute % 60:02d}' for minute in range(slots_per_day)]
+    app_module.insert_availability_slots(conn, doctor_id, [(day, slot_time) for day in days for slot_time in times])
+    conn.commit()
+    conn.close()
+    return doctor_id
+
+
+def per_day_filter(doctor_id, days):
+    conn = database.get_db_connection()
+    availability = conn.execute(AVAILABILITY_QUERY, (doctor_id, days[0], days[-1])).fetchall()
+    conn.close()
+    return {day: [slot for slot in availability if slot['date'] == day] for day in days}
+
+
+def timings(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {'p50_ms': round(_percentile(samples, 50) * 1000, 3), 'p99_ms': round(_percentile(samples, 99) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time dashboard availability grouping at several slot densities.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--slots-per-day', default='10,100,1000')
+    parser.add_argument('--days', default='7,30')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    import app as app_module
+
+    windows = [int(value) for value in args.days.split(',')]
+    start = date.today() + timedelta(days=1)
+    all_days = [(start + timedelta(days=i)).isoformat() for i in range(max(windows))]
+
+    results = []
+    for slots_per_day in (int(value) for value in args.slots_per_day.split(',')):
+        doctor_id = add_doctor(app_module, slots_per_day, all_days)
+        for window in windows:
+            days = all_days[:window]
+            grouped = app_module.load_doctor_availability(doctor_id, days)
+            assert grouped == per_day_filter(doctor_id, days)
+            results.append({
+                'slots_per_day': slots_per_day,
+                'days': window,
+                'rows': sum(len(slots) for slots in grouped.values()),
+                'single_pass': timings(lambda: app_module.load_doctor_availability(doctor_id, days), args.iterations),
+                'per_day_filter': timings(lambda: per_day_filter(doctor_id, days), args.iterations),
+            })
+
+    output = json.dumps({'results': results, 'config': vars(args)}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
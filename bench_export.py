@@ -0,0 +1,90 @@
+"""Export throughput for the streamed admin CSV/JSONL downloads.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_export.py --db load.db --rows 200000 --output export.json
+
+A --db holding fewer than --rows appointments is first topped up with
+seed_data.generate. Every dataset and format under /admin/export is then
+downloaded through Flask's test client at each --batch-sizes value of
+EXPORT_FETCH_BATCH, consuming the streamed body chunk by chunk. The report
+gives rows/sec, MB/sec and time to the first chunk for each download.
+"""
+import argparse
+import json
+import math
+import time
+
+import database
+import seed_data
+
+DAYS_BACK, DAYS_AHEAD = 90, 60
+
+
+def top_up(rows, seed):
+    conn = database.get_db_connection()
+    missing = rows - conn.execute("SELECT COUNT(*) FROM Appointment").fetchone()[0]
+    if missing > 0:
+        # Twice the slots the appointments need, so the generator rarely draws a taken one.
+        doctors = math.ceil(2 * missing / ((DAYS_BACK + DAYS_AHEAD + 1) * len(seed_data.SLOT_TIMES)))
+        seed_data.generate(conn, doctors=doctors, patients=max(1000, missing // 10), slots=missing,
+                           appointments=missing, treatments=missing // 2, seed=seed,
+                           days_back=DAYS_BACK, days_ahead=DAYS_AHEAD)
+    conn.close()
+
+
+def download(client, url):
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    first_chunk, size, lines = None, 0, 0
+    for chunk in response.response:
+        chunk = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b'\n')
+    response.close()
+    return time.perf_counter() - started, first_chunk or 0.0, size, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure rows/sec of the streamed admin exports.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--rows', type=int, default=0, help='top the database up to this many appointments')
+    parser.add_argument('--batch-sizes', default='500,5000', help='EXPORT_FETCH_BATCH values to compare')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app, EXPORT_FORMATS, EXPORT_QUERIES
+
+    top_up(args.rows, args.seed)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, user_id=1, username='admin', role='Admin')
+
+    results = []
+    for batch_size in (int(value) for value in args.batch_sizes.split(',')):
+        app.config['EXPORT_FETCH_BATCH'] = batch_size
+        for dataset in EXPORT_QUERIES:
+            for fmt in EXPORT_FORMATS:
+                seconds, first_chunk, size, lines = download(client, f'/admin/export/{dataset}.{fmt}')
+                # JSONL is one row per line; CSV adds a header (synthetic notes hold no newlines).
+                rows = lines - 1 if fmt == 'csv' else lines
+                results.append({
+                    'dataset': dataset, 'format': fmt, 'batch_size': batch_size, 'rows': rows,
+                    'seconds': round(seconds, 3), 'first_chunk_ms': round(first_chunk * 1000, 3),
+                    'rows_per_s': round(rows / seconds, 1) if seconds else None,
+                    'mb_per_s': round(size / seconds / 1e6, 2) if seconds else None,
+                })
+
+    output = json.dumps({'results': results, 'config': vars(args)}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Load test for the live slot feed served by asgi.py.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_feed.py --db load.db --subscribers 5000 --topics 20 --bookings 200 --output feed.json
+
+Opens --subscribers idle slot_feed streams spread over --topics
+(specialization, date) searches, in-process against asgi.application, and
+measures the Python memory they hold. It then books --bookings slots on
+those searches through book_slot and reports how long each booking took to
+reach every page watching its search, from the start of the booking to the
+event being handed to the server.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, timedelta
+
+import database
+from bench_asgi import login_cookies
+from loadtest import _percentile, load_accounts
+
+BOOKED_EVENT = re.compile(rb'event: booked\ndata: \{"availability_id":(\d+)\}')
+
+
+def pick_topics(count, rng):
+    conn = database.get_db_connection()
+    rows = conn.execute("""
+        SELECT d.specialization_id, da.date, COUNT(*) AS free
+        FROM DoctorAvailability da
+        JOIN Doctor d ON da.doctor_id = d.id
+        WHERE da.is_booked = 0 AND d.is_blacklisted = 0 AND da.date BETWEEN ? AND ?
+        GROUP BY d.specialization_id, da.date
+        ORDER BY free DESC
+        LIMIT ?
+    """, (date.today().isoformat(), (date.today() + timedelta(days=30)).isoformat(), count)).fetchall()
+    topics = [(row[0], row[1]) for row in rows]
+    slots = []
+    for topic in topics:
+        slots.extend((row[0], topic) for row in conn.execute("""
+            SELECT da.id FROM DoctorAvailability da
+            JOIN Doctor d ON da.doctor_id = d.id
+            WHERE da.is_booked = 0 AND d.is_blacklisted = 0 AND d.specialization_id = ? AND da.date = ?
+        """, topic))
+    conn.close()
+    rng.shuffle(slots)
+    return topics, slots
+
+
+async def run(application, slot_events, book_slot, cookies, topics, slots, patients, args):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    booking_started = {}
+    latencies = []
+
+    async def subscriber(index, topic):
+        scope = {
+            'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/patient/slot_feed', 'server': ('localhost', 80), 'client': ('127.0.0.1', index),
+            'query_string': f'specialization_id={topic[0]}&date={topic[1]}'.encode(),
+            'headers': [(b'host', b'localhost'), (b'cookie', cookies[index % len(cookies)].encode())],
+        }
+        messages = [{'type': 'http.request', 'body': b''}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await stop.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            for availability_id in BOOKED_EVENT.findall(message.get('body', b'')):
+                latencies.append(time.perf_counter() - booking_started[int(availability_id)])
+
+        await application(scope, receive, send)
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    assignment = [topics[index % len(topics)] for index in range(args.subscribers)]
+    tasks = [asyncio.ensure_future(subscriber(index, topic)) for index, topic in enumerate(assignment)]
+    while len(slot_events) < args.subscribers and time.perf_counter() - started < 60:
+        await asyncio.sleep(0.05)
+    connect_seconds = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    watchers = Counter(assignment)
+    expected = 0
+    booking_times = []
+    for availability_id, topic in slots[:args.bookings]:
+        booking_started[availability_id] = time.perf_counter()
+        _, error = await loop.run_in_executor(None, book_slot, availability_id, random.choice(patients))
+        booking_times.append(time.perf_counter() - booking_started[availability_id])
+        if error is None:
+            expected += watchers[topic]
+        await asyncio.sleep(args.interval)
+    await asyncio.sleep(1.0)
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    latencies.sort()
+    booking_times.sort()
+    return {
+        'subscribers': args.subscribers,
+        'topics': len(topics),
+        'connect_s': round(connect_seconds, 3),
+        'traced_bytes': held,
+        'traced_bytes_per_subscriber': round(held / max(1, args.subscribers)),
+        'bookings': len(booking_times),
+        'booking_p50_ms': round(_percentile(booking_times, 50) * 1000, 3) if booking_times else None,
+        'deliveries_expected': expected,
+        'deliveries': len(latencies),
+        'delivery_p50_ms': round(_percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'delivery_p99_ms': round(_percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'delivery_max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+        'hub': slot_events.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the SSE slot feed with many idle subscribers.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--subscribers', type=int, default=5000)
+    parser.add_argument('--topics', type=int, default=20, help='distinct (specialization, date) searches')
+    parser.add_argument('--bookings', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.005, help='seconds between bookings')
+    parser.add_argument('--sessions', type=int, default=20, help='distinct logged-in patients')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app, slot_events, book_slot
+    from asgi import application
+
+    app.config['SLOT_FEED_MAX_SUBSCRIBERS'] = slot_events.max_subscribers = max(
+        slot_events.max_subscribers, args.subscribers)
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    accounts = load_accounts()
+    cookies = login_cookies(app, rng, accounts, args.sessions)
+    topics, slots = pick_topics(args.topics, rng)
+
+    report = asyncio.run(run(application, slot_events, book_slot, cookies, topics, slots, accounts['Patient'], args))
+    report['config'] = vars(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Publishing a block of slots in one set_schedule call versus one set_availability call per slot.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_schedule.py --db load.db --slots 10000 --output schedule.json
+
+Two fresh doctors are added to the database. One publishes --slots
+15-minute slots (08:00-18:00, every day) with a single POST to
+/doctor/set_schedule; the other publishes the same slots one POST to
+/doctor/set_availability at a time. Both go through the routes with
+Flask's test client, and the report gives wall time, slots/sec and
+per-request latency for each path.
+"""
+import argparse
+import json
+import math
+import time
+from datetime import date, datetime, timedelta
+
+import database
+import seed_data
+from loadtest import _percentile
+
+DAY_START, DAY_END, SLOT_MINUTES = '08:00', '18:00', 15
+
+
+def add_doctors(count):
+    conn = database.get_db_connection()
+    first = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Doctor").fetchone()[0]
+    seed_data.generate(conn, doctors=count, patients=0, slots=0, appointments=0, treatments=0, seed=first)
+    conn.close()
+    return list(range(first, first + count))
+
+
+def doctor_client(app, doctor_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, user_id=0, username=f'doctor{doctor_id}', role='Doctor', doctor_id=doctor_id)
+    return client
+
+
+def count_slots(doctor_id):
+    conn = database.get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM DoctorAvailability WHERE doctor_id = ?", (doctor_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def report(seconds, latencies, created):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'slots_created': created,
+        'seconds': round(seconds, 3),
+        'slots_per_s': round(created / seconds, 1) if seconds else None,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bulk schedule publishing with per-slot inserts.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--slots', type=int, default=10000)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app, expand_schedule
+
+    day_start, day_end = datetime.strptime(DAY_START, '%H:%M'), datetime.strptime(DAY_END, '%H:%M')
+    per_day = (day_end - day_start) // timedelta(minutes=SLOT_MINUTES)
+    start_date = date.today() + timedelta(days=1)
+    end_date = start_date + timedelta(days=math.ceil(args.slots / per_day) - 1)
+    slots = expand_schedule(start_date, end_date, set(range(7)), day_start, day_end, timedelta(minutes=SLOT_MINUTES))
+    bulk_doctor, per_slot_doctor = add_doctors(2)
+
+    client = doctor_client(app, bulk_doctor)
+    started = time.perf_counter()
+    response = client.post('/doctor/set_schedule', data={
+        'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
+        'weekdays': [str(day) for day in range(7)], 'start_time': DAY_START, 'end_time': DAY_END,
+        'slot_minutes': str(SLOT_MINUTES), 'exclusions': '',
+    })
+    bulk_seconds = time.perf_counter() - started
+    assert response.status_code == 302, response.status_code
+
+    client = doctor_client(app, per_slot_doctor)
+    latencies = []
+    started = time.perf_counter()
+    for slot_date, slot_time in slots:
+        request_started = time.perf_counter()
+        client.post('/doctor/set_availability', data={'date': slot_date, 'time': slot_time})
+        latencies.append(time.perf_counter() - request_started)
+    per_slot_seconds = time.perf_counter() - started
+
+    result = {
+        'slots': len(slots),
+        'bulk': report(bulk_seconds, [bulk_seconds], count_slots(bulk_doctor)),
+        'per_slot': report(per_slot_seconds, latencies, count_slots(per_slot_doctor)),
+        'config': vars(args),
+    }
+    result['speedup'] = round(per_slot_seconds / bulk_seconds, 1)
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Treatment search through the FTS5 index versus the LIKE fallback.
+
+    python bench_search.py --db search.db --rows 1000000 --output search.json
+
+A --db holding fewer than --rows treatments is first filled with
+seed_data.generate until it has them (a year of completed appointments
+per doctor), so use a scratch database. Each --queries entry is then run
+--iterations times through search_treatment_records, once on the
+TreatmentSearch index and once with has_treatment_search patched to
+report no index, as on a SQLite build without FTS5. Both read the primary
+rather than the snapshot replica so the copy of a large database is not
+part of the measurement. The report also gives the median cost of one
+committed treatment insert keeping the index current, the price paid on
+the write side; those sample rows stay in the database.
+"""
+import argparse
+import json
+import math
+import time
+
+import database
+import seed_data
+from loadtest import _percentile
+
+DAYS_BACK = 365
+
+
+def fill(rows, seed):
+    """Adds completed, treated appointments until the database holds `rows` treatments."""
+    conn = database.get_db_connection()
+    missing = rows - conn.execute("SELECT COUNT(*) FROM Treatment").fetchone()[0]
+    if missing > 0:
+        database.seed_initial_data()
+        # Indexing row by row through the trigger inside one huge transaction is
+        # far slower than building the index afterwards, so the rows are loaded
+        # without the insert trigger and the index is rebuilt in one pass, as the
+        # migration that introduced it does.
+        conn.execute('DROP TRIGGER IF EXISTS trg_treatment_search_insert')
+        # Every slot is booked and about 90% of past bookings complete; doctors get
+        # twice the slots they need so the generator rarely draws a taken one.
+        slots = math.ceil(missing * 1.2)
+        doctors = math.ceil(2 * slots / (DAYS_BACK * len(seed_data.SLOT_TIMES)))
+        try:
+            seed_data.generate(conn, doctors=doctors, patients=max(1000, missing // 100), slots=slots,
+                               appointments=slots, treatments=missing, seed=seed,
+                               days_back=DAYS_BACK, days_ahead=-1)
+        finally:
+            database._create_treatment_search(conn)
+            conn.commit()
+    total = conn.execute("SELECT COUNT(*) FROM Treatment").fetchone()[0]
+    conn.close()
+    return total
+
+
+def insert_seconds(samples=50):
+    """Median time to insert and commit one treatment through the index trigger.
+
+    FTS5 writes its index at commit, so the commit is timed too and the rows are kept.
+    """
+    conn = database.get_db_connection()
+    appointment_ids = [row[0] for row in conn.execute("""
+        SELECT a.id FROM Appointment a LEFT JOIN Treatment t ON t.appointment_id = a.id
+        WHERE a.status = 'Completed' AND t.id IS NULL LIMIT ?
+    """, (samples,))]
+    times = []
+    for appointment_id in appointment_ids:
+        conn.execute('BEGIN IMMEDIATE')
+        started = time.perf_counter()
+        conn.execute("""
+            INSERT INTO Treatment (appointment_id, diagnosis, prescription, doctor_notes) VALUES (?, ?, ?, ?)
+        """, (appointment_id, seed_data.DIAGNOSES[0], seed_data.PRESCRIPTIONS[0], seed_data.NOTES[0]))
+        conn.commit()
+        times.append(time.perf_counter() - started)
+    conn.close()
+    return sorted(times)[len(times) // 2] if times else None
+
+
+def timings(search, terms, iterations, page_size):
+    samples, matches = [], 0
+    for _ in range(iterations):
+        started = time.perf_counter()
+        rows, _ = search(terms, 1, page_size)
+        samples.append(time.perf_counter() - started)
+        matches = len(rows)
+    samples.sort()
+    return {'page_rows': matches, 'p50_ms': round(_percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(_percentile(samples, 99) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare FTS5 treatment search with the LIKE fallback.')
+    parser.add_argument('--db', default='search.db')
+    parser.add_argument('--rows', type=int, default=1000000, help='treatments the database should hold')
+    parser.add_argument('--queries', default='migraine;warfarin daily;imaging persist;nosuchterm',
+                        help='semicolon-separated searches, each one or more words')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    database.REPLICA_ENABLED = False
+    import app as app_module
+
+    started = time.perf_counter()
+    total = fill(args.rows, args.seed)
+    fill_seconds = time.perf_counter() - started
+
+    conn = database.get_db_connection()
+    if not database.has_treatment_search(conn):
+        raise SystemExit('This SQLite build has no FTS5; only the LIKE path exists.')
+    conn.close()
+
+    has_index = app_module.has_treatment_search
+    results = {}
+    for query in args.queries.split(';'):
+        terms = query.split()
+        fts = timings(app_module.search_treatment_records, terms, args.iterations, args.page_size)
+        app_module.has_treatment_search = lambda conn: False
+        try:
+            like = timings(app_module.search_treatment_records, terms, args.iterations, args.page_size)
+        finally:
+            app_module.has_treatment_search = has_index
+        results[query] = {'fts5': fts, 'like': like,
+                          'speedup_p50': round(like['p50_ms'] / fts['p50_ms'], 1) if fts['p50_ms'] else None}
+
+    insert = insert_seconds()
+    report = {'treatments': total, 'fill_seconds': round(fill_seconds, 1),
+              'indexed_insert_ms': round(insert * 1000, 3) if insert is not None else None,
+              'queries': results, 'config': vars(args)}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Render-time benchmark for the role dashboards at realistic row counts.
+
+    python bench_templates.py --iterations 200 --output templates.json
+
+Each dashboard is rendered from a synthetic context with the fragment
+cache cleared before every render (cold) and left in place (warm). The
+cost of loading every template into a fresh Jinja environment is also
+measured with and without the bytecode cache.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from flask import render_template, session
+from jinja2 import Environment
+
+import database
+
+# Renders come from synthetic contexts, but importing app migrates its
+# database; point it at a throwaway file rather than the checked-in hms.db.
+database.DB_NAME = os.path.join(tempfile.mkdtemp(prefix='bench-templates-'), 'hms.db')
+
+from app import app, fragment_cache
+from loadtest import _percentile
+from seed_data import SLOT_TIMES, DIAGNOSES
+
+
+def doctor_context(days, slots_per_day, upcoming):
+    today = date.today()
+    next_days = [(today + timedelta(days=i)).isoformat() for i in range(days)]
+    grouped = {day: [{'id': i, 'date': day, 'start_time': SLOT_TIMES[i % len(SLOT_TIMES)], 'is_booked': i % 3 == 0}
+                     for i in range(slots_per_day)] for day in next_days}
+    return {
+        'doctor_id': 1,
+        'window_dates': next_days,
+        'window_days': days,
+        'today_str': today.isoformat(),
+        'load_availability': lambda: grouped,
+        'upcoming_appointments': [{'id': i, 'date': next_days[i % days], 'time': '09:00', 'status': 'Booked',
+                                   'patient_name': f'Patient {i}', 'patient_id': i} for i in range(upcoming)],
+        'recent_completed': [{'id': i, 'date': today.isoformat(), 'time': '09:00', 'patient_name': f'Patient {i}',
+                              'patient_id': i, 'diagnosis': DIAGNOSES[i % len(DIAGNOSES)]} for i in range(5)],
+        'section_title': 'Doctor Dashboard',
+    }
+
+
+def patient_context(upcoming, history, specializations):
+    today = date.today().isoformat()
+    row = {'date': today, 'time': '09:00', 'doctor_name': 'Doc', 'specialization_name': 'Cardiology'}
+    return {
+        'patient_id': 1,
+        'specializations': [{'id': i, 'name': f'Specialization {i}'} for i in range(specializations)],
+        'specializations_version': 1,
+        'upcoming_appointments': [{**row, 'id': i, 'status': 'Booked'} for i in range(upcoming)],
+        'history_appointments': [{**row, 'id': i, 'status': 'Completed', 'has_treatment': i % 2}
+                                 for i in range(history)],
+        'history_next': 'WyIyMDI0LTAxLTAxIiwiMDk6MDAiLDFd',
+        'history_is_first_page': True,
+        'today': today,
+        'section_title': 'Patient Dashboard',
+    }
+
+
+def admin_context(specializations):
+    return {
+        'total_doctors': 200, 'total_patients': 20000, 'total_appointments': 100000,
+        'appointments_by_status': {'Booked': 40000, 'Completed': 50000, 'Cancelled': 10000},
+        'doctors_by_specialization': [(f'Specialization {i}', 10 + i) for i in range(specializations)],
+        'section_title': 'Admin Dashboard',
+    }
+
+
+def time_renders(template, context, session_values, iterations, cold):
+    samples = []
+    with app.test_request_context():
+        session.update(session_values)
+        for _ in range(iterations):
+            if cold:
+                fragment_cache.clear()
+            started = time.perf_counter()
+            render_template(template, **context)
+            samples.append(time.perf_counter() - started)
+    return _summary(samples)
+
+
+def time_environment_load(bytecode_cache, iterations):
+    samples = []
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for _ in range(iterations):
+        env = Environment(loader=app.jinja_env.loader, extensions=app.jinja_options['extensions'],
+                          bytecode_cache=bytecode_cache)
+        started = time.perf_counter()
+        for name in names:
+            env.get_template(name)
+        samples.append(time.perf_counter() - started)
+    return _summary(samples)
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': round(_percentile(samples, 50) * 1000, 3),
+        'p99_ms': round(_percentile(samples, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time dashboard template rendering.')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--doctor-days', type=int, default=30)
+    parser.add_argument('--slots-per-day', type=int, default=32)
+    parser.add_argument('--upcoming', type=int, default=100)
+    parser.add_argument('--history', type=int, default=20)
+    parser.add_argument('--specializations', type=int, default=25)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    dashboards = {
+        'doctor/dashboard.html': (doctor_context(args.doctor_days, args.slots_per_day, args.upcoming),
+                                  {'logged_in': True, 'role': 'Doctor'}),
+        'patient/dashboard.html': (patient_context(args.upcoming, args.history, args.specializations),
+                                   {'logged_in': True, 'role': 'Patient'}),
+        'admin/dashboard.html': (admin_context(args.specializations), {'logged_in': True, 'role': 'Admin'}),
+    }
+    report = {'render': {}, 'config': vars(args)}
+    for template, (context, session_values) in dashboards.items():
+        report['render'][template] = {
+            'fragment_cache_cold': time_renders(template, context, session_values, args.iterations, cold=True),
+            'fragment_cache_warm': time_renders(template, context, session_values, args.iterations, cold=False),
+        }
+    load_iterations = max(1, args.iterations // 20)
+    report['load_all_templates'] = {
+        'without_bytecode_cache': time_environment_load(None, load_iterations),
+        'with_bytecode_cache': time_environment_load(app.jinja_env.bytecode_cache, load_iterations),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Compares per-request write transactions with the batch writer.
+
+    python seed_data.py --db load.db --seed 1
+    python bench_writes.py --db load.db --threads 32 --writes 4000 --output writes.json
+
+Each thread books free slots (and cancels a share of its own bookings)
+through the same book_slot/cancel_booked_appointment code the routes use,
+first with WRITE_BEHIND_ENABLED off and then on. Each mode gets its own
+half of the free slots.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import database
+from loadtest import Recorder
+
+
+def run(app_module, slot_ids, patients, threads, cancel_share, seed):
+    recorder = Recorder()
+    chunks = [slot_ids[i::threads] for i in range(threads)]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        for availability_id in chunks[index]:
+            patient_id = rng.choice(patients)
+            started = time.perf_counter()
+            slot, error = app_module.book_slot(availability_id, patient_id)
+            recorder.record('book', time.perf_counter() - started, error is None)
+            if slot is None or rng.random() >= cancel_share:
+                continue
+            started = time.perf_counter()
+            try:
+                database.batched_write(lambda conn: app_module.cancel_booked_appointment(
+                    conn, _appointment_id(conn, slot), 'patient_id', patient_id))
+                ok = True
+            except sqlite3.Error:
+                ok = False
+            recorder.record('cancel', time.perf_counter() - started, ok)
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return recorder.report(time.monotonic() - started)
+
+
+def _appointment_id(conn, slot):
+    return conn.execute("""
+        SELECT id FROM Appointment
+        WHERE doctor_id = ? AND date = ? AND time = ? AND status = 'Booked'
+    """, (slot['doctor_id'], slot['date'], slot['start_time'])).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-request commits with the batch writer.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--writes', type=int, default=4000, help='bookings per mode')
+    parser.add_argument('--cancel-share', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    import app as app_module
+
+    conn = database.get_db_connection()
+    slot_ids = [row[0] for row in conn.execute(
+        "SELECT id FROM DoctorAvailability WHERE is_booked = 0 AND date >= ?", (date.today().isoformat(),))]
+    patients = [row[0] for row in conn.execute("SELECT id FROM Patient")]
+    conn.close()
+
+    random.Random(args.seed).shuffle(slot_ids)
+    per_mode = min(args.writes, len(slot_ids) // 2)
+    report = {}
+    for enabled, name, slots in ((False, 'per_request', slot_ids[:per_mode]),
+                                 (True, 'batched', slot_ids[per_mode:2 * per_mode])):
+        database.WRITE_BEHIND_ENABLED = enabled
+        report[name] = run(app_module, slots, patients, args.threads, args.cancel_share, args.seed)
+        if enabled:
+            report[name]['writer'] = database.writer_stats()
+    report['config'] = vars(args)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class BlacklistRegistry:
+    """In-memory sets of blacklisted doctor and patient ids.
+
+    Loaded from the database on first use and kept current by the routes
+    that change a blacklist flag. Flags changed by another process are
+    picked up through `versions`, which returns change counters for the
+    flagged tables: at most every `check_interval` seconds one lookup reads
+    them and reloads the sets if they moved. Other readers never take the
+    lock: each update swaps in a new frozenset, so a lookup is a single O(1)
+    membership test against whichever set was current.
+    """
+
+    def __init__(self, loader, versions=None, check_interval=None):
+        self._loader = loader
+        self._versions = versions
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._loaded_versions = None
+        self._checked_at = 0.0
+        self._doctors = frozenset()
+        self._patients = frozenset()
+
+    def _due(self):
+        return not self._loaded or (self._versions is not None and self.check_interval is not None
+                                    and time.monotonic() - self._checked_at >= self.check_interval)
+
+    def _ensure_loaded(self):
+        if not self._due():
+            return
+        with self._lock:
+            if not self._due():
+                return
+            # Counters first: a flag changed during the load is seen on the next check.
+            versions = self._versions() if self._versions else None
+            if not self._loaded or versions != self._loaded_versions:
+                self._doctors, self._patients = (frozenset(ids) for ids in self._loader())
+                self._loaded_versions = versions
+                self._loaded = True
+            self._checked_at = time.monotonic()
+
+    def reload(self):
+        with self._lock:
+            self._loaded = False
+        self._ensure_loaded()
+
+    def is_doctor_blacklisted(self, doctor_id):
+        self._ensure_loaded()
+        return doctor_id in self._doctors
+
+    def is_patient_blacklisted(self, patient_id):
+        self._ensure_loaded()
+        return patient_id in self._patients
+
+    def set_doctor(self, doctor_id, blacklisted):
+        self._ensure_loaded()
+        with self._lock:
+            self._doctors = self._doctors | {doctor_id} if blacklisted else self._doctors - {doctor_id}
+
+    def snapshot(self):
+        self._ensure_loaded()
+        return {'doctors': len(self._doctors), 'patients': len(self._patients)}
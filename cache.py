@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with an optional per-entry TTL and hit/miss counters.
+
+    Values loaded through get_or_load() are only stored if no invalidation
+    happened while the loader ran, so a write that lands mid-load cannot be
+    masked by the stale result. With `max_bytes` set, `sizeof(value)` is
+    charged per entry and least recently used entries are evicted until the
+    total fits. With `cache_none` off, a loader returning None is not stored,
+    so a lookup for something that does not exist yet is retried next time.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, max_bytes=None, sizeof=None, cache_none=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.cache_none = cache_none
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats['expirations'] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, _MISSING)
+        if entry is not _MISSING:
+            self._bytes -= entry[2]
+        return entry
+
+    def _store(self, key, value, expires_at=_MISSING):
+        if expires_at is _MISSING:
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+        size = self.sizeof(value) if self.sizeof else 0
+        self._remove(key)
+        self._entries[key] = (value, expires_at, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            self._remove(next(iter(self._entries)))
+            self.stats['evictions'] += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            self.stats['misses' if value is _MISSING else 'hits'] += 1
+        return default if value is _MISSING else value
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def _begin_load(self, key):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.stats['hits'] += 1
+                return value, None
+            self.stats['misses'] += 1
+            return _MISSING, self._generation
+
+    def _finish_load(self, key, value, generation):
+        if value is None and not self.cache_none:
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._store(key, value)
+
+    def get_or_load(self, key, loader):
+        value, generation = self._begin_load(key)
+        if value is _MISSING:
+            value = loader()
+            self._finish_load(key, value, generation)
+        return value
+
+    def get_many_or_load(self, keys, loader):
+        """get_or_load() for several keys at once; loader(missing_keys) returns {key: value}.
+
+        Keys the loader leaves out count as None, and are cached as such
+        unless `cache_none` is off.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key)
+                self.stats['misses' if value is _MISSING else 'hits'] += 1
+                if value is not _MISSING:
+                    found[key] = value
+            generation = self._generation
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if missing:
+            loaded = loader(missing)
+            with self._lock:
+                for key in missing:
+                    found[key] = loaded.get(key)
+                    if generation == self._generation and (found[key] is not None or self.cache_none):
+                        self._store(key, found[key])
+        return found
+
+    async def get_or_load_async(self, key, loader):
+        """get_or_load() for a loader returning an awaitable; the lock is never held across the await."""
+        value, generation = self._begin_load(key)
+        if value is _MISSING:
+            value = await loader()
+            self._finish_load(key, value, generation)
+        return value
+
+    def update(self, key, fn):
+        """Replaces a cached value with fn(value) in place; does nothing if key is not cached.
+
+        Like invalidate(), this discards any load already in flight, since
+        its result may predate the change being applied. With `cache_none`
+        off, fn returning None drops the entry instead.
+        """
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return False
+            value, expires_at, _ = entry
+            value = fn(value)
+            if value is None and not self.cache_none:
+                self._remove(key)
+                self.stats['invalidations'] += 1
+                return False
+            self._store(key, value, expires_at)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._remove(key) is not _MISSING:
+                self.stats['invalidations'] += 1
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self._remove(key)
+            self.stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(entries=len(self._entries), max_entries=self.max_entries)
+        if self.max_bytes is not None:
+            stats.update(bytes=self._bytes, max_bytes=self.max_bytes)
+        return stats
@@ -1,22 +1,667 @@
 import sqlite3
 import hashlib
+import hmac
+import base64
+import os
+import pathlib
+import threading
+import time
+import random
+import queue
+import tempfile
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
 from datetime import datetime
 
 DB_NAME = 'hms.db'
 DEFAULT_ADMIN_USERNAME = 'admin'
 DEFAULT_ADMIN_PASSWORD = 'admin_password_123'
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row 
-    conn.execute('PRAGMA foreign_keys = ON;') 
+# Connection pool settings
+POOL_SIZE = 8
+POOL_TIMEOUT = 5.0
+BUSY_TIMEOUT = 5.0
+
+# scrypt cost parameters for new password hashes (memory used is 128 * n * r bytes)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 32
+SCRYPT_SALT_BYTES = 16
+
+# Retry policy for write transactions that hit SQLITE_BUSY
+WRITE_RETRIES = 5
+WRITE_BACKOFF = 0.01
+
+# Appointment state changes are queued to a single writer thread that
+# commits up to WRITE_BATCH_SIZE of them per transaction, waiting at most
+# WRITE_BATCH_DELAY seconds for a batch to fill.
+WRITE_BEHIND_ENABLED = True
+WRITE_BATCH_SIZE = 64
+WRITE_BATCH_DELAY = 0.002
+WRITE_QUEUE_SIZE = 4096
+WRITE_QUEUE_TIMEOUT = 5.0
+# How long batched_write() waits for a queued command's result.
+WRITE_RESULT_TIMEOUT = 30.0
+
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode = WAL;',
+    'PRAGMA synchronous = NORMAL;',
+    'PRAGMA foreign_keys = ON;',
+    'PRAGMA mmap_size = 268435456;',
+    'PRAGMA cache_size = -16000;',
+    'PRAGMA temp_store = MEMORY;',
+)
+
+# Read-only snapshot that report and history routes read from instead of the
+# primary. A snapshot older than REPLICA_MAX_STALENESS seconds is refreshed
+# in the background while readers keep using the previous copy; one older
+# than REPLICA_MAX_LAG (after an idle spell, say) is refreshed before it is
+# read, so no reader ever sees more lag than that.
+REPLICA_ENABLED = True
+REPLICA_MAX_STALENESS = 30.0
+REPLICA_MAX_LAG = 2 * REPLICA_MAX_STALENESS
+REPLICA_POOL_SIZE = 4
+REPLICA_PRAGMAS = (
+    'PRAGMA query_only = ON;',
+    'PRAGMA mmap_size = 268435456;',
+    'PRAGMA cache_size = -16000;',
+    'PRAGMA temp_store = MEMORY;',
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+class WriteQueueFull(sqlite3.OperationalError):
+    pass
+
+class WriteTimeout(sqlite3.OperationalError):
+    pass
+
+
+# Set via set_query_observer() to receive on_execute(sql, seconds) -> handle
+# and on_fetch(handle, rows, seconds) callbacks for every statement.
+query_observer = None
+
+def set_query_observer(observer):
+    global query_observer
+    query_observer = observer
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement time and rows returned to the query observer."""
+
+    observer = None
+    handle = None
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self.handle = self.observer.on_execute(sql, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self.handle = self.observer.on_execute(sql, time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self.observer.on_fetch(self.handle, 0 if row is None else 1, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.observer.on_fetch(self.handle, len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self.observer.on_fetch(self.handle, len(rows), time.perf_counter() - started)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        self.observer.on_fetch(self.handle, 1, 0.0)
+        return row
+
+
+class PooledConnection(sqlite3.Connection):
+    """A sqlite3 connection whose close() hands it back to its pool."""
+
+    def cursor(self, factory=None):
+        observer = query_observer
+        if observer is None or factory is not None:
+            return super().cursor(factory or sqlite3.Cursor)
+        cursor = super().cursor(InstrumentedCursor)
+        cursor.observer = observer
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        if query_observer is None:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if query_observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is None:
+            super().close()
+        else:
+            pool.release(self)
+
+    def discard(self):
+        super().close()
+
+
+def open_connection(path, uri=False, pragmas=CONNECTION_PRAGMAS):
+    """Opens a configured connection outside any pool; close() really closes it."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, uri=uri,
+                           check_same_thread=False, factory=PooledConnection)
+    conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        conn.execute(pragma)
     return conn
 
-def hash_password(password):
-    return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
-def create_tables():
+class ConnectionPool:
+    """Bounded LIFO pool of configured connections to a single database file.
+
+    Connections are opened lazily up to `size`; callers beyond that wait up
+    to `timeout` seconds for one to be released. The most recently released
+    connection is handed out first so its page cache stays warm.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT, uri=False, pragmas=CONNECTION_PRAGMAS):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.uri = uri
+        self.pragmas = pragmas
+        self.retired = False
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = {}
+        self.stats = {'hits': 0, 'waits': 0, 'opens': 0, 'timeouts': 0}
+
+    def _open(self):
+        return open_connection(self.path, self.uri, self.pragmas)
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise PoolTimeout(f'No database connection available after {self.timeout}s')
+
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+                self.stats['hits' if conn is not None else 'opens'] += 1
+            if conn is None:
+                conn = self._open()
+                conn.pool = self
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use[id(conn)] = (conn, threading.get_ident())
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            if self._in_use.pop(id(conn), None) is None:
+                return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            conn.discard()
+        else:
+            with self._lock:
+                retired = self.retired
+                if not retired:
+                    self._idle.append(conn)
+            if retired:
+                conn.discard()
+        self._slots.release()
+
+    def release_thread_connections(self):
+        """Returns any connections the current thread forgot to close."""
+        ident = threading.get_ident()
+        with self._lock:
+            leaked = [conn for conn, owner in self._in_use.values() if owner == ident]
+        for conn in leaked:
+            self.release(conn)
+
+    def close_all(self):
+        with self._lock:
+            while self._idle:
+                self._idle.pop().discard()
+
+    def retire(self):
+        """Closes idle connections now and checked-out ones as they are released."""
+        with self._lock:
+            self.retired = True
+        self.close_all()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool():
+    pool = _pools.get(DB_NAME)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(DB_NAME)
+            if pool is None:
+                pool = _pools[DB_NAME] = ConnectionPool(DB_NAME, POOL_SIZE, POOL_TIMEOUT)
+    return pool
+
+def get_db_connection():
+    return get_pool().acquire()
+
+
+class SnapshotReplica:
+    """Read-only copy of the primary database, refreshed with the backup API.
+
+    Each refresh writes a fresh file and swaps it into place, so connections
+    still reading the previous snapshot keep a consistent view of it and the
+    primary is only read for the duration of the copy. Connections are
+    opened with mode=ro and query_only, so a route that accidentally writes
+    fails instead of silently diverging from the primary.
+    """
+
+    def __init__(self, primary, path, max_staleness=REPLICA_MAX_STALENESS, size=REPLICA_POOL_SIZE,
+                 max_lag=REPLICA_MAX_LAG):
+        self.primary = primary
+        self.path = path
+        self.max_staleness = max_staleness
+        self.max_lag = max_lag
+        self.size = size
+        self._pool = None
+        self._retired = []
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self.stats = {'refreshes': 0, 'refresh_failures': 0, 'blocking_refreshes': 0, 'last_refresh_seconds': 0.0}
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self):
+        started = time.perf_counter()
+        # A staging file of its own per refresh, so concurrent refreshers (threads or
+        # processes sharing the database) never write into each other's copy.
+        fd, staging = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.',
+                                       suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.path)))
+        os.close(fd)
+        try:
+            source = sqlite3.connect(self.primary, timeout=BUSY_TIMEOUT)
+            target = sqlite3.connect(staging)
+            try:
+                source.backup(target)
+                # A WAL snapshot could not be opened read-only without its -shm file.
+                target.execute('PRAGMA journal_mode = DELETE')
+            finally:
+                target.close()
+                source.close()
+            os.replace(staging, self.path)
+        except Exception:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+
+        uri = pathlib.Path(self.path).absolute().as_uri() + '?mode=ro&immutable=1'
+        pool = ConnectionPool(uri, self.size, POOL_TIMEOUT, uri=True, pragmas=REPLICA_PRAGMAS)
+        with self._lock:
+            previous, self._pool = self._pool, pool
+            self._refreshed_at = time.monotonic()
+            if previous is not None:
+                self._retired.append(previous)
+            self._retired = [old for old in self._retired if old._in_use]
+            self.stats['refreshes'] += 1
+            self.stats['last_refresh_seconds'] = time.perf_counter() - started
+        if previous is not None:
+            previous.retire()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except sqlite3.Error:
+            with self._lock:
+                self.stats['refresh_failures'] += 1
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _lagging(self):
+        return self._pool is None or time.monotonic() - self._refreshed_at > self.max_lag
+
+    def acquire(self):
+        if self._lagging():
+            # Too old to serve: wait for a refresh, joining one already running.
+            with self._refresh_lock:
+                if self._lagging():
+                    self._refresh()
+                    with self._lock:
+                        self.stats['blocking_refreshes'] += 1
+        elif time.monotonic() - self._refreshed_at > self.max_staleness:
+            with self._lock:
+                start = not self._refreshing
+                self._refreshing = True
+            if start:
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return self._pool.acquire()
+
+    def pools(self):
+        with self._lock:
+            return [pool for pool in (self._pool, *self._retired) if pool is not None]
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['age_seconds'] = time.monotonic() - self._refreshed_at if self._pool else 0.0
+        return stats
+
+
+_replicas = {}
+
+def get_replica():
+    replica = _replicas.get(DB_NAME)
+    if replica is None:
+        with _pools_lock:
+            replica = _replicas.get(DB_NAME)
+            if replica is None:
+                replica = _replicas[DB_NAME] = SnapshotReplica(
+                    DB_NAME, f'{DB_NAME}.snapshot', REPLICA_MAX_STALENESS, REPLICA_POOL_SIZE, REPLICA_MAX_LAG)
+    return replica
+
+def get_read_connection():
+    """Returns a connection for read-only work that tolerates up to REPLICA_MAX_LAG of lag.
+
+    Falls back to the primary when the replica is disabled.
+    """
+    if not REPLICA_ENABLED:
+        return get_db_connection()
+    return get_replica().acquire()
+
+def release_thread_connections():
+    pools = list(_pools.values())
+    for replica in list(_replicas.values()):
+        pools.extend(replica.pools())
+    for pool in pools:
+        pool.release_thread_connections()
+
+def replica_stats():
+    return get_replica().snapshot()
+
+def read_blacklist_versions():
+    """TableVersion counters of the tables load_blacklists() reads; they move whenever a flag may have."""
     conn = get_db_connection()
+    versions, _ = read_table_versions(conn, ('Doctor', 'Patient'))
+    conn.close()
+    return versions
+
+def load_blacklists():
+    """Returns (doctor_ids, patient_ids) currently flagged as blacklisted."""
+    conn = get_db_connection()
+    doctors = [row[0] for row in conn.execute("SELECT id FROM Doctor WHERE is_blacklisted = 1")]
+    patients = [row[0] for row in conn.execute("SELECT id FROM Patient WHERE is_blacklisted = 1")]
+    conn.close()
+    return doctors, patients
+
+def is_busy_error(e):
+    message = str(e).lower()
+    return 'locked' in message or 'busy' in message
+
+def write_transaction(work, retries=None, backoff=None):
+    """Runs work(conn) inside BEGIN IMMEDIATE and commits, returning its result.
+
+    Taking the write lock up front means a competing writer fails at BEGIN
+    (after busy_timeout) rather than midway through. SQLITE_BUSY is retried
+    with jittered exponential backoff; any other error rolls back and is
+    re-raised.
+    """
+    retries = WRITE_RETRIES if retries is None else retries
+    backoff = WRITE_BACKOFF if backoff is None else backoff
+    attempt = 0
+    while True:
+        conn = get_db_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if not is_busy_error(e) or attempt >= retries:
+                raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+        attempt += 1
+
+class BatchWriter:
+    """Single thread applying queued write commands in group-committed transactions.
+
+    submit(work) returns a Future for work(conn). The writer takes up to
+    `batch_size` queued commands (waiting at most `max_delay` for more after
+    the first), runs each inside its own SAVEPOINT under one BEGIN IMMEDIATE
+    and commits once. A command that raises is rolled back to its savepoint
+    alone, and its exception is set on its future; results are only
+    published after the COMMIT succeeds. SQLITE_BUSY at BEGIN or COMMIT
+    re-runs the whole batch with the same backoff as write_transaction.
+    """
+
+    def __init__(self, path, batch_size=WRITE_BATCH_SIZE, max_delay=WRITE_BATCH_DELAY,
+                 max_pending=WRITE_QUEUE_SIZE, queue_timeout=WRITE_QUEUE_TIMEOUT):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self.stats = {'commands': 0, 'batches': 0, 'failed_commands': 0,
+                      'retried_batches': 0, 'rejected': 0, 'largest_batch': 0}
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, work):
+        future = Future()
+        try:
+            self._queue.put((work, future), timeout=self.queue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats['rejected'] += 1
+            raise WriteQueueFull(f'Write queue still full after {self.queue_timeout}s')
+        return future
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, conn, batch):
+        """Runs one batch in one transaction and returns [(ok, result_or_exception)] in order."""
+        outcomes = []
+        conn.execute('BEGIN IMMEDIATE')
+        for work, _ in batch:
+            conn.execute('SAVEPOINT command')
+            try:
+                outcomes.append((True, work(conn)))
+            except Exception as e:
+                conn.execute('ROLLBACK TO command')
+                outcomes.append((False, e))
+            conn.execute('RELEASE command')
+        conn.commit()
+        return outcomes
+
+    def _apply_with_retries(self, conn, batch):
+        attempt = 0
+        while True:
+            try:
+                return self._apply(conn, batch)
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if not isinstance(e, sqlite3.OperationalError) or not is_busy_error(e) or attempt >= WRITE_RETRIES:
+                    return [(False, e)] * len(batch)
+            with self._lock:
+                self.stats['retried_batches'] += 1
+            time.sleep(WRITE_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._next_batch()
+            try:
+                if conn is None:
+                    conn = open_connection(self.path)
+                outcomes = self._apply_with_retries(conn, batch)
+            except Exception as e:
+                # The connection could not be opened or rolled back. Fail this
+                # batch and give the next one a fresh connection; the writer
+                # thread itself must outlive any error.
+                outcomes = [(False, e)] * len(batch)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['commands'] += len(batch)
+                self.stats['failed_commands'] += sum(1 for ok, _ in outcomes if not ok)
+                self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(queued=self._queue.qsize(), batch_size=self.batch_size)
+        return stats
+
+
+_writers = {}
+
+def get_writer():
+    writer = _writers.get(DB_NAME)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.get(DB_NAME)
+            if writer is None:
+                writer = _writers[DB_NAME] = BatchWriter(DB_NAME)
+    return writer
+
+def submit_write(work):
+    """Queues work(conn) for the batch writer and returns its Future."""
+    return get_writer().submit(work)
+
+def batched_write(work):
+    """Runs work(conn) through the batch writer and waits for its committed result.
+
+    Same contract as write_transaction(): the result of work is returned and
+    its exception re-raised, with no other command's failure leaking in.
+    Falls back to write_transaction() when WRITE_BEHIND_ENABLED is off.
+    Raises WriteTimeout after WRITE_RESULT_TIMEOUT seconds without a result;
+    the command may still be applied after that.
+    """
+    if not WRITE_BEHIND_ENABLED:
+        return write_transaction(work)
+    try:
+        return submit_write(work).result(timeout=WRITE_RESULT_TIMEOUT)
+    except FutureTimeout:
+        raise WriteTimeout(f'No result from the write queue after {WRITE_RESULT_TIMEOUT}s') from None
+
+def writer_stats():
+    return get_writer().snapshot() if WRITE_BEHIND_ENABLED else {}
+
+def pool_stats():
+    pool = get_pool()
+    with pool._lock:
+        stats = dict(pool.stats)
+    stats.update(size=pool.size, idle=len(pool._idle))
+    return stats
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+def hash_password(password, n=None, r=None, p=None):
+    """Returns 'scrypt$n$r$p$salt$key' for a new salted scrypt hash."""
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(SCRYPT_SALT_BYTES)
+    key = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                         maxmem=256 * n * r, dklen=SCRYPT_DKLEN)
+    return f'scrypt${n}${r}${p}${_b64(salt)}${_b64(key)}'
+
+def _legacy_hash(password):
+    return hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+def verify_password(password, stored_hash):
+    """Checks a password against a scrypt hash or a legacy unsalted SHA-256 hex digest."""
+    if not stored_hash.startswith('scrypt$'):
+        return hmac.compare_digest(_legacy_hash(password), stored_hash)
+    try:
+        _, n, r, p, salt, key = stored_hash.split('$')
+        n, r, p = int(n), int(r), int(p)
+        salt, key = base64.b64decode(salt), base64.b64decode(key)
+    except ValueError:
+        return False
+    candidate = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                               maxmem=256 * n * r, dklen=len(key))
+    return hmac.compare_digest(candidate, key)
+
+def needs_rehash(stored_hash):
+    """True for legacy hashes and scrypt hashes made with other cost parameters."""
+    return not stored_hash.startswith(f'scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$')
+
+def check_password(password, stored_hash):
+    """Verifies a password, returning (ok, upgraded_hash or None) so callers can rehash on login."""
+    if not verify_password(password, stored_hash):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored_hash) else None
+
+def create_tables(verbose=True):
+    """Creates any missing tables and applies pending migrations; safe to run on every start.
+
+    Runs on a connection of its own rather than a pooled one: app.py calls
+    this at import, and an idle pooled handle left in a preloading server's
+    parent process would be inherited by every forked worker.
+    """
+    conn = open_connection(DB_NAME)
     cursor = conn.cursor()
 
     cursor.execute('''
@@ -73,7 +718,7 @@ def create_tables():
             status TEXT NOT NULL CHECK(status IN ('Booked', 'Completed', 'Cancelled')),
             FOREIGN KEY (patient_id) REFERENCES Patient(id),
             FOREIGN KEY (doctor_id) REFERENCES Doctor(id),
-            UNIQUE (doctor_id, date, time) 
+            UNIQUE (doctor_id, date, time) -- relaxed to non-cancelled rows by migration 3
         );
     ''')
     
@@ -104,10 +749,275 @@ def create_tables():
 
     conn.commit()
 
+    apply_migrations(conn, verbose)
 
-    conn.commit()
     conn.close()
-    print("Database tables created successfully.")
+    if verbose:
+        print("Database tables created successfully.")
+
+
+def _rebuild_appointment_for_rebooking(conn):
+    # SQLite cannot drop a table constraint, so rebuild Appointment without
+    # UNIQUE(doctor_id, date, time) and enforce uniqueness only among
+    # appointments that still hold their slot.
+    conn.execute('''
+        CREATE TABLE Appointment_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            doctor_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            time TIME NOT NULL,
+            status TEXT NOT NULL CHECK(status IN ('Booked', 'Completed', 'Cancelled')),
+            FOREIGN KEY (patient_id) REFERENCES Patient(id),
+            FOREIGN KEY (doctor_id) REFERENCES Doctor(id)
+        );
+    ''')
+    conn.execute('''
+        INSERT INTO Appointment_new (id, patient_id, doctor_id, date, time, status)
+        SELECT id, patient_id, doctor_id, date, time, status FROM Appointment
+    ''')
+    conn.execute('DROP TABLE Appointment')
+    conn.execute('ALTER TABLE Appointment_new RENAME TO Appointment')
+    for version, _, statements in MIGRATIONS[:2]:
+        for statement in statements:
+            if 'ON Appointment ' in statement:
+                conn.execute(statement)
+
+
+# Dashboard counters kept in StatCounter by triggers. Each query yields
+# (name, value) pairs; together they define what the counters should hold.
+STAT_QUERIES = (
+    "SELECT 'doctors', COUNT(*) FROM Doctor",
+    "SELECT 'patients', COUNT(*) FROM Patient",
+    "SELECT 'appointments', COUNT(*) FROM Appointment",
+    "SELECT 'appointments:' || status, COUNT(*) FROM Appointment GROUP BY status",
+    "SELECT 'specialization_doctors:' || specialization_id, COUNT(*) FROM Doctor GROUP BY specialization_id",
+)
+
+def _bump(name_expr, delta):
+    return (f"INSERT INTO StatCounter (name, value) VALUES ({name_expr}, {delta}) "
+            f"ON CONFLICT(name) DO UPDATE SET value = value + {delta};")
+
+def _stat_trigger(name, event, table, *bumps, when=None):
+    condition = f' WHEN {when}' if when else ''
+    return (f'CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}{condition} '
+            f'BEGIN {" ".join(bumps)} END')
+
+STAT_TRIGGERS = (
+    _stat_trigger('trg_stats_doctor_insert', 'INSERT', 'Doctor',
+                  _bump("'doctors'", 1), _bump("'specialization_doctors:' || NEW.specialization_id", 1)),
+    _stat_trigger('trg_stats_doctor_delete', 'DELETE', 'Doctor',
+                  _bump("'doctors'", -1), _bump("'specialization_doctors:' || OLD.specialization_id", -1)),
+    _stat_trigger('trg_stats_doctor_specialization', 'UPDATE OF specialization_id', 'Doctor',
+                  _bump("'specialization_doctors:' || OLD.specialization_id", -1),
+                  _bump("'specialization_doctors:' || NEW.specialization_id", 1),
+                  when='OLD.specialization_id IS NOT NEW.specialization_id'),
+    _stat_trigger('trg_stats_patient_insert', 'INSERT', 'Patient', _bump("'patients'", 1)),
+    _stat_trigger('trg_stats_patient_delete', 'DELETE', 'Patient', _bump("'patients'", -1)),
+    _stat_trigger('trg_stats_appointment_insert', 'INSERT', 'Appointment',
+                  _bump("'appointments'", 1), _bump("'appointments:' || NEW.status", 1)),
+    _stat_trigger('trg_stats_appointment_delete', 'DELETE', 'Appointment',
+                  _bump("'appointments'", -1), _bump("'appointments:' || OLD.status", -1)),
+    _stat_trigger('trg_stats_appointment_status', 'UPDATE OF status', 'Appointment',
+                  _bump("'appointments:' || OLD.status", -1), _bump("'appointments:' || NEW.status", 1),
+                  when='OLD.status IS NOT NEW.status'),
+)
+
+def compute_stats(conn):
+    return {name: value for query in STAT_QUERIES for name, value in conn.execute(query)}
+
+def rebuild_stats(conn):
+    """Recomputes every StatCounter row from the base tables. The caller commits."""
+    conn.execute("DELETE FROM StatCounter")
+    conn.executemany("INSERT INTO StatCounter (name, value) VALUES (?, ?)", compute_stats(conn).items())
+
+def check_stats(conn):
+    """Returns {name: (stored, actual)} for every counter that disagrees with the base tables."""
+    stored = {name: value for name, value in conn.execute("SELECT name, value FROM StatCounter") if value}
+    actual = compute_stats(conn)
+    return {name: (stored.get(name, 0), actual.get(name, 0))
+            for name in stored.keys() | actual.keys()
+            if stored.get(name, 0) != actual.get(name, 0)}
+
+def read_stats(conn):
+    return {name: value for name, value in conn.execute("SELECT name, value FROM StatCounter")}
+
+
+# Per-table change counters behind the HTTP validators in app.py. Every row
+# written bumps its table's version; a response built from these tables is
+# unchanged for as long as their versions are. User and DoctorAvailability
+# are left out: no validated page reads them and they take the bulk writes.
+VERSIONED_TABLES = ('Specialization', 'Doctor', 'Patient', 'Appointment', 'Treatment')
+
+def _version_trigger(table, event):
+    return (f'CREATE TRIGGER IF NOT EXISTS trg_version_{table.lower()}_{event.lower()} AFTER {event} ON {table} '
+            f"BEGIN UPDATE TableVersion SET version = version + 1, changed_at = CAST(strftime('%s', 'now') AS INTEGER) "
+            f"WHERE name = '{table}'; END")
+
+def _seed_table_versions(conn):
+    # Versions start at a random point so a rebuilt database never hands out
+    # validators a client already holds from the old one.
+    conn.executemany(
+        "INSERT OR IGNORE INTO TableVersion (name, version, changed_at) "
+        "VALUES (?, abs(random() % 1000000000), CAST(strftime('%s', 'now') AS INTEGER))",
+        [(table,) for table in VERSIONED_TABLES])
+
+def read_table_versions(conn, tables):
+    """Returns ((version, ...) in `tables` order, latest changed_at) in a single query."""
+    rows = {name: (version, changed_at) for name, version, changed_at in conn.execute(
+        f"SELECT name, version, changed_at FROM TableVersion WHERE name IN ({', '.join('?' * len(tables))})",
+        tables)}
+    return tuple(rows[table][0] for table in tables), max(rows[table][1] for table in tables)
+
+
+def fts5_available(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+    except sqlite3.OperationalError:
+        return False
+    conn.execute("DROP TABLE temp.fts5_probe")
+    return True
+
+def _create_treatment_search(conn):
+    # External-content FTS5 index over Treatment; triggers keep it in step.
+    # Builds without FTS5 skip this and search falls back to LIKE.
+    if not fts5_available(conn):
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS TreatmentSearch USING fts5(
+            diagnosis, prescription, doctor_notes,
+            content='Treatment', content_rowid='id', tokenize='porter unicode61'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_treatment_search_insert AFTER INSERT ON Treatment BEGIN
+            INSERT INTO TreatmentSearch (rowid, diagnosis, prescription, doctor_notes)
+            VALUES (NEW.id, NEW.diagnosis, NEW.prescription, NEW.doctor_notes);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_treatment_search_delete AFTER DELETE ON Treatment BEGIN
+            INSERT INTO TreatmentSearch (TreatmentSearch, rowid, diagnosis, prescription, doctor_notes)
+            VALUES ('delete', OLD.id, OLD.diagnosis, OLD.prescription, OLD.doctor_notes);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_treatment_search_update AFTER UPDATE ON Treatment BEGIN
+            INSERT INTO TreatmentSearch (TreatmentSearch, rowid, diagnosis, prescription, doctor_notes)
+            VALUES ('delete', OLD.id, OLD.diagnosis, OLD.prescription, OLD.doctor_notes);
+            INSERT INTO TreatmentSearch (rowid, diagnosis, prescription, doctor_notes)
+            VALUES (NEW.id, NEW.diagnosis, NEW.prescription, NEW.doctor_notes);
+        END
+    ''')
+    conn.execute("INSERT INTO TreatmentSearch (TreatmentSearch) VALUES ('rebuild')")
+
+def has_treatment_search(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'TreatmentSearch'").fetchone() is not None
+
+
+# Ordered schema migrations: (version, description, statements). Append new
+# steps with the next version number; never edit a step that has shipped.
+MIGRATIONS = [
+    (1, 'Indexes for dashboard, history and slot search predicates', (
+        # patient_dashboard, consultation_form and view_patient_history
+        'CREATE INDEX IF NOT EXISTS idx_appointment_patient_date '
+        'ON Appointment (patient_id, date DESC, time DESC)',
+        # doctor_dashboard upcoming / recent completed
+        'CREATE INDEX IF NOT EXISTS idx_appointment_doctor_status_date '
+        'ON Appointment (doctor_id, status, date, time)',
+        # find_doctors only ever looks for free slots
+        'CREATE INDEX IF NOT EXISTS idx_availability_open_date_doctor '
+        'ON DoctorAvailability (date, doctor_id, start_time) WHERE is_booked = 0',
+        'CREATE INDEX IF NOT EXISTS idx_doctor_specialization '
+        'ON Doctor (specialization_id, is_blacklisted)',
+    )),
+    (2, 'Keyset pagination indexes for admin reports', (
+        'CREATE INDEX IF NOT EXISTS idx_appointment_date_time_id '
+        'ON Appointment (date, time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_patient_name_id '
+        'ON Patient (name, id)',
+    )),
+    (3, 'Only non-cancelled appointments hold a doctor/date/time slot', (
+        _rebuild_appointment_for_rebooking,
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_appointment_active_slot '
+        "ON Appointment (doctor_id, date, time) WHERE status != 'Cancelled'",
+    )),
+    (4, 'Trigger-maintained dashboard counters', (
+        '''CREATE TABLE IF NOT EXISTS StatCounter (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID''',
+        *STAT_TRIGGERS,
+        rebuild_stats,
+    )),
+    (5, 'Full-text index over treatment records', (
+        _create_treatment_search,
+    )),
+    (6, 'Per-table change counters for HTTP validators', (
+        '''CREATE TABLE IF NOT EXISTS TableVersion (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID''',
+        _seed_table_versions,
+        *(_version_trigger(table, event) for table in VERSIONED_TABLES for event in ('INSERT', 'UPDATE', 'DELETE')),
+    )),
+]
+
+def get_schema_version(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def apply_migrations(conn, verbose=True):
+    """Runs every migration newer than the recorded schema version, each in its own transaction.
+
+    Foreign keys are switched off while migrating so steps can rebuild
+    referenced tables; each step must leave PRAGMA foreign_key_check clean.
+    The version is checked again under the write lock, so several processes
+    starting at once apply each step exactly once.
+    """
+    current = get_schema_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > current]
+    applied = []
+    if pending:
+        conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, description, statements in pending:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if get_schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(statement)
+                violations = conn.execute('PRAGMA foreign_key_check').fetchall()
+                if violations:
+                    raise sqlite3.IntegrityError(f'Migration {version} left {len(violations)} foreign key violations')
+                conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                             (version, description))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        if pending:
+            conn.execute('PRAGMA foreign_keys = ON')
+    if applied:
+        conn.execute('ANALYZE')
+        if verbose:
+            print(f"Applied schema migrations: {', '.join(map(str, applied))}.")
+    return applied
 
 def seed_initial_data():
     """Inserts the pre-existing Admin and initial Specializations."""
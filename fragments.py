@@ -0,0 +1,31 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCacheExtension(Extension):
+    """Adds a {% cache name, key... %}...{% endcache %} tag backed by environment.fragment_cache.
+
+    The rendered block is stored under the tuple (name, key...), so every
+    input the block depends on has to be part of the key. Blocks render
+    normally while no cache is attached.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        return cache.get_or_load(tuple(key), caller)
@@ -0,0 +1,185 @@
+"""Replays a realistic request mix against the app with Flask's test client.
+
+    python seed_data.py --db load.db --seed 1
+    python loadtest.py --db load.db --threads 8 --duration 30 --output run.json
+
+Each worker thread logs in as a random synthetic patient, doctor or admin
+and then loops over that role's routes. Per-route throughput and latency
+percentiles are written as JSON so two runs can be diffed.
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import database
+from seed_data import SYNTHETIC_PASSWORD, DOCTOR_USERNAME, PATIENT_USERNAME
+
+BOOK_LINK = re.compile(rb'/patient/book_appointment/(\d+)')
+CONSULT_LINK = re.compile(rb'/doctor/consult/(\d+)')
+
+# Share of workers per role; each role has its own weighted route mix.
+ROLE_WEIGHTS = {'Patient': 0.7, 'Doctor': 0.25, 'Admin': 0.05}
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def report(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors.get(route, 0),
+                'throughput_rps': round(len(samples) / elapsed, 2),
+                'p50_ms': round(_percentile(samples, 50) * 1000, 3),
+                'p90_ms': round(_percentile(samples, 90) * 1000, 3),
+                'p99_ms': round(_percentile(samples, 99) * 1000, 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {'elapsed_s': round(elapsed, 3), 'requests': total,
+                'throughput_rps': round(total / elapsed, 2), 'routes': routes}
+
+
+def _percentile(samples, pct):
+    index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+class Worker(threading.Thread):
+    def __init__(self, app, recorder, rng, accounts, deadline, max_requests):
+        super().__init__(daemon=True)
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.rng = rng
+        self.accounts = accounts
+        self.deadline = deadline
+        self.max_requests = max_requests
+        self.role = rng.choices(list(ROLE_WEIGHTS), weights=list(ROLE_WEIGHTS.values()))[0]
+
+    def call(self, route, method, url, data=None):
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, data=data)
+        elapsed = time.perf_counter() - started
+        self.recorder.record(route, elapsed, response.status_code < 400)
+        return response
+
+    def login(self):
+        if self.role == 'Admin':
+            username, password = database.DEFAULT_ADMIN_USERNAME, database.DEFAULT_ADMIN_PASSWORD
+        else:
+            template = DOCTOR_USERNAME if self.role == 'Doctor' else PATIENT_USERNAME
+            username = template.format(self.rng.choice(self.accounts[self.role]))
+            password = SYNTHETIC_PASSWORD
+        self.call('login', 'POST', '/login', {'username': username, 'password': password})
+        self.client.get('/dashboard')
+
+    def patient_step(self):
+        action = self.rng.choices(['dashboard', 'search'], weights=[0.4, 0.6])[0]
+        if action == 'dashboard':
+            self.call('patient_dashboard', 'GET', '/patient/dashboard')
+            return
+        day = date.today() + timedelta(days=self.rng.randint(0, 30))
+        response = self.call('find_doctors', 'POST', '/patient/find_doctors', {
+            'specialization_id': str(self.rng.choice(self.accounts['specializations'])),
+            'appointment_date': day.isoformat(),
+        })
+        slots = BOOK_LINK.findall(response.data)
+        if slots and self.rng.random() < 0.3:
+            self.call('book_appointment', 'POST', f'/patient/book_appointment/{int(self.rng.choice(slots))}')
+
+    def doctor_step(self):
+        response = self.call('doctor_dashboard', 'GET', '/doctor/dashboard')
+        appointments = CONSULT_LINK.findall(response.data)
+        if appointments and self.rng.random() < 0.3:
+            appointment_id = int(self.rng.choice(appointments))
+            self.call('consultation_form', 'GET', f'/doctor/consult/{appointment_id}')
+            self.call('submit_treatment', 'POST', f'/doctor/submit_treatment/{appointment_id}', {
+                'diagnosis': 'Load test diagnosis', 'prescription': 'Rest', 'doctor_notes': '',
+            })
+
+    def admin_step(self):
+        route, url = self.rng.choice([
+            ('admin_dashboard', '/admin/dashboard'),
+            ('view_all_appointments', '/admin/appointments'),
+            ('view_all_patients', '/admin/patients'),
+        ])
+        self.call(route, 'GET', url)
+
+    def run(self):
+        step = {'Patient': self.patient_step, 'Doctor': self.doctor_step, 'Admin': self.admin_step}[self.role]
+        self.login()
+        done = 0
+        while time.monotonic() < self.deadline and (not self.max_requests or done < self.max_requests):
+            if self.rng.random() < 0.02:
+                self.client.get('/logout')
+                self.login()
+            step()
+            done += 1
+
+
+def load_accounts():
+    conn = database.get_db_connection()
+    accounts = {
+        'Doctor': [row[0] for row in conn.execute("SELECT id FROM Doctor WHERE is_blacklisted = 0")],
+        'Patient': [row[0] for row in conn.execute("SELECT id FROM Patient WHERE is_blacklisted = 0")],
+        'specializations': [row[0] for row in conn.execute("SELECT id FROM Specialization")],
+    }
+    conn.close()
+    return accounts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a mixed workload against app.py.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='steps per worker (0 = until --duration)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    from app import app
+
+    accounts = load_accounts()
+    if not accounts['Doctor'] or not accounts['Patient']:
+        sys.exit('No synthetic accounts found; run seed_data.py against this database first.')
+
+    recorder = Recorder()
+    started = time.monotonic()
+    workers = [Worker(app, recorder, random.Random(args.seed * 1000 + i), accounts,
+                      started + args.duration, args.requests)
+               for i in range(args.threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    report = recorder.report(time.monotonic() - started)
+    report['config'] = vars(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
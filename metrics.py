@@ -0,0 +1,166 @@
+import bisect
+import contextvars
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class StatementStats:
+    __slots__ = ('calls', 'seconds', 'rows')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Per-endpoint request timing plus per-statement SQL stats.
+
+    Acts as the database query observer: on_execute/on_fetch are called for
+    every statement run on a pooled connection, and the statements of the
+    current request are counted in a context variable so request_finished()
+    can flag requests that blow the query budget (the usual N+1 signature).
+    A context variable rather than a thread-local keeps concurrent coroutines
+    on one event loop apart, and work run in a copy of the request's context
+    (asgi.run_db) is counted against that request.
+    """
+
+    def __init__(self, query_budget=10):
+        self.query_budget = query_budget
+        self._lock = threading.Lock()
+        self._request = contextvars.ContextVar(f'metrics_request_{id(self)}', default=None)
+        self._statements = {}
+        self._normalized = {}
+        self._latency = {}
+        self._queries = {}
+        self._over_budget = {}
+        self._gauges = []
+
+    def add_gauges(self, prefix, snapshot):
+        """Registers a callable returning {name: number} to export as <prefix>_<name> gauges."""
+        self._gauges.append((prefix, snapshot))
+
+    def _statement_key(self, sql):
+        key = self._normalized.get(sql)
+        if key is None:
+            key = re.sub(r'\s+', ' ', sql).strip()
+            if len(self._normalized) < 4096:
+                self._normalized[sql] = key
+        return key
+
+    def on_execute(self, sql, seconds):
+        key = self._statement_key(sql)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = StatementStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            counter = self._request.get()
+            if counter is not None:
+                counter[0] += 1
+        return stats
+
+    def on_fetch(self, stats, rows, seconds):
+        if stats is None:
+            return
+        with self._lock:
+            stats.rows += rows
+            stats.seconds += seconds
+
+    def request_started(self):
+        # A one-item list, so copies of the context share the request's count.
+        self._request.set([0])
+
+    def request_finished(self, endpoint, seconds):
+        counter = self._request.get()
+        self._request.set(None)
+        endpoint = endpoint or 'unmatched'
+        with self._lock:
+            queries = counter[0] if counter is not None else 0
+            latency = self._latency.get(endpoint)
+            if latency is None:
+                latency = self._latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self._queries[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+            latency.observe(seconds)
+            self._queries[endpoint].observe(queries)
+            if queries > self.query_budget:
+                self._over_budget[endpoint] = self._over_budget.get(endpoint, 0) + 1
+        if queries > self.query_budget:
+            logger.warning('Possible N+1: %s ran %d queries (budget %d)', endpoint, queries, self.query_budget)
+        return queries
+
+    def render_prometheus(self):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'hms_request_duration_seconds',
+                                    'Request latency by endpoint.', self._latency)
+            self._render_histograms(lines, 'hms_request_queries',
+                                    'SQL statements executed per request.', self._queries)
+            lines.append('# HELP hms_request_over_query_budget_total Requests exceeding the query budget.')
+            lines.append('# TYPE hms_request_over_query_budget_total counter')
+            for endpoint, count in sorted(self._over_budget.items()):
+                lines.append(f'hms_request_over_query_budget_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+            statements = sorted(self._statements.items())
+            for metric, attr, help_text in (
+                ('hms_sql_statement_calls_total', 'calls', 'Executions per SQL statement.'),
+                ('hms_sql_statement_seconds_total', 'seconds', 'Execute plus fetch time per SQL statement.'),
+                ('hms_sql_statement_rows_total', 'rows', 'Rows returned per SQL statement.'),
+            ):
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} counter')
+                for sql, stats in statements:
+                    lines.append(f'{metric}{{statement="{_label(sql)}"}} {getattr(stats, attr)}')
+
+        for prefix, snapshot in self._gauges:
+            for name, value in sorted(snapshot().items()):
+                if isinstance(value, (int, float)):
+                    lines.append(f'# TYPE {prefix}_{name} gauge')
+                    lines.append(f'{prefix}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, metric, help_text, histograms):
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for endpoint, histogram in sorted(histograms.items()):
+            label = f'endpoint="{_label(endpoint)}"'
+            for bound, count in histogram.cumulative():
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label}}} {histogram.sum}')
+            lines.append(f'{metric}_count{{{label}}} {histogram.count}')
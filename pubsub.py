@@ -0,0 +1,105 @@
+import threading
+
+from workers import QueueFull
+
+
+class Subscription:
+    __slots__ = ('topic', 'notify', 'pending', 'stale')
+
+    def __init__(self, topic, notify):
+        self.topic = topic
+        self.notify = notify
+        # Created on the first event, so an idle subscriber holds no buffer.
+        self.pending = None
+        self.stale = False
+
+
+class EventHub:
+    """In-process fan-out of pre-encoded events to subscribers grouped by topic.
+
+    publish() is thread-safe and never blocks on a subscriber: it appends to
+    each subscriber's pending list and calls its notify() once the lock is
+    released. A subscriber that falls `max_pending` events behind has its
+    backlog dropped and is marked stale, telling it to resynchronise from a
+    full snapshot instead, so memory stays bounded by max_subscribers *
+    max_pending however slow the readers are.
+    """
+
+    def __init__(self, max_subscribers, max_pending):
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self._topics = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.stats = {'subscribed': 0, 'rejected': 0, 'published': 0, 'delivered': 0, 'overflows': 0, 'resets': 0}
+
+    def subscribe(self, topic, notify):
+        """Registers notify() for events on topic; raises QueueFull at max_subscribers."""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.stats['rejected'] += 1
+                raise QueueFull(f'{self._count} subscribers already connected')
+            subscription = Subscription(topic, notify)
+            self._topics.setdefault(topic, set()).add(subscription)
+            self._count += 1
+            self.stats['subscribed'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[subscription.topic]
+            self._count -= 1
+
+    def publish(self, topic, event):
+        with self._lock:
+            self.stats['published'] += 1
+            subscribers = tuple(self._topics.get(topic, ()))
+            for subscription in subscribers:
+                if subscription.stale:
+                    continue
+                if subscription.pending is None:
+                    subscription.pending = [event]
+                elif len(subscription.pending) < self.max_pending:
+                    subscription.pending.append(event)
+                else:
+                    subscription.pending = None
+                    subscription.stale = True
+                    self.stats['overflows'] += 1
+                    continue
+                self.stats['delivered'] += 1
+        for subscription in subscribers:
+            subscription.notify()
+        return len(subscribers)
+
+    def reset_where(self, predicate):
+        """Marks every subscriber on a matching topic stale, e.g. after a bulk change."""
+        with self._lock:
+            subscribers = [subscription for topic, topic_subscribers in self._topics.items() if predicate(topic)
+                           for subscription in topic_subscribers]
+            for subscription in subscribers:
+                subscription.pending = None
+                subscription.stale = True
+            self.stats['resets'] += len(subscribers)
+        for subscription in subscribers:
+            subscription.notify()
+
+    def drain(self, subscription):
+        """Returns (stale, events) queued for a subscriber since its last drain."""
+        with self._lock:
+            events, subscription.pending = subscription.pending or [], None
+            stale, subscription.stale = subscription.stale, False
+        return stale, events
+
+    def __len__(self):
+        return self._count
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats.update(subscribers=self._count, topics=len(self._topics), max_subscribers=self.max_subscribers)
+        return stats
@@ -0,0 +1,154 @@
+"""Deterministic synthetic data for exercising the app at scale.
+
+    python seed_data.py --doctors 200 --patients 20000 --slots 200000 \
+        --appointments 100000 --treatments 60000 --seed 7
+
+Every generated account uses SYNTHETIC_PASSWORD; usernames are
+doctor<N> and patient<N>. The same seed against an empty database always
+produces the same rows.
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import database
+
+SYNTHETIC_PASSWORD = 'password123'
+DOCTOR_USERNAME = 'doctor{}'
+PATIENT_USERNAME = 'patient{}'
+
+FIRST_NAMES = ['Asha', 'Ben', 'Chen', 'Divya', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas',
+               'Kavya', 'Liam', 'Maya', 'Nikhil', 'Olga', 'Priya', 'Quinn', 'Ravi', 'Sara', 'Tomas']
+LAST_NAMES = ['Agarwal', 'Brown', 'Costa', 'Das', 'Evans', 'Fischer', 'Garg', 'Haddad', 'Iyer', 'Jones',
+              'Kim', 'Lopez', 'Mehta', 'Nair', 'Okafor', 'Patel', 'Rossi', 'Singh', 'Tanaka', 'Weber']
+DIAGNOSES = ['Atrial fibrillation', 'Hypertension', 'Migraine', 'Asthma', 'Type 2 diabetes',
+             'Otitis media', 'Epilepsy', 'Bronchiolitis', 'Angina', 'Peripheral neuropathy']
+PRESCRIPTIONS = ['Warfarin 5mg daily', 'Amlodipine 10mg daily', 'Sumatriptan 50mg as needed',
+                 'Salbutamol inhaler', 'Metformin 500mg twice daily', 'Amoxicillin 250mg for 7 days',
+                 'Levetiracetam 500mg twice daily', 'Saline nebuliser', 'Aspirin 75mg daily',
+                 'Gabapentin 300mg at night']
+NOTES = ['Review in two weeks.', 'Refer for imaging if symptoms persist.', 'Discussed lifestyle changes.',
+         'Follow up with bloods.', 'Patient responding well.', '']
+SLOT_TIMES = [f'{hour:02d}:{minute:02d}' for hour in range(8, 18) for minute in (0, 15, 30, 45)]
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def generate(conn, doctors, patients, slots, appointments, treatments, seed=0, days_back=90, days_ahead=60):
+    """Inserts synthetic rows in one transaction and returns the number of rows written per table."""
+    rng = random.Random(seed)
+    password_hash = database.hash_password(SYNTHETIC_PASSWORD)
+    today = date.today()
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        next_user = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM User").fetchone()[0]
+        next_doctor = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Doctor").fetchone()[0]
+        next_patient = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Patient").fetchone()[0]
+        specialization_ids = [row[0] for row in conn.execute("SELECT id FROM Specialization ORDER BY id")]
+
+        doctor_ids = list(range(next_doctor, next_doctor + doctors))
+        doctor_users = [(next_user + i, DOCTOR_USERNAME.format(doctor_id), password_hash, 'Doctor')
+                        for i, doctor_id in enumerate(doctor_ids)]
+        conn.executemany("INSERT INTO User (id, username, password_hash, role) VALUES (?, ?, ?, ?)", doctor_users)
+        conn.executemany("""
+            INSERT INTO Doctor (id, user_id, name, specialization_id, contact_info) VALUES (?, ?, ?, ?, ?)
+        """, [(doctor_id, user[0], _name(rng), rng.choice(specialization_ids), f'{user[1]}@hospital.test')
+              for doctor_id, user in zip(doctor_ids, doctor_users)])
+        next_user += doctors
+
+        patient_ids = list(range(next_patient, next_patient + patients))
+        patient_users = [(next_user + i, PATIENT_USERNAME.format(patient_id), password_hash, 'Patient')
+                         for i, patient_id in enumerate(patient_ids)]
+        conn.executemany("INSERT INTO User (id, username, password_hash, role) VALUES (?, ?, ?, ?)", patient_users)
+        conn.executemany("INSERT INTO Patient (id, user_id, name, contact_info) VALUES (?, ?, ?, ?)",
+                         [(patient_id, user[0], _name(rng), f'{user[1]}@mail.test')
+                          for patient_id, user in zip(patient_ids, patient_users)])
+
+        # Distinct (doctor, date, time) slots spread over the past and the future.
+        slot_keys = set()
+        max_slots = len(doctor_ids) * (days_back + days_ahead + 1) * len(SLOT_TIMES)
+        slots = min(slots, max_slots)
+        while len(slot_keys) < slots:
+            day = today + timedelta(days=rng.randint(-days_back, days_ahead))
+            slot_keys.add((rng.choice(doctor_ids), day.isoformat(), rng.choice(SLOT_TIMES)))
+        slot_rows = sorted(slot_keys)
+
+        booked = rng.sample(range(len(slot_rows)), min(appointments, len(slot_rows))) if patient_ids else []
+        booked.sort()
+        today_str = today.isoformat()
+        appointment_rows, booked_slots = [], set()
+        for index in booked:
+            doctor_id, day, slot_time = slot_rows[index]
+            if rng.random() < 0.1:
+                status = 'Cancelled'
+            elif day < today_str:
+                status = 'Completed'
+            else:
+                status = 'Booked'
+            if status != 'Cancelled':
+                booked_slots.add(index)
+            appointment_rows.append((rng.choice(patient_ids), doctor_id, day, slot_time, status))
+
+        conn.executemany("""
+            INSERT INTO DoctorAvailability (doctor_id, date, start_time, is_booked) VALUES (?, ?, ?, ?)
+        """, [(*slot, 1 if index in booked_slots else 0) for index, slot in enumerate(slot_rows)])
+
+        first_appointment = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM Appointment").fetchone()[0]
+        conn.executemany("""
+            INSERT INTO Appointment (id, patient_id, doctor_id, date, time, status) VALUES (?, ?, ?, ?, ?, ?)
+        """, [(first_appointment + i, *row) for i, row in enumerate(appointment_rows)])
+
+        completed = [first_appointment + i for i, row in enumerate(appointment_rows) if row[4] == 'Completed']
+        treated = completed[:treatments]
+        conn.executemany("""
+            INSERT INTO Treatment (appointment_id, diagnosis, prescription, doctor_notes, treatment_date)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(appointment_id,
+               rng.choice(DIAGNOSES), rng.choice(PRESCRIPTIONS), rng.choice(NOTES),
+               f'{appointment_rows[appointment_id - first_appointment][2]} '
+               f'{appointment_rows[appointment_id - first_appointment][3]}:00')
+              for appointment_id in treated])
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'doctors': len(doctor_ids),
+        'patients': len(patient_ids),
+        'slots': len(slot_rows),
+        'appointments': len(appointment_rows),
+        'treatments': len(treated),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Populate the HMS database with synthetic data.')
+    parser.add_argument('--db', default='load.db')
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--slots', type=int, default=20000)
+    parser.add_argument('--appointments', type=int, default=10000)
+    parser.add_argument('--treatments', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    database.create_tables()
+    database.seed_initial_data()
+
+    conn = database.get_db_connection()
+    started = time.perf_counter()
+    counts = generate(conn, args.doctors, args.patients, args.slots, args.appointments, args.treatments, args.seed)
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(', '.join(f'{count} {table}' for table, count in counts.items()) + f' written in {elapsed:.2f}s.')
+
+
+if __name__ == '__main__':
+    main()
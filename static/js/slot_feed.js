@@ -0,0 +1,84 @@
+// Keeps the available appointments list current from the slot_feed event
+// stream: a snapshot on connect (and after any gap), then booked/opened slots.
+(function () {
+    var list = document.getElementById('slot-list');
+    if (!list || !window.EventSource) {
+        return;
+    }
+    var bookUrl = list.dataset.bookUrl.replace(/0$/, '');
+    var specialization = list.dataset.specialization;
+    var doctors = {};
+
+    function slotForm(doctor, availabilityId, time) {
+        var form = document.createElement('form');
+        form.method = 'POST';
+        form.action = bookUrl + availabilityId;
+        form.style.cssText = 'display: inline-block; margin-right: 10px;';
+        var button = document.createElement('button');
+        button.type = 'submit';
+        button.textContent = time;
+        button.style.cssText = 'padding: 8px 15px; background: #38761d; color: white; border: none; border-radius: 3px; cursor: pointer;';
+        button.onclick = function () {
+            return confirm('Confirm booking with Dr. ' + doctor.name + ' at ' + time + '?');
+        };
+        form.appendChild(button);
+        return form;
+    }
+
+    function doctorBlock(doctor) {
+        var block = document.createElement('div');
+        block.style.cssText = 'border: 1px solid #ccc; padding: 15px; margin-bottom: 20px; border-radius: 5px;';
+        var heading = document.createElement('h3');
+        heading.textContent = 'Dr. ' + doctor.name + ' (' + specialization + ')';
+        var label = document.createElement('p');
+        label.textContent = 'Available Time Slots:';
+        var slots = document.createElement('div');
+        slots.style.marginTop = '10px';
+        Object.keys(doctor.slots)
+            .sort(function (a, b) { return doctor.slots[a] < doctor.slots[b] ? -1 : 1; })
+            .forEach(function (id) { slots.appendChild(slotForm(doctor, id, doctor.slots[id])); });
+        block.appendChild(heading);
+        block.appendChild(label);
+        block.appendChild(slots);
+        return block;
+    }
+
+    function render() {
+        var shown = Object.keys(doctors)
+            .map(function (id) { return doctors[id]; })
+            .filter(function (doctor) { return Object.keys(doctor.slots).length > 0; })
+            .sort(function (a, b) { return a.name < b.name ? -1 : a.name > b.name ? 1 : a.id - b.id; });
+        list.textContent = '';
+        if (!shown.length) {
+            var empty = document.createElement('div');
+            empty.className = 'alert alert-info';
+            empty.textContent = 'No available doctors found for your search criteria.';
+            list.appendChild(empty);
+        }
+        shown.forEach(function (doctor) { list.appendChild(doctorBlock(doctor)); });
+    }
+
+    function doctor(id, name) {
+        return doctors[id] || (doctors[id] = {id: id, name: name, slots: {}});
+    }
+
+    var source = new EventSource(list.dataset.feedUrl);
+    source.addEventListener('snapshot', function (event) {
+        doctors = {};
+        JSON.parse(event.data).doctors.forEach(function (entry) {
+            var current = doctor(entry.id, entry.name);
+            entry.slots.forEach(function (slot) { current.slots[slot[0]] = slot[1]; });
+        });
+        render();
+    });
+    source.addEventListener('booked', function (event) {
+        var availabilityId = JSON.parse(event.data).availability_id;
+        Object.keys(doctors).forEach(function (id) { delete doctors[id].slots[availabilityId]; });
+        render();
+    });
+    source.addEventListener('opened', function (event) {
+        var slot = JSON.parse(event.data);
+        doctor(slot.doctor_id, slot.doctor_name).slots[slot.availability_id] = slot.time;
+        render();
+    });
+})();
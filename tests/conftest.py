@@ -0,0 +1,81 @@
+"""Shared fixtures. Every test gets its own scratch database and empty app caches.
+
+    python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+# Importing app must never touch the checked-in hms.db.
+database.DB_NAME = os.path.join(tempfile.mkdtemp(prefix='hms-tests-'), 'hms.db')
+
+import app as app_module
+import seed_data
+
+
+def reset_app_state():
+    for cache in (app_module.availability_cache, app_module.reference_cache, app_module.identity_cache,
+                  app_module.timeline_cache, app_module.fragment_cache):
+        cache.clear()
+    app_module.blacklist.reload()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, migrated database with the admin account and specializations."""
+    path = str(tmp_path / 'hms.db')
+    monkeypatch.setattr(database, 'DB_NAME', path)
+    database.create_tables()
+    database.seed_initial_data()
+    reset_app_state()
+    yield path
+    replica = database._replicas.pop(path, None)
+    for pool in [database._pools.pop(path, None), *(replica.pools() if replica else ())]:
+        if pool is not None:
+            pool.retire()
+
+
+@pytest.fixture
+def seeded(db):
+    """The fresh database plus a small deterministic synthetic population."""
+    conn = database.get_db_connection()
+    counts = seed_data.generate(conn, doctors=5, patients=40, slots=1500, appointments=600, treatments=200, seed=1)
+    conn.close()
+    return counts
+
+
+@pytest.fixture
+def client(db):
+    return app_module.app.test_client()
+
+
+def log_in(client, role, user_id=1, **profile):
+    """Puts a logged-in session for `role` on a test client without paying for a password check."""
+    with client.session_transaction() as sess:
+        sess.update(logged_in=True, user_id=user_id, username=role.lower(), role=role, **profile)
+
+
+class QueryLog:
+    """Query observer that records the SQL of every statement run on a pooled connection."""
+
+    def __init__(self):
+        self.statements = []
+
+    def on_execute(self, sql, seconds):
+        self.statements.append(sql)
+
+    def on_fetch(self, handle, rows, seconds):
+        pass
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    log = QueryLog()
+    monkeypatch.setattr(database, 'query_observer', log)
+    return log
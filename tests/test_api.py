@@ -0,0 +1,48 @@
+import pytest
+
+import database
+from conftest import log_in
+
+
+def booked_appointment():
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT id, patient_id, doctor_id FROM Appointment WHERE status = 'Booked' LIMIT 1").fetchone()
+    conn.close()
+    return row
+
+
+@pytest.mark.parametrize('body', [{'diagnosis': {'a': 1}}, {'diagnosis': ['x']},
+                                  {'diagnosis': 'Flu', 'prescription': 5}, {'diagnosis': 'Flu', 'doctor_notes': []}])
+def test_treatment_fields_must_be_strings(seeded, client, body):
+    row = booked_appointment()
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    response = client.post(f"/api/v1/appointments/{row['id']}/treatment", json=body)
+    assert response.status_code == 400 and 'must be a string' in response.get_json()['error']
+
+
+def test_treatment_write_failure_is_a_json_error(seeded, client, monkeypatch):
+    def full(work):
+        raise database.WriteQueueFull('Write queue still full')
+    monkeypatch.setattr('app.batched_write', full)
+    row = booked_appointment()
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    response = client.post(f"/api/v1/appointments/{row['id']}/treatment", json={'diagnosis': 'Flu'})
+    assert response.status_code == 409 and 'Write queue' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('ids', ['12', 12, {'12': 1}, None])
+def test_batch_ids_must_be_a_list(seeded, client, ids):
+    log_in(client, 'Patient', patient_id=1)
+    for url, key in (('/api/v1/appointments/batch', 'availability_ids'),
+                     ('/api/v1/appointments/cancel', 'appointment_ids')):
+        response = client.post(url, json={key: ids})
+        assert response.status_code == 400 and response.get_json()['error'] == 'Expected a list of integer ids.'
+
+
+def test_history_batch_reads_ids_from_the_query_string(seeded, client):
+    row = booked_appointment()
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    response = client.get(f"/api/v1/patients/history?ids={row['patient_id']},999999")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [patient['id'] for patient in body['patients']] == [row['patient_id']] and body['missing'] == [999999]
@@ -0,0 +1,49 @@
+import pytest
+
+import database
+from app import auth_executor
+from conftest import log_in
+from workers import QueueFull
+
+REGISTRATION = {'name': 'Ada Patient', 'contact_info': 'ada@example.com', 'username': 'ada', 'password': 'secret123'}
+NEW_DOCTOR = {'name': 'Dr Bo', 'contact_info': 'bo@example.com', 'specialization_id': '1',
+              'username': 'bo', 'password': 'secret123'}
+
+
+def user_exists(username):
+    conn = database.get_db_connection()
+    row = conn.execute("SELECT 1 FROM User WHERE username = ?", (username,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Records what is submitted to the auth pool."""
+    submitted, submit = [], auth_executor.submit
+
+    def record(fn, *args, **kwargs):
+        submitted.append(fn.__name__)
+        return submit(fn, *args, **kwargs)
+    monkeypatch.setattr(auth_executor, 'submit', record)
+    return submitted
+
+
+def test_new_passwords_are_hashed_on_the_auth_pool(client, hashed):
+    assert client.post('/patient/register', data=REGISTRATION).status_code == 302
+    log_in(client, 'Admin')
+    client.post('/admin/doctors', data=NEW_DOCTOR)
+    assert hashed == ['hash_password', 'hash_password']
+    assert user_exists('ada') and user_exists('bo')
+    assert client.post('/login', data={'username': 'ada', 'password': 'secret123'}).status_code == 302
+
+
+def test_saturated_auth_pool_turns_registrations_away(client, monkeypatch):
+    def full(*args, **kwargs):
+        raise QueueFull('64 jobs already pending')
+    monkeypatch.setattr(auth_executor, 'submit', full)
+    response = client.post('/patient/register', data=REGISTRATION)
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    log_in(client, 'Admin')
+    assert client.post('/admin/doctors', data=NEW_DOCTOR).status_code == 302
+    assert not user_exists('ada') and not user_exists('bo')
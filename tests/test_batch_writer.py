@@ -0,0 +1,47 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database
+
+
+def count_admins(conn):
+    return conn.execute("SELECT COUNT(*) FROM User WHERE role = 'Admin'").fetchone()[0]
+
+
+def test_writer_survives_a_failed_open(db, monkeypatch):
+    real_open, calls = database.open_connection, []
+
+    def flaky_open(path, *args, **kwargs):
+        calls.append(path)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('unable to open database file')
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(database, 'open_connection', flaky_open)
+    writer = database.BatchWriter(db)
+    with pytest.raises(sqlite3.OperationalError, match='unable to open'):
+        writer.submit(count_admins).result(timeout=5)
+    assert writer.submit(count_admins).result(timeout=5) == 1
+
+
+def test_writer_survives_a_broken_connection(db):
+    writer = database.BatchWriter(db)
+    # Closing the writer's connection makes both the batch and its rollback fail.
+    with pytest.raises(sqlite3.ProgrammingError):
+        writer.submit(lambda conn: conn.close()).result(timeout=5)
+    assert writer.submit(count_admins).result(timeout=5) == 1
+    assert writer.snapshot()['failed_commands'] == 1
+
+
+def test_batched_write_times_out(db, monkeypatch):
+    monkeypatch.setattr(database, 'WRITE_RESULT_TIMEOUT', 0.1)
+    release = threading.Event()
+    stuck = database.submit_write(lambda conn: release.wait(5))
+    try:
+        with pytest.raises(database.WriteTimeout):
+            database.batched_write(count_admins)
+    finally:
+        release.set()
+    assert stuck.result(timeout=5) is True
@@ -0,0 +1,66 @@
+import database
+import seed_data
+from app import blacklist, book_slot, load_available_doctors
+from conftest import log_in
+
+
+def open_slot_of_some_doctor():
+    conn = database.get_db_connection()
+    slot = conn.execute("""
+        SELECT da.id, da.doctor_id, da.date, d.specialization_id FROM DoctorAvailability da
+        JOIN Doctor d ON da.doctor_id = d.id
+        WHERE da.is_booked = 0 AND da.date >= date('now')
+        ORDER BY da.id
+        LIMIT 1
+    """).fetchone()
+    conn.close()
+    return slot
+
+
+def flag_elsewhere(doctor_id):
+    """Blacklists a doctor the way another worker process would, behind this process's back."""
+    conn = database.open_connection(database.DB_NAME)
+    conn.execute("UPDATE Doctor SET is_blacklisted = 1 WHERE id = ?", (doctor_id,))
+    conn.commit()
+    conn.close()
+
+
+def is_booked(slot_id):
+    conn = database.get_db_connection()
+    booked = conn.execute("SELECT is_booked FROM DoctorAvailability WHERE id = ?", (slot_id,)).fetchone()[0]
+    conn.close()
+    return booked
+
+
+def test_blacklisted_doctor_cannot_log_in(seeded, client):
+    log_in(client, 'Admin')
+    client.post('/admin/doctors/toggle_blacklist/1')
+    client.get('/logout')
+    response = client.post('/login', data={'username': seed_data.DOCTOR_USERNAME.format(1),
+                                           'password': seed_data.SYNTHETIC_PASSWORD})
+    assert response.status_code == 403 and b'suspended' in response.data
+
+
+def test_blacklisted_doctor_is_hidden_from_search_and_cannot_be_booked(seeded, client):
+    slot = open_slot_of_some_doctor()
+    log_in(client, 'Admin')
+    client.post(f"/admin/doctors/toggle_blacklist/{slot['doctor_id']}")
+
+    search = load_available_doctors(slot['specialization_id'], slot['date'])
+    assert slot['doctor_id'] not in (search['doctors_with_slots'] if search else {})
+    booked, error = book_slot(slot['id'], 1)
+    assert booked is None and 'not currently accepting' in error
+    assert not is_booked(slot['id'])
+
+
+def test_flag_set_by_another_process_applies_after_the_check_interval(seeded, monkeypatch):
+    monkeypatch.setattr(blacklist, 'check_interval', 60)
+    slot = open_slot_of_some_doctor()
+    assert not blacklist.is_doctor_blacklisted(slot['doctor_id'])
+    flag_elsewhere(slot['doctor_id'])
+    assert not blacklist.is_doctor_blacklisted(slot['doctor_id'])
+
+    monkeypatch.setattr(blacklist, 'check_interval', 0)
+    assert blacklist.is_doctor_blacklisted(slot['doctor_id'])
+    booked, error = book_slot(slot['id'], 1)
+    assert booked is None and 'not currently accepting' in error
@@ -0,0 +1,165 @@
+"""Many threads racing to book the same few slots.
+
+Each test prints its throughput and latency; run with `-s` to see them.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import database
+from app import app
+from conftest import log_in
+from loadtest import _percentile
+
+THREADS = 16
+SLOTS = 4
+
+
+def open_slots(count):
+    conn = database.get_db_connection()
+    rows = conn.execute("""
+        SELECT id FROM DoctorAvailability WHERE is_booked = 0 AND date >= date('now') ORDER BY id LIMIT ?
+    """, (count,)).fetchall()
+    conn.close()
+    return [row['id'] for row in rows]
+
+
+def patient_ids():
+    conn = database.get_db_connection()
+    ids = [row['id'] for row in conn.execute("SELECT id FROM Patient ORDER BY id")]
+    conn.close()
+    return ids
+
+
+def run_threads(target, count):
+    """Runs target(index) on `count` threads released together; returns the wall time and any errors."""
+    start, errors = threading.Barrier(count + 1), []
+
+    def run(index):
+        start.wait()
+        try:
+            target(index)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, errors
+
+
+def report(name, seconds, latencies):
+    latencies.sort()
+    print(f'\n{name}: {len(latencies)} requests in {seconds:.2f}s, {len(latencies) / seconds:.0f} req/s, '
+          f'p50 {_percentile(latencies, 50) * 1000:.1f}ms, p99 {_percentile(latencies, 99) * 1000:.1f}ms')
+
+
+def slot_state(availability_ids):
+    """(availability id, is_booked, active appointments) for each slot."""
+    conn = database.get_db_connection()
+    rows = conn.execute(f"""
+        SELECT da.id, da.is_booked,
+               (SELECT COUNT(*) FROM Appointment a
+                WHERE a.doctor_id = da.doctor_id AND a.date = da.date AND a.time = da.start_time
+                  AND a.status != 'Cancelled') AS active
+        FROM DoctorAvailability da
+        WHERE da.id IN ({','.join('?' * len(availability_ids))})
+    """, availability_ids).fetchall()
+    conn.close()
+    return [tuple(row) for row in rows]
+
+
+@pytest.mark.parametrize('write_behind', [True, False], ids=['batch-writer', 'per-request'])
+def test_racing_bookings_claim_each_slot_once(seeded, monkeypatch, write_behind):
+    monkeypatch.setattr(database, 'WRITE_BEHIND_ENABLED', write_behind)
+    slots, patients = open_slots(SLOTS), patient_ids()
+    per_thread = 2000 // THREADS
+    latencies = []
+
+    def book(index):
+        client = app.test_client()
+        log_in(client, 'Patient', patient_id=patients[index % len(patients)])
+        for attempt in range(per_thread):
+            started = time.perf_counter()
+            response = client.post(f'/patient/book_appointment/{slots[attempt % SLOTS]}')
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 302
+
+    seconds, errors = run_threads(book, THREADS)
+    assert not errors, errors[0]
+    report(f'book x{THREADS} threads ({"batch writer" if write_behind else "per request"})', seconds, latencies)
+    assert len(latencies) == per_thread * THREADS
+    assert sorted(slot_state(slots)) == [(slot, 1, 1) for slot in sorted(slots)]
+
+
+def test_book_cancel_rebook_keeps_one_active_appointment(seeded):
+    slots, patients = open_slots(SLOTS), patient_ids()
+    per_thread = 1000 // THREADS
+    latencies, cycles = [], []
+
+    def cycle(index):
+        client = app.test_client()
+        log_in(client, 'Patient', patient_id=patients[index % len(patients)])
+        for attempt in range(per_thread):
+            started = time.perf_counter()
+            response = client.post('/api/v1/appointments', json={'availability_id': slots[attempt % SLOTS]})
+            if response.status_code == 201:
+                appointment_id = response.get_json()['appointment'][0]
+                assert client.delete(f'/api/v1/appointments/{appointment_id}').status_code == 200
+                cycles.append(appointment_id)
+            else:
+                assert response.status_code == 409
+            latencies.append(time.perf_counter() - started)
+
+    seconds, errors = run_threads(cycle, THREADS)
+    assert not errors, errors[0]
+    report(f'book/cancel x{THREADS} threads', seconds, latencies)
+    assert len(cycles) > SLOTS, 'no slot was rebooked after a cancellation'
+    assert sorted(slot_state(slots)) == [(slot, 0, 0) for slot in sorted(slots)]
+
+
+def insert_active_appointment(slot, patient_id):
+    return database.write_transaction(lambda conn: conn.execute("""
+        INSERT INTO Appointment (patient_id, doctor_id, date, time, status)
+        VALUES (?, ?, ?, ?, 'Booked')
+    """, (patient_id, slot['doctor_id'], slot['date'], slot['start_time'])).lastrowid)
+
+
+def race_inserts(slot, patients):
+    """Every thread inserts an active appointment for `slot` directly, skipping the is_booked claim."""
+    inserted, rejected = [], []
+
+    def insert(index):
+        try:
+            inserted.append(insert_active_appointment(slot, patients[index % len(patients)]))
+        except sqlite3.IntegrityError:
+            rejected.append(index)
+
+    _, errors = run_threads(insert, THREADS)
+    assert not errors, errors[0]
+    return inserted, rejected
+
+
+def test_active_slot_index_admits_one_booking_and_rebooking_after_cancel(seeded):
+    conn = database.get_db_connection()
+    slot = conn.execute("SELECT doctor_id, date, start_time FROM DoctorAvailability WHERE id = ?",
+                        (open_slots(1)[0],)).fetchone()
+    conn.close()
+    patients = patient_ids()
+
+    for _ in range(3):
+        inserted, rejected = race_inserts(slot, patients)
+        assert len(inserted) == 1 and len(rejected) == THREADS - 1
+        database.write_transaction(lambda conn: conn.execute(
+            "UPDATE Appointment SET status = 'Cancelled' WHERE id = ?", (inserted[0],)))
+
+    # Without idx_appointment_active_slot nothing else stops the duplicates.
+    database.write_transaction(lambda conn: conn.execute('DROP INDEX idx_appointment_active_slot'))
+    inserted, rejected = race_inserts(slot, patients)
+    assert len(inserted) == THREADS and not rejected
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+
+import pytest
+
+import database
+from app import app, EXPORT_QUERIES
+from conftest import log_in
+
+
+def appointment_ids(where='1 = 1', params=()):
+    conn = database.get_db_connection()
+    ids = [row[0] for row in conn.execute(f"SELECT id FROM Appointment a WHERE {where} ORDER BY id", params)]
+    conn.close()
+    return ids
+
+
+def middle_date():
+    conn = database.get_db_connection()
+    dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM Appointment ORDER BY date")]
+    conn.close()
+    return dates[len(dates) // 2]
+
+
+def export(client, url):
+    response = client.get(url, buffered=False)
+    assert response.status_code == 200 and response.is_streamed
+    chunks = [chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response]
+    response.close()
+    return chunks
+
+
+def exported_ids(client, url):
+    body = ''.join(export(client, url))
+    if url.split('?')[0].endswith('.csv'):
+        return [int(row['id']) for row in csv.DictReader(io.StringIO(body))]
+    return [json.loads(line)['id'] for line in body.splitlines()]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_export_streams_every_row_in_batches(seeded, client, monkeypatch, fmt):
+    monkeypatch.setitem(app.config, 'EXPORT_FETCH_BATCH', 100)
+    log_in(client, 'Admin')
+    chunks = export(client, f'/admin/export/appointments.{fmt}')
+    ids = appointment_ids()
+    assert len(chunks) >= len(ids) // 100
+    body = ''.join(chunks)
+    if fmt == 'csv':
+        rows = list(csv.reader(io.StringIO(body)))
+        assert tuple(rows[0]) == EXPORT_QUERIES['appointments'][1]
+        assert [int(row[0]) for row in rows[1:]] == ids
+    else:
+        rows = [json.loads(line) for line in body.splitlines()]
+        assert tuple(rows[0]) == EXPORT_QUERIES['appointments'][1]
+        assert [row['id'] for row in rows] == ids
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+def test_export_filters_by_date_range_and_status(seeded, client, fmt):
+    log_in(client, 'Admin')
+    day = middle_date()
+    url = f'/admin/export/appointments.{fmt}'
+    assert exported_ids(client, f'{url}?start_date={day}') == appointment_ids('date >= ?', (day,))
+    assert exported_ids(client, f'{url}?end_date={day}') == appointment_ids('date <= ?', (day,))
+    assert exported_ids(client, f'{url}?start_date={day}&end_date={day}&status=Completed') == appointment_ids(
+        "date = ? AND status = 'Completed'", (day,))
+
+
+def test_export_normalises_compact_dates(seeded, client):
+    log_in(client, 'Admin')
+    day = middle_date()
+    url = '/admin/export/treatments.csv?start_date={}'
+    expected = exported_ids(client, url.format(day))
+    assert expected and exported_ids(client, url.format(day.replace('-', ''))) == expected
+
+
+@pytest.mark.parametrize('query', ['start_date=yesterday', 'end_date=2024-13-01', 'status=Lost'])
+def test_export_rejects_bad_filters(seeded, client, query):
+    log_in(client, 'Admin')
+    response = client.get(f'/admin/export/appointments.csv?{query}')
+    assert response.status_code == 400 and b'Invalid export filter' in response.data
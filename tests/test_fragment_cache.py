@@ -0,0 +1,68 @@
+import re
+from datetime import date, timedelta
+
+import database
+from conftest import log_in
+
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+LATE_SLOT = {'start_date': TOMORROW, 'end_date': TOMORROW, 'start_time': '23:00', 'end_time': '23:30',
+             'slot_minutes': '30', 'weekdays': [str(day) for day in range(7)]}
+
+
+def late_slot(body):
+    """How the doctor dashboard shows tomorrow's 23:00 slot: 'Free', 'Booked' or None."""
+    match = re.search(r'23:00\s*\((Free|Booked)\)', body.decode())
+    return match.group(1) if match else None
+
+
+def commit(sql, params=()):
+    # Another worker process writing: nothing in this process hears about it.
+    conn = database.open_connection(database.DB_NAME)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_nav_follows_the_session_role(client):
+    assert b'Register (Patient)' in client.get('/login').data
+    log_in(client, 'Patient', patient_id=1)
+    assert b'Dashboard (Patient)' in client.get('/patient/dashboard').data
+    log_in(client, 'Doctor', doctor_id=1)
+    body = client.get('/doctor/dashboard').data
+    assert b'Dashboard (Doctor)' in body and b'Dashboard (Patient)' not in body
+
+
+def test_doctor_availability_follows_schedule_booking_and_cancel(seeded, client):
+    doctor, patient = client, client.application.test_client()
+    log_in(doctor, 'Doctor', doctor_id=1)
+    log_in(patient, 'Patient', patient_id=1)
+    assert late_slot(doctor.get('/doctor/dashboard').data) is None
+
+    doctor.post('/doctor/set_schedule', data=LATE_SLOT)
+    assert late_slot(doctor.get('/doctor/dashboard').data) == 'Free'
+
+    conn = database.get_db_connection()
+    slot_id = conn.execute("SELECT id FROM DoctorAvailability WHERE doctor_id = 1 AND date = ? AND start_time = '23:00'",
+                           (TOMORROW,)).fetchone()[0]
+    conn.close()
+    patient.post(f'/patient/book_appointment/{slot_id}')
+    assert late_slot(doctor.get('/doctor/dashboard').data) == 'Booked'
+
+    conn = database.get_db_connection()
+    appointment_id = conn.execute("SELECT id FROM Appointment WHERE doctor_id = 1 AND date = ? AND time = '23:00'",
+                                  (TOMORROW,)).fetchone()[0]
+    conn.close()
+    doctor.post(f'/doctor/cancel_appointment/{appointment_id}')
+    assert late_slot(doctor.get('/doctor/dashboard').data) == 'Free'
+
+
+def test_specialization_options_follow_specialization_changes(seeded, client):
+    log_in(client, 'Patient', patient_id=1)
+    assert b'Dermatology' not in client.get('/patient/dashboard').data
+
+    commit("INSERT INTO Specialization (name, description) VALUES ('Dermatology', 'Skin.')")
+    assert b'Dermatology' in client.get('/patient/dashboard').data
+
+    commit("UPDATE Specialization SET name = 'Skin Care' WHERE name = 'Dermatology'")
+    body = client.get('/patient/dashboard').data
+    assert b'Skin Care' in body and b'Dermatology' not in body
@@ -0,0 +1,168 @@
+import database
+from app import timeline_cache
+from conftest import log_in
+
+
+def treated_patient():
+    conn = database.get_db_connection()
+    row = conn.execute("""
+        SELECT a.patient_id, a.doctor_id, d.specialization_id, d.contact_info
+        FROM Treatment t
+        JOIN Appointment a ON t.appointment_id = a.id
+        JOIN Doctor d ON a.doctor_id = d.id
+        ORDER BY t.id
+        LIMIT 1
+    """).fetchone()
+    conn.close()
+    return row
+
+
+def revalidate(client, url, queries):
+    first = client.get(url)
+    assert first.status_code == 200 and first.get_etag()[0]
+    queries.statements.clear()
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    return first, again
+
+
+def test_report_hit_costs_one_counter_read(seeded, client, queries):
+    log_in(client, 'Admin')
+    first, again = revalidate(client, '/admin/patients', queries)
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert len(queries.statements) == 1 and 'TableVersion' in queries.statements[0]
+
+
+def test_history_hit_costs_one_counter_read(seeded, client, queries):
+    row = treated_patient()
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    _, again = revalidate(client, f"/doctor/history/{row['patient_id']}", queries)
+    assert again.status_code == 304
+    assert len(queries.statements) == 1 and 'TableVersion' in queries.statements[0]
+
+
+def test_unrelated_writes_revalidate_the_cached_history_without_reloading_it(seeded, client, queries):
+    row = treated_patient()
+    url = f"/doctor/history/{row['patient_id']}"
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    first = client.get(url)
+
+    conn = database.get_db_connection()
+    other = conn.execute("""
+        SELECT id FROM Appointment WHERE status = 'Booked' AND patient_id != ? LIMIT 1
+    """, (row['patient_id'],)).fetchone()['id']
+    conn.execute("UPDATE Appointment SET status = 'Completed' WHERE id = ?", (other,))
+    conn.execute("INSERT INTO Treatment (appointment_id, diagnosis) VALUES (?, 'Someone else')", (other,))
+    conn.execute("UPDATE Patient SET name = name || ' Jr' WHERE id != ?", (row['patient_id'],))
+    conn.commit()
+    conn.close()
+
+    queries.statements.clear()
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert len(queries.statements) == 2 and 'GROUP BY p.id, d.id' in queries.statements[1]
+
+    queries.statements.clear()
+    assert client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert len(queries.statements) == 1
+
+
+def test_write_to_a_counted_table_changes_the_etag(seeded, client):
+    log_in(client, 'Admin')
+    first = client.get('/admin/patients')
+    conn = database.get_db_connection()
+    conn.execute("UPDATE Patient SET name = name || ' Jr' WHERE id = (SELECT MIN(id) FROM Patient)")
+    conn.commit()
+    conn.close()
+    database.get_replica().refresh()
+    again = client.get('/admin/patients', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
+
+
+def test_history_etag_follows_the_cached_timeline_not_just_the_counters(seeded, client):
+    row = treated_patient()
+    url = f"/doctor/history/{row['patient_id']}"
+    log_in(client, 'Doctor', doctor_id=row['doctor_id'])
+    first = client.get(url)
+
+    # A rename committed elsewhere (e.g. another worker process) leaves this
+    # process's cached timeline in place; the counters must still force a reload.
+    conn = database.get_db_connection()
+    conn.execute("UPDATE Doctor SET name = 'Dr Renamed' WHERE id = ?", (row['doctor_id'],))
+    conn.commit()
+    conn.close()
+    assert row['patient_id'] in timeline_cache._entries
+
+    renamed = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert renamed.status_code == 200 and b'Dr Renamed' in renamed.data
+
+    timeline_cache.clear()
+    again = client.get(url, headers={'If-None-Match': renamed.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_submitted_treatment_is_folded_into_the_cached_timeline(seeded, client):
+    conn = database.get_db_connection()
+    appointment = conn.execute("""
+        SELECT a.id, a.patient_id, a.doctor_id FROM Appointment a
+        WHERE a.status = 'Booked' AND a.patient_id IN (
+            SELECT a2.patient_id FROM Treatment t JOIN Appointment a2 ON t.appointment_id = a2.id)
+        LIMIT 1
+    """).fetchone()
+    conn.close()
+    url = f"/api/v1/patients/{appointment['patient_id']}/history"
+    log_in(client, 'Doctor', doctor_id=appointment['doctor_id'])
+    before = client.get(url)
+
+    response = client.post(f"/api/v1/appointments/{appointment['id']}/treatment",
+                           json={'diagnosis': 'Folded in'})
+    assert response.status_code == 201
+
+    after = client.get(url, headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert len(after.get_json()['records']) == len(before.get_json()['records']) + 1
+    assert 'Folded in' in [record[1] for record in after.get_json()['records']]
+
+
+def test_treatment_committed_elsewhere_is_not_hidden_by_a_later_fold(seeded, client):
+    conn = database.get_db_connection()
+    elsewhere, here = conn.execute("""
+        SELECT a.id, a.patient_id, a.doctor_id FROM Appointment a
+        WHERE a.status = 'Booked' AND a.patient_id = (
+            SELECT patient_id FROM Appointment WHERE status = 'Booked'
+            GROUP BY patient_id HAVING COUNT(*) >= 2 ORDER BY patient_id LIMIT 1)
+        ORDER BY a.id
+        LIMIT 2
+    """).fetchall()
+    conn.close()
+    url = f"/api/v1/patients/{here['patient_id']}/history"
+    log_in(client, 'Doctor', doctor_id=here['doctor_id'])
+    before = client.get(url).get_json()['records']
+
+    # Another worker process completes a different appointment of the same patient.
+    other = database.open_connection(database.DB_NAME)
+    other.execute("UPDATE Appointment SET status = 'Completed' WHERE id = ?", (elsewhere['id'],))
+    other.execute("INSERT INTO Treatment (appointment_id, diagnosis) VALUES (?, 'Committed elsewhere')",
+                  (elsewhere['id'],))
+    other.commit()
+    other.close()
+
+    response = client.post(f"/api/v1/appointments/{here['id']}/treatment", json={'diagnosis': 'Folded in'})
+    assert response.status_code == 201
+
+    diagnoses = [record[1] for record in client.get(url).get_json()['records']]
+    assert len(diagnoses) == len(before) + 2
+    assert 'Committed elsewhere' in diagnoses and 'Folded in' in diagnoses
+
+
+def test_large_pages_are_gzip_encoded_with_their_own_validator(seeded, client):
+    log_in(client, 'Admin')
+    plain = client.get('/admin/appointments?per_page=500')
+    encoded = client.get('/admin/appointments?per_page=500', headers={'Accept-Encoding': 'gzip'})
+    assert encoded.headers['Content-Encoding'] == 'gzip'
+    assert len(encoded.data) < len(plain.data)
+    assert encoded.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    again = client.get('/admin/appointments?per_page=500',
+                       headers={'Accept-Encoding': 'gzip', 'If-None-Match': encoded.headers['ETag']})
+    assert again.status_code == 304
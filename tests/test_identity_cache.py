@@ -0,0 +1,39 @@
+import seed_data
+from app import get_identity, identity_cache
+from conftest import log_in
+
+
+def log_in_doctor(client, doctor_id):
+    response = client.post('/login', data={'username': seed_data.DOCTOR_USERNAME.format(doctor_id),
+                                           'password': seed_data.SYNTHETIC_PASSWORD})
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        return sess['user_id']
+
+
+def test_blacklist_toggle_reloads_the_cached_identity(seeded, client):
+    doctor = client.application.test_client()
+    user_id = log_in_doctor(doctor, 1)
+    assert identity_cache.get(user_id)['is_blacklisted'] == 0
+
+    log_in(client, 'Admin')
+    client.post('/admin/doctors/toggle_blacklist/1')
+    assert get_identity(user_id)['is_blacklisted'] == 1
+    assert doctor.get('/doctor/dashboard').status_code == 302
+    with doctor.session_transaction() as sess:
+        assert 'user_id' not in sess
+
+    client.post('/admin/doctors/toggle_blacklist/1')
+    assert get_identity(user_id)['is_blacklisted'] == 0
+    log_in_doctor(doctor, 1)
+    assert doctor.get('/doctor/dashboard').status_code == 200
+
+
+def test_doctor_edit_drops_the_cached_identity(seeded, client):
+    user_id = log_in_doctor(client.application.test_client(), 2)
+    assert identity_cache.get(user_id) is not None
+    log_in(client, 'Admin')
+    client.post('/admin/doctors/edit/2', data={'name': 'Dr Edited', 'specialization_id': '1',
+                                               'contact_info': 'edited@example.com'})
+    assert identity_cache.get(user_id) is None
+    assert get_identity(user_id)['doctor_id'] == 2
@@ -0,0 +1,47 @@
+import asyncio
+
+import database
+from metrics import Metrics
+
+
+def test_concurrent_coroutines_keep_their_own_counts():
+    metrics = Metrics()
+
+    async def request(queries):
+        metrics.request_started()
+        for _ in range(queries):
+            metrics.on_execute('SELECT 1', 0.0)
+            await asyncio.sleep(0)
+        return metrics.request_finished('endpoint', 0.0)
+
+    async def main():
+        return await asyncio.gather(*(request(queries) for queries in (3, 5, 8)))
+
+    assert asyncio.run(main()) == [3, 5, 8]
+
+
+def test_db_executor_work_counts_towards_its_request(db, monkeypatch):
+    import asgi
+    # Opened up front, so their connection PRAGMAs are not counted against a request.
+    connections = [database.open_connection(db) for _ in range(2)]
+    metrics = Metrics()
+    monkeypatch.setattr(database, 'query_observer', metrics)
+
+    def two_queries(conn):
+        conn.execute('SELECT COUNT(*) FROM User').fetchone()
+        conn.execute('SELECT COUNT(*) FROM Specialization').fetchone()
+
+    async def request(conn):
+        metrics.request_started()
+        await asgi.run_db(two_queries, conn)
+        await asgi.run_db(two_queries, conn)
+        return metrics.request_finished('endpoint', 0.0)
+
+    async def main():
+        return await asyncio.gather(*(request(conn) for conn in connections))
+
+    try:
+        assert asyncio.run(main()) == [4, 4]
+    finally:
+        for conn in connections:
+            conn.close()
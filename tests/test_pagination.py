@@ -0,0 +1,32 @@
+import base64
+import json
+
+import pytest
+
+from app import decode_cursor, encode_cursor
+from conftest import log_in
+
+TAMPERED = [[{}, 1, 2], [None, 'a', 1], [[1], 2, 3], ['2030-01-01', True, {'x': 1}]]
+
+
+def token(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(['2030-01-01', '09:00', 7]), 3) == ['2030-01-01', '09:00', 7]
+    assert decode_cursor(encode_cursor(['a', 1.5]), 3) is None
+    assert decode_cursor('not base64!', 3) is None
+
+
+@pytest.mark.parametrize('values', TAMPERED)
+def test_tampered_cursor_falls_back_to_first_page(values):
+    assert decode_cursor(token(values), 3) is None
+
+
+@pytest.mark.parametrize('values', TAMPERED)
+def test_tampered_cursors_render_the_first_page(seeded, client, values):
+    log_in(client, 'Admin')
+    assert client.get('/admin/appointments', query_string={'after': token(values)}).status_code == 200
+    log_in(client, 'Patient', patient_id=1)
+    assert client.get('/patient/dashboard', query_string={'history_after': token(values)}).status_code == 200
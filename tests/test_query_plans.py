@@ -0,0 +1,107 @@
+"""EXPLAIN QUERY PLAN checks for the hot-path routes.
+
+The SQL each route actually runs is captured through the query observer,
+so these checks follow the routes as they change. Plans are taken after
+ANALYZE over a seeded database, as on a deployed one.
+"""
+import re
+from datetime import date
+
+import pytest
+
+import database
+from app import app
+from conftest import log_in
+
+# Tables that grow without bound and must never be scanned in full.
+LARGE_TABLES = {'Appointment', 'DoctorAvailability', 'Treatment'}
+
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|JOIN\b|LEFT\b|ORDER\b)(\w+))?', re.I)
+
+
+@pytest.fixture
+def booked(seeded):
+    conn = database.get_db_connection()
+    conn.execute('ANALYZE')
+    conn.commit()
+    row = conn.execute("SELECT id, patient_id, doctor_id FROM Appointment WHERE status = 'Booked' LIMIT 1").fetchone()
+    conn.close()
+    return row
+
+
+ROUTES = {
+    'patient_dashboard': ('Patient', 'GET', lambda row: '/patient/dashboard', None),
+    'find_doctors': ('Patient', 'POST', lambda row: '/patient/find_doctors',
+                     {'specialization_id': '1', 'appointment_date': date.today().isoformat()}),
+    'doctor_dashboard': ('Doctor', 'GET', lambda row: '/doctor/dashboard', None),
+    'consultation_form': ('Doctor', 'GET', lambda row: f"/doctor/consult/{row['id']}", None),
+    'view_patient_history': ('Doctor', 'GET', lambda row: f"/doctor/history/{row['patient_id']}", None),
+}
+
+
+def route_statements(queries, row, role, method, url, data):
+    client = app.test_client()
+    profile = {'doctor_id': row['doctor_id']} if role == 'Doctor' else {'patient_id': row['patient_id']}
+    log_in(client, role, **profile)
+    queries.statements.clear()
+    response = client.open(url(row), method=method, data=data)
+    assert response.status_code == 200
+    return [sql for sql in dict.fromkeys(queries.statements) if sql.lstrip().upper().startswith('SELECT')]
+
+
+def tables_in(sql):
+    return {table for table, _ in TABLE_ALIAS.findall(sql)}
+
+
+def scanned_tables(conn, sql):
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?')).fetchall()
+    return {aliases.get(row['detail'].split()[1], row['detail'].split()[1])
+            for row in plan if row['detail'].startswith('SCAN ')}, plan
+
+
+@pytest.mark.parametrize('route', sorted(ROUTES))
+def test_route_queries_use_indexes_on_large_tables(booked, queries, route):
+    statements = route_statements(queries, booked, *ROUTES[route])
+    touched = [sql for sql in statements if LARGE_TABLES & tables_in(sql)]
+    assert touched, f'{route} ran no query against {sorted(LARGE_TABLES)}'
+
+    conn = database.get_db_connection()
+    try:
+        for sql in touched:
+            scanned, plan = scanned_tables(conn, sql)
+            assert not scanned & LARGE_TABLES, (
+                f'{route} scans {sorted(scanned & LARGE_TABLES)}:\n{" ".join(sql.split())}\n'
+                + '\n'.join(row['detail'] for row in plan))
+    finally:
+        conn.close()
+
+
+def test_migrations_create_the_hot_path_indexes(db):
+    conn = database.get_db_connection()
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    version = database.get_schema_version(conn)
+    conn.close()
+    assert version == database.MIGRATIONS[-1][0]
+    assert {'idx_appointment_patient_date', 'idx_appointment_doctor_status_date',
+            'idx_availability_open_date_doctor', 'idx_appointment_active_slot'} <= indexes
+
+
+def test_migrations_are_applied_once(db):
+    conn = database.get_db_connection()
+    assert database.apply_migrations(conn) == []
+    conn.close()
+
+
+def test_create_tables_leaves_no_pooled_connection_behind(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'fresh.db')
+    monkeypatch.setattr(database, 'DB_NAME', path)
+    database.create_tables(verbose=False)
+    assert path not in database._pools
+    assert capsys.readouterr().out == ''
+    database.create_tables()
+    assert 'Database tables created successfully.' in capsys.readouterr().out
@@ -0,0 +1,88 @@
+import glob
+import threading
+import time
+
+import database
+from conftest import log_in
+
+
+def open_slot():
+    conn = database.get_db_connection()
+    slot_id = conn.execute("SELECT id FROM DoctorAvailability WHERE is_booked = 0 AND date >= date('now') LIMIT 1"
+                           ).fetchone()[0]
+    conn.close()
+    return slot_id
+
+
+def test_concurrent_refreshes_use_their_own_staging_files(seeded):
+    replica = database.get_replica()
+    # Separate replicas share the snapshot path, as separate processes would.
+    others = [database.SnapshotReplica(replica.primary, replica.path) for _ in range(8)]
+    start, errors = threading.Barrier(len(others)), []
+
+    def refresh(other):
+        start.wait()
+        try:
+            other.refresh()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=refresh, args=(other,)) for other in others]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for pool in (pool for other in others for pool in other.pools()):
+        pool.retire()
+    assert not errors, errors[0]
+    assert not glob.glob(f'{replica.path}.*.tmp')
+    conn = database.get_read_connection()
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    conn.close()
+
+
+def test_snapshot_past_the_lag_bound_is_refreshed_before_it_is_read(seeded):
+    replica = database.get_replica()
+    database.get_read_connection().close()
+    conn = database.get_db_connection()
+    conn.execute("UPDATE Patient SET name = 'Renamed Since' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    replica._refreshed_at = time.monotonic() - replica.max_staleness - 1
+    conn = database.get_read_connection()
+    assert conn.execute("SELECT name FROM Patient WHERE id = 1").fetchone()[0] != 'Renamed Since'
+    conn.close()
+
+    replica._refreshed_at = time.monotonic() - replica.max_lag - 1
+    conn = database.get_read_connection()
+    assert conn.execute("SELECT name FROM Patient WHERE id = 1").fetchone()[0] == 'Renamed Since'
+    conn.close()
+
+
+def test_long_report_does_not_block_booking(seeded, client):
+    admin, patient = client, client.application.test_client()
+    log_in(admin, 'Admin')
+    log_in(patient, 'Patient', patient_id=1)
+    slot_id = open_slot()
+
+    # Read into the streamed report until it holds its replica connection mid-query.
+    report = admin.get('/admin/appointments?stream=1', buffered=False)
+    chunks = iter(report.response)
+    replica = database.get_replica()
+    for _ in chunks:
+        if any(pool._in_use for pool in replica.pools()):
+            break
+    assert any(pool._in_use for pool in replica.pools())
+
+    started = time.perf_counter()
+    booked = patient.post(f'/patient/book_appointment/{slot_id}')
+    database.get_replica().refresh()
+    assert booked.status_code == 302 and time.perf_counter() - started < 2
+
+    body = b''.join(chunks)
+    report.close()
+    assert report.status_code == 200 and body.rstrip().endswith(b'</html>')
+    conn = database.get_db_connection()
+    assert conn.execute("SELECT is_booked FROM DoctorAvailability WHERE id = ?", (slot_id,)).fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,64 @@
+import random
+import re
+from datetime import date, datetime, timedelta
+
+import database
+from app import count_schedule_slots, expand_schedule
+from conftest import log_in
+
+
+def schedule_form(**overrides):
+    start = date.today() + timedelta(days=1)
+    form = {'start_date': start.isoformat(), 'end_date': (start + timedelta(days=13)).isoformat(),
+            'weekdays': ['0', '2', '4'], 'start_time': '09:00', 'end_time': '12:00',
+            'slot_minutes': '30', 'exclusions': ''}
+    form.update(overrides)
+    return form
+
+
+def doctor_slots(doctor_id):
+    conn = database.get_db_connection()
+    count = conn.execute("SELECT COUNT(*) FROM DoctorAvailability WHERE doctor_id = ?", (doctor_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_count_matches_expansion():
+    rng = random.Random(5)
+    for _ in range(500):
+        start = date(2030, 1, 1) + timedelta(days=rng.randint(0, 365))
+        end = start + timedelta(days=rng.randint(0, 60))
+        weekdays = set(rng.sample(range(7), rng.randint(1, 7)))
+        start_time = datetime.strptime(f'{rng.randint(0, 12):02d}:{rng.choice((0, 15, 30)):02d}', '%H:%M')
+        end_time = start_time + timedelta(minutes=rng.randint(1, 600))
+        length = timedelta(minutes=rng.choice((1, 10, 15, 25, 60)))
+        excluded = {start + timedelta(days=rng.randint(-3, 65)) for _ in range(rng.randint(0, 4))}
+        assert count_schedule_slots(start, end, weekdays, start_time, end_time, length, excluded) == len(
+            expand_schedule(start, end, weekdays, start_time, end_time, length, excluded))
+
+
+def test_schedule_is_published_in_one_call(seeded, client):
+    log_in(client, 'Doctor', doctor_id=1)
+    before = doctor_slots(1)
+    client.post('/doctor/set_schedule', data=schedule_form())
+    with client.session_transaction() as sess:
+        category, message = sess['_flashes'][-1]
+    created, skipped = map(int, re.findall(r'\d+', message))
+    # Two weeks of Monday/Wednesday/Friday mornings in 30-minute slots.
+    assert category == 'success' and created + skipped == 6 * 6
+    assert doctor_slots(1) - before == created
+
+
+def test_oversized_schedule_is_rejected_before_expanding(db, client, monkeypatch):
+    def expand(*args, **kwargs):
+        raise AssertionError('oversized schedule was expanded')
+    monkeypatch.setattr('app.expand_schedule', expand)
+    log_in(client, 'Doctor', doctor_id=1)
+    for form in (schedule_form(slot_minutes='1', start_time='00:00', end_time='23:59', end_date='9999-12-31',
+                               weekdays=[str(day) for day in range(7)]),
+                 schedule_form(slot_minutes='1', start_time='00:00', end_time='23:59',
+                               weekdays=[str(day) for day in range(7)])):
+        client.post('/doctor/set_schedule', data=form)
+        with client.session_transaction() as sess:
+            category, message = sess.pop('_flashes')[-1]
+        assert category == 'danger' and ('at most' in message or 'limit' in message)
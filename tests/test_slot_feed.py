@@ -0,0 +1,34 @@
+import pytest
+
+import database
+from app import app
+from conftest import log_in
+
+
+def open_search():
+    conn = database.get_db_connection()
+    row = conn.execute("""
+        SELECT d.specialization_id, da.date
+        FROM DoctorAvailability da
+        JOIN Doctor d ON da.doctor_id = d.id
+        WHERE da.is_booked = 0 AND da.date >= date('now')
+        LIMIT 1
+    """).fetchone()
+    conn.close()
+    return {'specialization_id': str(row['specialization_id']), 'appointment_date': row['date']}
+
+
+@pytest.mark.parametrize('enabled', [False, True])
+def test_slot_feed_follows_the_config_flag(seeded, client, monkeypatch, enabled):
+    monkeypatch.setitem(app.config, 'SLOT_FEED_ENABLED', enabled)
+    log_in(client, 'Patient', patient_id=1)
+    search = open_search()
+
+    page = client.post('/patient/find_doctors', data=search)
+    assert page.status_code == 200
+    assert (b'slot_feed.js' in page.data) == enabled
+
+    if not enabled:
+        feed = client.get('/patient/slot_feed', query_string={'specialization_id': search['specialization_id'],
+                                                              'date': search['appointment_date']})
+        assert feed.status_code == 404
@@ -0,0 +1,80 @@
+import database
+from conftest import log_in
+from test_auth import NEW_DOCTOR, REGISTRATION
+
+
+def booked_appointments(limit):
+    conn = database.get_db_connection()
+    rows = conn.execute("""
+        SELECT id, patient_id, doctor_id FROM Appointment WHERE status = 'Booked' ORDER BY id LIMIT ?
+    """, (limit,)).fetchall()
+    conn.close()
+    return rows
+
+
+def open_slots(limit):
+    conn = database.get_db_connection()
+    ids = [row[0] for row in conn.execute("""
+        SELECT id FROM DoctorAvailability WHERE is_booked = 0 AND date >= date('now') ORDER BY id LIMIT ?
+    """, (limit,))]
+    conn.close()
+    return ids
+
+
+def read_stats():
+    conn = database.get_db_connection()
+    stats = database.read_stats(conn)
+    conn.close()
+    return stats
+
+
+def check_stats():
+    conn = database.get_db_connection()
+    mismatches = database.check_stats(conn)
+    conn.close()
+    return mismatches
+
+
+def test_trigger_maintained_counters_match_a_rebuild(seeded, client):
+    assert check_stats() == {}
+    before = read_stats()
+
+    assert client.post('/patient/register', data=REGISTRATION).status_code == 302
+    log_in(client, 'Admin')
+    client.post('/admin/doctors', data=NEW_DOCTOR)
+    client.post('/admin/doctors/edit/1', data={'name': 'Dr Moved', 'specialization_id': '3',
+                                               'contact_info': 'moved@example.com'})
+    client.post('/admin/doctors/edit/2', data={'name': 'Dr Moved Too', 'specialization_id': '1',
+                                               'contact_info': 'moved2@example.com'})
+
+    patient = client.application.test_client()
+    log_in(patient, 'Patient', patient_id=1)
+    for slot_id in open_slots(5):
+        patient.post(f'/patient/book_appointment/{slot_id}')
+
+    cancelled_by_patient, cancelled_by_doctor, *completed = booked_appointments(6)
+    log_in(patient, 'Patient', patient_id=cancelled_by_patient['patient_id'])
+    patient.post(f"/patient/cancel_booking/{cancelled_by_patient['id']}")
+    doctor = client.application.test_client()
+    log_in(doctor, 'Doctor', doctor_id=cancelled_by_doctor['doctor_id'])
+    doctor.post(f"/doctor/cancel_appointment/{cancelled_by_doctor['id']}")
+    for appointment in completed:
+        log_in(doctor, 'Doctor', doctor_id=appointment['doctor_id'])
+        doctor.post(f"/doctor/submit_treatment/{appointment['id']}", data={'diagnosis': 'Checked'})
+
+    after = read_stats()
+    changed = {name: after.get(name, 0) - before.get(name, 0) for name in before.keys() | after.keys()}
+    assert changed['patients'] == 1 and changed['doctors'] == 1
+    assert changed['appointments'] == 5 and changed['appointments:Booked'] == 5 - 2 - len(completed)
+    assert changed['appointments:Cancelled'] == 2 and changed['appointments:Completed'] == len(completed)
+    assert any(changed[f'specialization_doctors:{sid}'] for sid in (1, 2, 3))
+    assert check_stats() == {}
+
+
+def test_check_stats_reports_a_drifted_counter(seeded):
+    conn = database.get_db_connection()
+    conn.execute("UPDATE StatCounter SET value = value + 1 WHERE name = 'patients'")
+    conn.commit()
+    patients = conn.execute("SELECT COUNT(*) FROM Patient").fetchone()[0]
+    conn.close()
+    assert check_stats() == {'patients': (patients + 1, patients)}
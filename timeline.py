@@ -0,0 +1,76 @@
+import hashlib
+import json
+import sys
+
+TIMELINE_FIELDS = ('treatment_date', 'diagnosis', 'prescription', 'doctor_notes', 'doctor_name', 'specialization')
+
+# Rough per-record overhead of the dict and its keys on top of the text itself.
+_RECORD_OVERHEAD = sys.getsizeof({}) + 64 * len(TIMELINE_FIELDS)
+
+
+class PatientTimeline:
+    """A patient's treatment records, newest first, plus a precomputed summary.
+
+    Instances are immutable so a cached timeline can be shared between
+    request threads; with_record() returns a new timeline instead.
+    `versions` are the table change counters the records were read at, so a
+    cached copy can be recognised as older than the database. The counters
+    are global, so `validator` (this patient's names and treatment counts,
+    see app.read_timeline_validators) then tells whether this patient's
+    records actually changed. `digest` identifies the content for HTTP
+    validators.
+    """
+
+    __slots__ = ('patient_name', 'records', 'versions', 'validator', 'digest', 'nbytes')
+
+    def __init__(self, patient_name, records, versions=(), validator=None):
+        self.patient_name = patient_name
+        self.records = tuple(records)
+        self.versions = tuple(versions)
+        self.validator = validator
+        self.digest = hashlib.sha1(json.dumps([patient_name, self.records], default=str).encode()).hexdigest()
+        self.nbytes = sum(_record_size(record) for record in self.records) + len(patient_name or '')
+
+    @classmethod
+    def from_rows(cls, patient_name, rows, versions=(), validator=None):
+        return cls(patient_name, ({field: row[field] for field in TIMELINE_FIELDS} for row in rows),
+                   versions, validator)
+
+    def with_record(self, record, versions, validator):
+        """Returns a copy with one more record, kept in treatment_date DESC order, as of `versions`."""
+        record = {field: record[field] for field in TIMELINE_FIELDS}
+        index = _insert_index(self.records, record)
+        return PatientTimeline(self.patient_name, self.records[:index] + (record,) + self.records[index:],
+                               versions, validator)
+
+    def as_of(self, versions):
+        """Returns a copy with the same records, recorded as current at `versions`."""
+        return PatientTimeline(self.patient_name, self.records, versions, self.validator)
+
+    def is_older_than(self, versions):
+        """True if any table has changed since this timeline was read."""
+        return any(mine < theirs for mine, theirs in zip(self.versions, versions))
+
+    def summary(self, limit):
+        return {
+            'count': len(self.records),
+            'last_visit': self.records[0]['treatment_date'] if self.records else None,
+            'recent': self.records[:limit],
+        }
+
+
+def _record_size(record):
+    return _RECORD_OVERHEAD + sum(len(str(record[field])) for field in TIMELINE_FIELDS if record[field])
+
+
+def _sort_key(record):
+    return record['treatment_date'] or ''
+
+
+def _insert_index(records, record):
+    # Records are newest first; a new record goes before the first one not newer than it.
+    key = _sort_key(record)
+    for index, existing in enumerate(records):
+        if _sort_key(existing) <= key:
+            return index
+    return len(records)
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool that refuses new work once `max_pending` jobs are queued or running.
+
+    Shedding at submit time keeps a burst from building an unbounded backlog
+    that every caller then waits behind.
+    """
+
+    def __init__(self, workers, max_pending, name='worker'):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.stats = {'submitted': 0, 'completed': 0, 'rejected': 0}
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            self.stats['completed'] += 1
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise QueueFull(f'{self._pending} jobs already pending')
+            self._pending += 1
+            self.stats['submitted'] += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        return future
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update(pending=self._pending, workers=self.workers, max_pending=self.max_pending)
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)